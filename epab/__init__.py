@@ -7,15 +7,26 @@ It is intended for my personal use only
 
 import sys
 
-from pkg_resources import DistributionNotFound, get_distribution
 
-from epab.utils import get_product_version
-
-if getattr(sys, 'frozen', False):
-    __version__ = get_product_version(sys.executable).file_version
-else:
+def _get_version() -> str:
+    # pefile and pkg_resources are slow to import; only load them when needed
+    if getattr(sys, 'frozen', False):
+        from epab.utils import get_product_version
+        return get_product_version(sys.executable).file_version
+    try:
+        from importlib.metadata import PackageNotFoundError, version  # type: ignore
+    except ImportError:  # pragma: no cover
+        # Python < 3.8
+        from pkg_resources import DistributionNotFound, get_distribution
+        try:
+            return get_distribution('epab').version
+        except DistributionNotFound:
+            return 'not installed'
     try:
-        __version__ = get_distribution('epab').version
-    except DistributionNotFound:  # pragma: no cover
+        return version('epab')
+    except PackageNotFoundError:  # pragma: no cover
         # package is not installed
-        __version__ = 'not installed'
+        return 'not installed'
+
+
+__version__ = _get_version()
@@ -4,20 +4,21 @@
 """
 Collections of tools to build a python app
 """
+import functools
 import logging
 import os
 import sys
 
 import click
 
-import epab.cmd
-import epab.linters
 import epab.utils
 from epab import __version__
+from epab._lazy_group import LazyGroup, lazy_flag_callback
 from epab._logging import _setup_logging
 from epab.core import CTX, config
 
-config.setup_config(__version__)
+# The config is only validated (and its example written) once a subcommand actually runs
+config.init_config(__version__)
 
 LOGGER = logging.getLogger('EPAB')
 
@@ -35,18 +36,42 @@ _GIT_IGNORE = (
     '.hypothesis/',
     '*.egg-info/',
     '.mypy_cache',
-    f'packages_{config.PACKAGE_NAME()}.png',
-    f'classes_{config.PACKAGE_NAME()}.png',
-
+    '.epab_cache/',
 )
 
 
-@click.group()
+# Subcommands are only imported when they are used, to keep the startup time low
+_LAZY_SUBCOMMANDS = {
+    # 'pep8': 'epab.linters:pep8',
+    # 'flake8': 'epab.linters:flake8',
+    # 'sort': 'epab.linters:sort',
+    'pylint': 'epab.linters:pylint',
+    'safety': 'epab.linters:safety',
+    'lint': 'epab.linters:lint',
+    'mypy': 'epab.linters:mypy',
+    'pytest-dead-fixtures': 'epab.linters:pytest_dead_fixtures',
+    'bandit': 'epab.linters:bandit',
+    'reqs': 'epab.cmd:reqs',
+    'release': 'epab.cmd:release',
+    'chglog': 'epab.cmd:chglog',
+    'pytest': 'epab.cmd:pytest',
+    'test-stats': 'epab.cmd:test_stats',
+    'install-hooks': 'epab.cmd:install_hooks',
+    'push': 'epab.cmd:push',
+    'freeze': 'epab.cmd:freeze',
+    'pipenv': 'epab.cmd:pipenv',
+    'graph': 'epab.cmd:graph',
+}
+
+
+@click.group(cls=LazyGroup, lazy_subcommands=_LAZY_SUBCOMMANDS)
 @click.option('-v', '--version',
-              is_flag=True, is_eager=True, expose_value=False, callback=epab.cmd.print_version, default=False,
+              is_flag=True, is_eager=True, expose_value=False, default=False,
+              callback=lazy_flag_callback('epab.cmd._print_version:print_version'),
               help='Print version and exit')
 @click.option('-nv', '--next-version',
-              is_flag=True, is_eager=True, expose_value=False, callback=epab.cmd.next_version, default=False,
+              is_flag=True, is_eager=True, expose_value=False, default=False,
+              callback=lazy_flag_callback('epab.cmd._next_version:next_version'),
               help='Print next version and exit')
 @click.option('-d', '--dirty', is_flag=True, default=False, help='Allow dirty repository')
 @click.option('-s', '--stash', 'stash', is_flag=True, default=False, help='No stashing')
@@ -57,6 +82,7 @@ def cli(dirty, stash):
     This tool is installed as a setuptools entry point, which means it should be accessible from your terminal once
     this application is installed in develop mode.
     """
+    config.setup_config(__version__)
     _setup_logging()
 
     LOGGER.info('EPAB %s', __version__)
@@ -64,76 +90,76 @@ def cli(dirty, stash):
 
     CTX.repo = epab.utils.Repo()
     CTX.repo.ensure()
+    click.get_current_context().call_on_close(_log_git_spawns)
     CTX.stash = stash
-    for filename in _GIT_IGNORE:
-        epab.utils.add_to_gitignore(filename)
+    epab.utils.ensure_gitignore_entries(
+        _GIT_IGNORE + (f'packages_{config.PACKAGE_NAME()}.png', f'classes_{config.PACKAGE_NAME()}.png')
+    )
     if not dirty and CTX.repo.is_dirty():
         LOGGER.error('Repository is dirty')
         sys.exit(-1)
 
 
-def _pre_push(ctx: click.core.Context, push: bool):
+def _log_git_spawns():
+    LOGGER.debug('Git processes spawned: %s', epab.utils.GIT_SPAWNS)
+
+
+def _pre_push_pipeline(ctx: click.core.Context, push: bool, force: bool = False) -> epab.utils.Pipeline:
+    import epab.cmd
+    import epab.linters
+    stages = [
+        epab.utils.Stage('pipenv_update', functools.partial(ctx.invoke, epab.cmd.pipenv_update, force=force)),
+        epab.utils.Stage('pipenv_clean', functools.partial(ctx.invoke, epab.cmd.pipenv_clean, force=force),
+                         depends_on=['pipenv_update']),
+        # Linters stash the working tree when stashing is enabled
+        epab.utils.Stage('lint', functools.partial(ctx.invoke, epab.linters.lint), depends_on=['pipenv_clean'],
+                         mutates_repo=CTX.stash),
+        epab.utils.Stage('pytest', functools.partial(ctx.invoke, epab.cmd.pytest, long=True),
+                         depends_on=['pipenv_clean']),
+        # Like the linters, writing the requirements stashes the working tree when stashing is enabled
+        epab.utils.Stage('reqs', functools.partial(ctx.invoke, epab.cmd.reqs), depends_on=['pipenv_clean'],
+                         mutates_repo=CTX.stash),
+        # Both run pipenv against the same lock file
+        epab.utils.Stage('pipenv_check', functools.partial(ctx.invoke, epab.cmd.pipenv_check, force=force),
+                         depends_on=['reqs']),
+    ]
+    if push:
+        stages.append(epab.utils.Stage('push', CTX.repo.push, mutates_repo=True))
+    return epab.utils.Pipeline('pre_push', stages)
+
+
+def _pre_push(ctx: click.core.Context, push: bool, force: bool):
     if not sys.argv[0].endswith('__main__.py'):
         LOGGER.error('This command cannot be run as a script. Use this instead:\n\n\t'
                      'python -m epab (-d) pre_push')
         sys.exit(1)
 
-    ctx.invoke(epab.cmd.pipenv_update)
-    ctx.invoke(epab.cmd.pipenv_clean)
-    ctx.invoke(epab.linters.lint)
-    ctx.invoke(epab.cmd.pytest, long=True)
-    ctx.invoke(epab.cmd.reqs)
-    ctx.invoke(epab.cmd.pipenv_check)
-    if push:
-        CTX.repo.push()
+    _pre_push_pipeline(ctx, push, force).run()
 
 
 @cli.command()
 @click.pass_context
 @click.option('-p', '--push', is_flag=True, default=False, help='Push to remote origin')
-def pre_push(ctx, push: bool):
+@click.option('-f', '--force', is_flag=True, default=False,
+              help='Run pipenv update, clean and check even if nothing changed since their last run')
+def pre_push(ctx, push: bool, force: bool):
     """
     Runs a series of tests & checks before pushing to Git remote
     """
-    _pre_push(ctx, push)
+    _pre_push(ctx, push, force)
 
 
 @cli.command()
 @click.pass_context
 @click.option('-p', '--push', is_flag=True, default=False, help='Push to remote origin')
-def pp(ctx, push: bool):  # pylint: disable=invalid-name
+@click.option('-f', '--force', is_flag=True, default=False,
+              help='Run pipenv update, clean and check even if nothing changed since their last run')
+def pp(ctx, push: bool, force: bool):  # pylint: disable=invalid-name
     """
     Alias for "pre_push"
     """
-    _pre_push(ctx, push)
-
-
-_LINTERS = [
-    # epab.linters.pep8,
-    # epab.linters.flake8,
-    # epab.linters.sort,
-    epab.linters.pylint,
-    epab.linters.safety,
-    epab.linters.lint,
-    epab.linters.mypy,
-    epab.linters.pytest_dead_fixtures,
-    epab.linters.bandit
-]
-
-_COMMANDS = [
-    epab.cmd.reqs,
-    epab.cmd.release,
-    epab.cmd.chglog,
-    epab.cmd.pytest,
-    epab.cmd.install_hooks,
-    epab.cmd.push,
-    epab.cmd.freeze,
-    epab.cmd.pipenv,
-    epab.cmd.graph,
-]
-
-for command in _COMMANDS + _LINTERS:
-    cli.add_command(command)
+    _pre_push(ctx, push, force)
+
 
 if __name__ == '__main__':
     cli(obj={})  # pylint: disable=no-value-for-parameter,unexpected-keyword-arg
@@ -0,0 +1,56 @@
+# coding=utf-8
+"""
+Click group that only imports a subcommand's module when the subcommand is used
+"""
+import importlib
+import typing
+
+import click
+
+
+def _import(import_path: str) -> typing.Any:
+    module_name, attribute = import_path.split(':')
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def lazy_flag_callback(import_path: str) -> typing.Callable:
+    """
+    Creates a callback for a flag option that only imports the actual callback when the flag is set
+
+    Args:
+        import_path: "module.path:attribute" of the actual callback
+    """
+
+    def _callback(ctx: click.Context, param: click.Parameter, value: typing.Any):
+        if not value:
+            return None
+        return _import(import_path)(ctx, param, value)
+
+    return _callback
+
+
+class LazyGroup(click.Group):
+    """
+    Click group that only imports a subcommand's module when the subcommand is used
+
+    Args:
+        lazy_subcommands: mapping of command name -> "module.path:attribute"
+    """
+
+    def __init__(self, *args, lazy_subcommands: typing.Dict[str, str] = None, **kwargs) -> None:
+        super(LazyGroup, self).__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx: click.Context) -> typing.List[str]:
+        return sorted(set(super(LazyGroup, self).list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> typing.Optional[click.Command]:
+        if cmd_name in self.lazy_subcommands:
+            return self._load(cmd_name)
+        return super(LazyGroup, self).get_command(ctx, cmd_name)
+
+    def _load(self, cmd_name: str) -> click.Command:
+        command = _import(self.lazy_subcommands[cmd_name])
+        if not isinstance(command, click.Command):
+            raise TypeError(f'{self.lazy_subcommands[cmd_name]} is not a click command')
+        return command
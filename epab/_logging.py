@@ -41,15 +41,15 @@ class _ClickHandler(logging.StreamHandler):
 class _AVHandler(logging.Handler):
 
     def emit(self, record: logging.LogRecord):
-        av_func = {
-            logging.DEBUG: epab.utils.AV.info,
-            logging.INFO: epab.utils.AV.info,
-            logging.WARNING: epab.utils.AV.error,
-            logging.ERROR: epab.utils.AV.error,
-            logging.CRITICAL: epab.utils.AV.error,
+        av_level = {
+            logging.DEBUG: 'Information',
+            logging.INFO: 'Information',
+            logging.WARNING: 'Error',
+            logging.ERROR: 'Error',
+            logging.CRITICAL: 'Error',
         }
         if CTX.appveyor:
-            av_func[record.levelno](record.msg % record.args)
+            epab.utils.AV.post(av_level[record.levelno], record.msg % record.args)
 
 
 def _setup_logging():
@@ -5,8 +5,6 @@ Base class for a Repo object
 import typing
 from abc import ABCMeta, abstractmethod
 
-import git
-
 
 # pylint: disable=too-many-public-methods
 class BaseRepo(metaclass=ABCMeta):
@@ -16,7 +14,14 @@ class BaseRepo(metaclass=ABCMeta):
 
     def __init__(self):
         self.stashed = False
-        self.repo = git.Repo()
+        self.repo = self._open_repo()
+
+    @staticmethod
+    @abstractmethod
+    def _open_repo():
+        """
+        Returns: git.Repo object for the current working directory
+        """
 
     @abstractmethod
     def get_current_branch(self):
@@ -45,6 +50,17 @@ class BaseRepo(metaclass=ABCMeta):
         Returns: list of strings
         """
 
+    @abstractmethod
+    def list_tags_with_prefix(self, prefix):
+        """
+        Returns list of tags starting with "prefix"
+
+        Args:
+            prefix: start of the tags
+
+        Returns: list of strings
+        """
+
     @abstractmethod
     def remove_tag(self, *tag: str):
         """
@@ -60,6 +76,19 @@ class BaseRepo(metaclass=ABCMeta):
         Returns: latest tag on the repo in the form TAG[-DISTANCE+[DIRTY]]
         """
 
+    @abstractmethod
+    def changelog_versions(self, tag_filter: str, next_version: str = None, since: str = None):
+        """
+        Lists the versions of the changelog and their commits
+
+        Args:
+            tag_filter: regex the tags that are versions must match
+            next_version: name of the next version, shown as a tag on the latest commit
+            since: only list the versions newer than this one
+
+        Returns: list of versions, the unreleased commits first
+        """
+
     @abstractmethod
     def latest_commit(self):
         """
@@ -68,6 +97,17 @@ class BaseRepo(metaclass=ABCMeta):
 
         """
 
+    @abstractmethod
+    def tags_for_commit(self, sha):
+        """
+        Returns the tags pointing to a commit
+
+        Args:
+            sha: full SHA of the commit
+
+        Returns: list of strings
+        """
+
     @abstractmethod
     def get_current_tag(self):
         """
@@ -148,6 +188,33 @@ class BaseRepo(metaclass=ABCMeta):
 
         """
 
+    @abstractmethod
+    def list_changed_files(self, base_ref: str = 'HEAD'):
+        """
+        Args:
+            base_ref: reference to compare the working tree with
+
+        Returns: list of files that differ from base_ref (staged, modified or untracked)
+
+        """
+
+    @abstractmethod
+    def has_commit(self, sha: str):
+        """
+        Args:
+            sha: SHA of a commit
+
+        Returns: True if the commit exists in the repository
+        """
+
+    @abstractmethod
+    def tree_fingerprint(self):
+        """
+
+        Returns: digest of the content of the working tree
+
+        """
+
     @abstractmethod
     def reset_index(self):
         """
@@ -15,3 +15,4 @@ from ._push import push
 from ._pytest import pytest
 from ._release import release
 from ._reqs import reqs
+from ._test_stats import test_stats
@@ -1,29 +1,38 @@
 # coding=utf-8
 """
 Updates the changelog with the latest commits
+
+The changelog is built in-process from the history of the repository (see "epab.utils.Repo.changelog_versions"),
+with the rules EPAB used to give to "gitchangelog".
+
+In incremental mode, only the versions newer than the latest one of the existing changelog are walked, and prepended
+to it. Every few incremental updates (and on demand), the whole changelog is rebuilt and compared to the incremental
+update; the number of incremental updates since the last full rebuild is kept in EPAB's cache directory.
 """
 
-import contextlib
+import difflib
+import json
 import logging
 import re
+import sys
+import typing
 from pathlib import Path
 
 import click
-import elib_run
 
 import epab.utils
 from epab.core import CTX, config
 
 LOGGER = logging.getLogger('EPAB')
 
-BOGUS_LINE_PATTERN = re.compile('^(- .*)(\n){2}', flags=re.MULTILINE)
+TITLE = 'Changelog'
+UNRELEASED_VERSION_LABEL = '(unreleased)'
+
+# Tags that are versions
+TAG_FILTER_REGEXP = r'^[0-9]+\.[0-9]+\.[0-9]+\.[0-9]+$'
 
-GITCHANGELOG_CONFIG = r"""
-output_engine = mustache("markdown")
-body_process = ReSub(r'((^|\n)[A-Z]\w+(-\w+)*: .*(\n\s+.*)*)+$', r'') | strip
-tag_filter_regexp = r'^[0-9]+\.[0-9]+\.[0-9]+\.[0-9]+$'
-include_merge = False
-ignore_regexps = [
+# Commits whose subject matches any of those are left out
+IGNORE_REGEXPS = [
     r'@minor', r'!minor',
     r'@cosmetic', r'!cosmetic',
     r'@refactor', r'!refactor',
@@ -32,61 +41,210 @@ ignore_regexps = [
     r'^([cC]hg|[fF]ix|[nN]ew)\s*:\s*[d|D]ev:',
     r'^(.{3,3}\s*:)?\s*[fF]irst commit.?\s*$',
     r'^release .*$',
-    r'^$',  ## ignore commits with empty messages
+    r'^$',  # ignore commits with empty messages
 ]
-"""
 
+# Sections of a version, in order, with the regexes of the subjects of their commits (None matches any subject)
+SECTION_REGEXPS: typing.List[typing.Tuple[str, typing.Optional[typing.List[str]]]] = [
+    ('New', [r'^[nN]ew\s*:\s*((dev|use?r|pkg|test|doc)\s*:\s*)?([^\n]*)$']),
+    ('Changes', [r'^[cC]hg\s*:\s*((dev|use?r|pkg|test|doc)\s*:\s*)?([^\n]*)$']),
+    ('Fix', [r'^[fF]ix\s*:\s*((dev|use?r|pkg|test|doc)\s*:\s*)?([^\n]*)$']),
+    ('Other', None),
+]
+
+# Prefix of the subjects ("new: usr: ...") and trailing "@tags"
+SUBJECT_PATTERN = re.compile(r'^([cC]hg|[fF]ix|[nN]ew)\s*:\s*((dev|use?r|pkg|test|doc)\s*:\s*)?([^\n@]*)(@[a-z]+\s+)*$')
+
+# Header of a released version in the changelog
+VERSION_HEADER_PATTERN = re.compile(r'^## (?P<tag>\S+) \([0-9]{4}-[0-9]{2}-[0-9]{2}\)$')
+
+# RFC822-like trailers at the end of the bodies ("Signed-off-by: ...")
+TRAILERS_PATTERN = re.compile(r'((^|\n)[A-Z]\w+(-\w+)*: [^\n]*(\n\s+[^\n]*)*)+$')
+
+
+def _subject(subject: str) -> str:
+    subject = SUBJECT_PATTERN.sub(r'\4', subject.strip()) or 'No commit message.'
+    subject = subject[0].upper() + subject[1:]
+    if subject[-1].isalnum():
+        subject += '.'
+    return subject
+
+
+def _body(body: str) -> str:
+    match = TRAILERS_PATTERN.search(body)
+    if match is not None:
+        body = body[:match.start()]
+    return TRAILERS_PATTERN.sub('', body).strip()
+
+
+def _section(subject: str) -> typing.Optional[str]:
+    for section, regexps in SECTION_REGEXPS:
+        if regexps is None or any(re.search(regexp, subject) for regexp in regexps):
+            return section
+    return None
+
+
+def _render_version(version: epab.utils.ChangelogVersion) -> typing.List[str]:
+    """
+    Returns: lines of a version, or an empty list if all its commits are left out
+    """
+    sections: typing.Dict[typing.Optional[str], typing.List[str]] = {}
+    for commit in version.commits:
+        if any(re.search(regexp, commit.subject) for regexp in IGNORE_REGEXPS):
+            continue
+        lines = sections.setdefault(_section(commit.subject), [])
+        lines.append(f'* {_subject(commit.subject)} [{commit.author}]')
+        body = _body(commit.body)
+        if body:
+            lines.extend(f'  {line}'.rstrip() for line in body.split('\n'))
+    if not sections:
+        return []
+    label = f'{version.tag} ({version.date})' if version.tag else UNRELEASED_VERSION_LABEL
+    result = [f'## {label}']
+    for section, _ in SECTION_REGEXPS:
+        if section in sections:
+            result.append(f'### {section}')
+            result.extend(sections[section])
+    return result
+
+
+def render_changelog(versions: typing.List[epab.utils.ChangelogVersion]) -> str:
+    """
+    Renders the changelog in Markdown
+
+    Empty lines are left out, like they used to be when reading the output of "gitchangelog".
 
-@contextlib.contextmanager
-def gitchangelog_config():
+    Args:
+        versions: versions of the changelog, the newest first
+
+    Returns: content of the changelog
+    """
+    lines = [f'# {TITLE}']
+    for version in versions:
+        lines.extend(line for line in _render_version(version) if line)
+    return '\n'.join(lines)
+
+
+def _full_changelog(next_version: typing.Optional[str]) -> str:
+    return render_changelog(CTX.repo.changelog_versions(TAG_FILTER_REGEXP, next_version))
+
+
+def _incremental_changelog(existing: str, next_version: typing.Optional[str]) -> typing.Optional[str]:
+    """
+    Prepends the versions newer than the latest released version of an existing changelog
+
+    The unreleased section, and the sections of versions that are not tagged yet (see "--next_version"), are rebuilt.
+
+    Returns: content of the changelog, or None if the existing changelog has no version to start from
+    """
+    lines = existing.split('\n')
+    if lines[0] != f'# {TITLE}':
+        return None
+    tags = set(CTX.repo.list_tags())
+    for index, line in enumerate(lines):
+        match = VERSION_HEADER_PATTERN.match(line)
+        if match is None:
+            continue
+        since = match.group('tag')
+        if since == next_version or since not in tags or not re.match(TAG_FILTER_REGEXP, since):
+            continue
+        try:
+            versions = CTX.repo.changelog_versions(TAG_FILTER_REGEXP, next_version, since)
+        except ValueError:
+            LOGGER.debug('not a version: %s', since)
+            continue
+        LOGGER.info('updated changelog since %s', since)
+        return '\n'.join([render_changelog(versions)] + lines[index:])
+    return None
+
+
+def _read_state() -> typing.Dict[str, int]:
+    state_file = epab.utils.cache_path('changelog.json')
+    if state_file.exists():
+        try:
+            return json.loads(state_file.read_text(encoding='utf8'))
+        except ValueError:
+            LOGGER.debug('invalid changelog state, ignoring: %s', state_file)
+    return {}
+
+
+def _check_incremental(incremental: str, full: str) -> bool:
     """
-    Temporarily installs GitChangelog config
+    Returns: True if the incremental update and the full rebuild of the changelog are the same
     """
-    Path('.gitchangelog.rc').write_text(GITCHANGELOG_CONFIG)
-    try:
-        yield
-    finally:
-        Path('.gitchangelog.rc').unlink()
+    if incremental == full:
+        LOGGER.info('incremental changelog update is consistent with a full rebuild')
+        return True
+    diff = difflib.unified_diff(
+        incremental.split('\n'), full.split('\n'), 'incremental update', 'full rebuild', lineterm=''
+    )
+    LOGGER.warning('incremental changelog update differs from a full rebuild:\n%s', '\n'.join(diff))
+    return False
 
 
-@contextlib.contextmanager
-def temporary_tag(tag):
+def _build_changelog(next_version: typing.Optional[str], incremental: bool, check: bool) -> str:
     """
-    Temporarily tags the repo
+    Builds the changelog, either fully or incrementally
+
+    Args:
+        next_version: indicates next version
+        incremental: only add the versions newer than the latest one of the existing changelog
+        check: rebuild the whole changelog and compare it to the incremental update (exits if they differ)
+
+    Returns: content of the changelog
     """
-    if tag:
-        CTX.repo.tag(tag)
-    try:
-        yield
-    finally:
-        if tag:
-            CTX.repo.remove_tag(tag)
+    changelog_file_path = Path(config.CHANGELOG_FILE_PATH())
+    if not (incremental or check) or not changelog_file_path.exists():
+        return _full_changelog(next_version)
+    changelog = _incremental_changelog(changelog_file_path.read_text(encoding='utf8'), next_version)
+    if changelog is None:
+        LOGGER.info('no released version found in the changelog, rebuilding it')
+        changelog = _full_changelog(next_version)
+        updates = 0
+    else:
+        updates = _read_state().get('incremental_updates', 0) + 1
+        full_rebuild_every = config.CHANGELOG_FULL_REBUILD_EVERY()
+        if check or (full_rebuild_every and updates >= full_rebuild_every):
+            LOGGER.info('rebuilding the whole changelog to check the incremental update')
+            full = _full_changelog(next_version)
+            if not _check_incremental(changelog, full) and check:
+                LOGGER.error('incremental changelog update differs from a full rebuild')
+                sys.exit(1)
+            changelog = full
+            updates = 0
+    epab.utils.write_atomic(epab.utils.cache_path('changelog.json'), json.dumps({'incremental_updates': updates}))
+    return changelog
 
 
 @epab.utils.run_once
 @epab.utils.stashed
 @epab.utils.timeit
-def _chglog(amend: bool = False, stage: bool = False, next_version: str = None, auto_next_version: bool = False):
+def _chglog(
+        amend: bool = False,
+        stage: bool = False,
+        next_version: str = None,
+        auto_next_version: bool = False,
+        incremental: bool = False,
+        check: bool = False,
+):
     """
     Writes the changelog
 
     Args:
         amend: amend last commit with changes
         stage: stage changes
+        next_version: indicates next version
+        auto_next_version: infer next version from VCS
+        incremental: only add the versions newer than the latest one of the existing changelog
+        check: rebuild the whole changelog and compare it to the incremental update
     """
     if config.CHANGELOG_DISABLE():
         LOGGER.info('skipping changelog update as per config')
     else:
-        epab.utils.ensure_exe('git')
-        epab.utils.ensure_exe('gitchangelog')
         LOGGER.info('writing changelog')
         if auto_next_version:
             next_version = epab.utils.get_next_version()
-        with gitchangelog_config():
-            with temporary_tag(next_version):
-                changelog, _ = elib_run.run('gitchangelog', mute=True)
-        # changelog = changelog.encode('utf8').replace(b'\r\n', b'\n').decode('utf8')
-        changelog = re.sub(BOGUS_LINE_PATTERN, '\\1\n', changelog)
+        changelog = _build_changelog(next_version, incremental or config.CHANGELOG_INCREMENTAL(), check)
         Path(config.CHANGELOG_FILE_PATH()).write_text(changelog, encoding='utf8')
         if amend:
             CTX.repo.amend_commit(
@@ -101,7 +259,18 @@ def _chglog(amend: bool = False, stage: bool = False, next_version: str = None,
 @click.option('-s', '--stage', is_flag=True, help='Stage changed files')
 @click.option('-n', '--next_version', default=None, help='Indicates next version')
 @click.option('-anv', '--auto_next_version', default=False, is_flag=True, help='Auto-nump version')
-def chglog(amend: bool = False, stage: bool = False, next_version: str = None, auto_next_version: bool = False):
+@click.option('-i', '--incremental', default=False, is_flag=True,
+              help='Only add the versions newer than the latest one of the changelog')
+@click.option('-c', '--check', default=False, is_flag=True,
+              help='Rebuild the whole changelog and exit with an error if it differs from the incremental update')
+def chglog(
+        amend: bool = False,
+        stage: bool = False,
+        next_version: str = None,
+        auto_next_version: bool = False,
+        incremental: bool = False,
+        check: bool = False,
+):
     """
     Writes the changelog
 
@@ -110,6 +279,8 @@ def chglog(amend: bool = False, stage: bool = False, next_version: str = None, a
         stage: stage changes
         next_version: indicates next version
         auto_next_version: infer next version from VCS
+        incremental: only add the versions newer than the latest one of the changelog
+        check: rebuild the whole changelog and compare it to the incremental update
     """
     changed_files = CTX.repo.changed_files()
     changelog_file_path: Path = config.CHANGELOG_FILE_PATH()
@@ -117,4 +288,4 @@ def chglog(amend: bool = False, stage: bool = False, next_version: str = None, a
     if changelog_file_name in changed_files:
         LOGGER.error('changelog has changed; cannot update it')
         exit(-1)
-    _chglog(amend, stage, next_version, auto_next_version)
+    _chglog(amend, stage, next_version, auto_next_version, incremental, check)
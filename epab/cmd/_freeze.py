@@ -52,12 +52,12 @@ def _format_data_file(data_file: str) -> str:
 @epab.utils.timeit
 def _install_pyinstaller():
     LOGGER.info('checking PyInstaller installation')
-    _get_version = functools.partial(elib_run.run, 'pyinstaller --version')
+    _get_version = functools.partial(epab.utils.run, 'pyinstaller --version')
     try:
         _get_version()
     except elib_run.ExecutableNotFoundError:
         LOGGER.info('installing PyInstaller')
-        elib_run.run('pip install pyinstaller==3.4')
+        epab.utils.run('pip install pyinstaller==3.4')
         _get_version()
 
 
@@ -84,7 +84,7 @@ def _patch(version: str):
         f'{CTX.repo.get_sha()}-{timestamp}',
         '/langid', '1033',
     ]
-    elib_run.run(' '.join(cmd))
+    epab.utils.run(' '.join(cmd))
     LOGGER.info('patch OK')
 
 
@@ -100,8 +100,8 @@ def _freeze(version: str):
         data_file = _format_data_file(data_file)
         cmd.append(f'--add-data "{data_file}"')
     LOGGER.info('freezing %s', config.PACKAGE_NAME)
-    elib_run.run(' '.join(cmd), timeout=300)
-    elib_run.run('pipenv clean', failure_ok=True)
+    epab.utils.run(' '.join(cmd), timeout=300)
+    epab.utils.run('pipenv clean', failure_ok=True)
     LOGGER.info('freeze OK')
     _patch(version)
 
@@ -33,7 +33,7 @@ PRE_COMMIT = """#!/bin/sh
 PATH="{venv}:$PATH"
 echo `epab --version`
 
-epab -d -ns lint
+epab -d -ns lint --changed-only
 if [ "$?" -ne "0" ]
 then
     echo "Linting error"
@@ -1,13 +1,79 @@
 # coding=utf-8
 """
 Pipenv helpers
+
+"update", "clean" and "check" only depend on the Pipfile, the lock file and the installed distributions: once one of
+them succeeds, the fingerprint of those inputs is recorded in EPAB's cache directory, and the next runs are skipped
+until the fingerprint changes (or "--force" is given).
 """
+import hashlib
+import json
+import logging
+import os
+import sys
+import typing
+from pathlib import Path
 
 import click
 from elib_run import run
 
 import epab.utils
 
+LOGGER = logging.getLogger('EPAB')
+
+_DISTRIBUTION_SUFFIXES = ('.dist-info', '.egg-info', '.egg-link', '.egg', '.pth')
+
+
+def _installed_distributions() -> typing.List[str]:
+    """
+    Returns: sorted names of the distribution metadata entries found in sys.path (they include the versions)
+    """
+    entries = set()
+    for path in sys.path:
+        if not path or not os.path.isdir(path):
+            continue
+        try:
+            names = os.listdir(path)
+        except OSError:
+            continue
+        entries.update(f'{path}/{name}' for name in names if name.endswith(_DISTRIBUTION_SUFFIXES))
+    return sorted(entries)
+
+
+def _fingerprint() -> str:
+    digest = hashlib.sha256()
+    for file_name in ('Pipfile', 'Pipfile.lock'):
+        path = Path(file_name)
+        digest.update(path.read_bytes() if path.exists() else b'')
+        digest.update(b'\0')
+    digest.update(sys.executable.encode('utf8'))
+    for entry in _installed_distributions():
+        digest.update(f'\0{entry}'.encode('utf8'))
+    return digest.hexdigest()
+
+
+def _read_state() -> typing.Dict[str, str]:
+    state_file = epab.utils.cache_path('pipenv.json')
+    if state_file.exists():
+        try:
+            return json.loads(state_file.read_text(encoding='utf8'))
+        except ValueError:
+            LOGGER.debug('invalid pipenv state, ignoring: %s', state_file)
+    return {}
+
+
+def _run_unless_unchanged(name: str, args: str, force: bool):
+    """
+    Runs a pipenv command, unless it already succeeded with the same Pipfile, lock file and installed distributions
+    """
+    if not force and _read_state().get(name) == _fingerprint():
+        LOGGER.info('pipenv %s: Pipfile, lock file and installed packages did not change, skipping', name)
+        return
+    _pipenv(args)
+    state = _read_state()
+    state[name] = _fingerprint()
+    epab.utils.write_atomic(epab.utils.cache_path('pipenv.json'), json.dumps(state, sort_keys=True))
+
 
 @epab.utils.timeit
 def _pipenv(args: str):
@@ -16,8 +82,8 @@ def _pipenv(args: str):
 
 @epab.utils.run_once
 @epab.utils.timeit
-def _check():
-    _pipenv('check')
+def _check(force: bool = False):
+    _run_unless_unchanged('check', 'check', force)
 
 
 @epab.utils.run_once
@@ -28,14 +94,14 @@ def _lock(dev: bool = True):
 
 @epab.utils.run_once
 @epab.utils.timeit
-def _update(dev: bool = True):
-    _pipenv('update' + ' --dev' if dev else '')
+def _update(dev: bool = True, force: bool = False):
+    _run_unless_unchanged('update', 'update' + ' --dev' if dev else '', force)
 
 
 @epab.utils.run_once
 @epab.utils.timeit
-def _clean():
-    _pipenv('clean')
+def _clean(force: bool = False):
+    _run_unless_unchanged('clean', 'clean', force)
 
 
 @click.group(name='pipenv')
@@ -46,28 +112,31 @@ def pipenv():
 
 
 @pipenv.command()
-def check():
+@click.option('-f', '--force', is_flag=True, default=False, help='Run even if nothing changed since the last run')
+def check(force):
     """
     Runs 'pipenv check'
     """
-    _check()
+    _check(force)
 
 
 @pipenv.command()
-def clean():
+@click.option('-f', '--force', is_flag=True, default=False, help='Run even if nothing changed since the last run')
+def clean(force):
     """
     Runs 'pipenv clean'
     """
-    _clean()
+    _clean(force)
 
 
 @pipenv.command()
 @click.option('-d', '--dev', is_flag=True, default=True, help='Include dev packages')
-def update(dev):
+@click.option('-f', '--force', is_flag=True, default=False, help='Run even if nothing changed since the last run')
+def update(dev, force):
     """
     Runs 'pipenv update'
     """
-    _update(dev)
+    _update(dev, force)
 
 
 @pipenv.command()
@@ -2,6 +2,7 @@
 """
 Pushes latest changes to origin
 """
+import functools
 
 import click
 
@@ -11,14 +12,23 @@ import epab.utils
 from epab.core import CTX
 
 
+def _push_pipeline(ctx: click.Context) -> epab.utils.Pipeline:
+    return epab.utils.Pipeline('push', [
+        # Linters are read-only as long as the auto-formatters are disabled; they run alongside the tests
+        epab.utils.Stage('lint', functools.partial(ctx.invoke, epab.linters.lint, amend=True)),
+        epab.utils.Stage('pytest', functools.partial(
+            ctx.invoke, epab.cmd.pytest, long=True, exitfirst=True, failed_first=True
+        )),
+        epab.utils.Stage('reqs', functools.partial(ctx.invoke, epab.cmd.reqs, amend=True), mutates_repo=True),
+        epab.utils.Stage('chglog', functools.partial(ctx.invoke, epab.cmd.chglog, amend=True), mutates_repo=True),
+        epab.utils.Stage('push', CTX.repo.push, mutates_repo=True),
+    ])
+
+
 @epab.utils.stashed
 @epab.utils.timeit
 def _push(ctx: click.Context):
-    ctx.invoke(epab.linters.lint, amend=True)
-    ctx.invoke(epab.cmd.pytest, long=True, exitfirst=True, failed_first=True)
-    ctx.invoke(epab.cmd.reqs, amend=True)
-    ctx.invoke(epab.cmd.chglog, amend=True)
-    CTX.repo.push()
+    _push_pipeline(ctx).run()
 
 
 @click.command()
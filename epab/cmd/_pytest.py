@@ -1,35 +1,59 @@
 # coding=utf-8
 """
 Manages the test suite
+
+The pytest command line only depends on the config and the environment, so it is built once and cached with the
+fingerprint of its inputs; the coverage config file is kept in EPAB's cache directory instead of the working tree.
+
+With "--workers", the test modules are split across several pytest processes, balanced with the duration of each test
+during previous runs, and their coverage data is combined into a single report afterwards.
 """
+import hashlib
+import json
 import logging
 import os
+import shlex
 import shutil
+import sqlite3
+import sys
+import time
+import typing
 import webbrowser
+import xml.etree.ElementTree as ElementTree  # nosec
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import click
-import elib_run
 
 import epab.utils
 from epab.core import CTX, config
 
 LOGGER = logging.getLogger('EPAB')
+# Records which test executed which line, for "--affected"; it slows the tests down, so it is only used there
+IMPACT_OPTIONS = ' --cov-context=test'
 PYTEST_OPTIONS = ' '.join([
     '--cov={package}',
-    '--cov-report xml',
-    '--cov-report html',
+    '{coverage_reports}',
     '--cov-branch',
     # f'--cov-fail-under={CONFIG.test__coverage__fail_under}',
     '--durations={test_duration}',
     # '--hypothesis-show-statistics',
     '--tb=short',
-    '--cov-config .coveragerc',
+    '--cov-config {coverage_config}',
+    # Records the duration of each test, for "--workers"
+    '--junitxml {junit_xml}',
+    '-o junit_family=xunit1',
     # '--dead-fixtures',
     # '--dup-fixtures',
     # '-x',
 ])
 
+# Duration of a test module that never ran, when no other module ran either
+_DEFAULT_MODULE_DURATION = 1.0
+
+# Changes to these files may affect any test
+_FULL_RUN_FILES = ('pyproject.toml', 'setup.py', 'setup.cfg', 'Pipfile', 'Pipfile.lock')
+
 # noinspection SpellCheckingInspection
 COVERAGE_CONFIG = r"""
 ## http://coverage.readthedocs.io/en/latest/config.html
@@ -73,11 +97,43 @@ title = Coverage report
 
 class _Coverage:
     @staticmethod
-    def install():
+    def config_file(shard: typing.Optional[int] = None) -> str:
+        """
+        Args:
+            shard: index of the shard, for a sharded run
+
+        Returns: path to the coverage config file, relative to the root of the repository
+        """
+        if shard is None:
+            return Path(epab.utils.CACHE_DIR, 'pytest', 'coveragerc').as_posix()
+        return Path(epab.utils.CACHE_DIR, 'pytest', 'shards', f'coveragerc.{shard}').as_posix()
+
+    @staticmethod
+    def data_file(shard: int) -> str:
+        """
+        Args:
+            shard: index of the shard
+
+        Returns: path to the coverage data file of a shard, relative to the root of the repository
+        """
+        return Path(epab.utils.CACHE_DIR, 'pytest', 'shards', f'.coverage.{shard}').as_posix()
+
+    @staticmethod
+    def install(shard: typing.Optional[int] = None):
         """
-        Installs coverage config file
+        Installs coverage config file in EPAB's cache directory, unless it is already up-to-date
+
+        Args:
+            shard: index of the shard, for a sharded run; each shard writes its own coverage data file
         """
-        Path('.coveragerc').write_text(COVERAGE_CONFIG.format(package_name=config.PACKAGE_NAME()))
+        config_file = epab.utils.cache_path(*Path(_Coverage.config_file(shard)).parts[1:])
+        content = COVERAGE_CONFIG.format(package_name=config.PACKAGE_NAME())
+        if shard is not None:
+            content = content.replace('[run]\n', f'[run]\ndata_file = {_Coverage.data_file(shard)}\n', 1)
+        if config_file.exists() and config_file.read_text(encoding='utf8') == content:
+            return
+        LOGGER.debug('writing coverage config: %s', config_file)
+        epab.utils.write_atomic(config_file, content)
 
     @staticmethod
     def upload_coverage_to_codacy():
@@ -92,8 +148,8 @@ class _Coverage:
             return
 
         LOGGER.info('uploading coverage to Codacy')
-        elib_run.run('pip install --upgrade codacy-coverage')
-        elib_run.run('python-codacy-coverage -r coverage.xml')
+        epab.utils.run('pip install --upgrade codacy-coverage')
+        epab.utils.run('python-codacy-coverage -r coverage.xml')
         LOGGER.info('codacy coverage OK')
 
     # Disabled for the time being
@@ -105,9 +161,9 @@ class _Coverage:
     #     if os.getenv('SCRUT_TOK', False):
     #         if Path('coverage.xml').exists():
     #             LOGGER.info('Uploading coverage to Scrutinizer')
-    #             elib_run.run('pip install git+https://github.com/etcher-vault/ocular.py.git#egg=ocular')
+    #             epab.utils.run('pip install git+https://github.com/etcher-vault/ocular.py.git#egg=ocular')
     #             token = os.getenv('SCRUT_TOK')
-    #             elib_run.run(
+    #             epab.utils.run(
     #                 f'ocular --access-token "{token}" --data-file "coverage.xml" --config-file ".coveragerc"'
     #             )
     #             LOGGER.info('Scrutinizer coverage OK')
@@ -116,16 +172,6 @@ class _Coverage:
     #     else:
     #         LOGGER.error('no "SCRUT_TOK" in environment, skipping ocular coverage')
 
-    @staticmethod
-    def remove_config_file():
-        """
-        Removes coverage config file
-        """
-        try:
-            Path('.coveragerc').unlink()
-        except FileNotFoundError:
-            pass
-
 
 def upload_coverage():
     """
@@ -138,32 +184,275 @@ def upload_coverage():
         LOGGER.info('skipping coverage upload')
 
 
-def pytest_options():
+def _junit_file(shard: typing.Optional[int] = None) -> str:
+    name = 'junit.xml' if shard is None else f'junit.{shard}.xml'
+    return Path(epab.utils.CACHE_DIR, 'pytest', name).as_posix()
+
+
+def pytest_options(shard: typing.Optional[int] = None):
     """
+    Args:
+        shard: index of the shard, for a sharded run; shards do not write coverage reports
+
     Returns: PyTest standard command line options
     """
     return PYTEST_OPTIONS.format(
         package=config.PACKAGE_NAME(),
+        coverage_reports='--cov-report xml --cov-report html' if shard is None else '--cov-report=',
         test_duration=config.TEST_DURATION_COUNT(),
+        coverage_config=_Coverage.config_file(shard),
+        junit_xml=_junit_file(shard),
     )
 
 
-@epab.utils.run_once
-@epab.utils.timeit
-def _pytest(test, *, long, show, exitfirst, last_failed, failed_first, rm_cov):
-    LOGGER.info('running test suite')
-    os.environ['PYTEST_QT_API'] = 'pyqt5'
-    _Coverage.install()
-    cmd = f'pytest {test}'
+def _plan_fingerprint() -> str:
+    digest = hashlib.sha1()  # nosec
+    config_file = Path('pyproject.toml')
+    if config_file.exists():
+        digest.update(config_file.read_bytes())
+    env = sorted((key, value) for key, value in os.environ.items() if key.upper().startswith('EPAB__'))
+    digest.update(repr((epab.__version__, CTX.appveyor, env, PYTEST_OPTIONS, COVERAGE_CONFIG)).encode('utf8'))
+    return digest.hexdigest()
+
+
+def _build_command(shard: typing.Optional[int] = None) -> str:
+    _Coverage.install(shard)
+    args = []
 
     if CTX.appveyor:
         LOGGER.debug('running on AV; VCR recording disabled')
-        cmd = f'{cmd} --vcr-record=none'
+        args.append('--vcr-record=none')
 
     if CTX.appveyor and config.TEST_AV_RUNNER_OPTIONS():
-        cmd = f'{cmd} {config.TEST_AV_RUNNER_OPTIONS()}'
+        args.append(config.TEST_AV_RUNNER_OPTIONS())
     elif config.TEST_RUNNER_OPTIONS():
-        cmd = f'{cmd} {config.TEST_RUNNER_OPTIONS()}'
+        args.append(config.TEST_RUNNER_OPTIONS())
+
+    args.append(pytest_options(shard))
+    return ' '.join(args)
+
+
+def command_plan() -> typing.Tuple[str, int]:
+    """
+    Returns the pytest arguments and timeout, re-using the ones of a previous run if their inputs did not change
+
+    Returns: tuple of (arguments following the test targets, timeout in seconds)
+    """
+    plan_file = epab.utils.cache_path('pytest', 'plan.json')
+    fingerprint = _plan_fingerprint()
+    if plan_file.exists() and Path(_Coverage.config_file()).exists():
+        try:
+            plan = json.loads(plan_file.read_text(encoding='utf8'))
+        except ValueError:
+            LOGGER.debug('invalid pytest plan, ignoring: %s', plan_file)
+        else:
+            if plan.get('fingerprint') == fingerprint:
+                LOGGER.debug('re-using pytest command plan')
+                return plan['command'], plan['timeout']
+    plan = {'fingerprint': fingerprint, 'command': _build_command(), 'timeout': config.TEST_PYTEST_TIMEOUT()}
+    epab.utils.write_atomic(plan_file, json.dumps(plan))
+    return plan['command'], plan['timeout']
+
+
+def _changed_test_file(path: str, test: str) -> typing.Optional[bool]:
+    """
+    Returns: True for a test module, False for another file of the test suite, None for a file outside of it
+    """
+    if not path.startswith(f'{Path(test).as_posix().rstrip("/")}/'):
+        return None
+    name = Path(path).name
+    return name != 'conftest.py' and name.startswith('test_') and name.endswith('.py')
+
+
+def affected_tests(test: str) -> typing.Optional[typing.List[str]]:
+    """
+    Selects the tests affected by the files changed since the last successful run
+
+    Changed test modules are run in full; for other changed files, the tests that executed them during previous runs
+    are selected. If a change cannot be mapped to tests (conftest, config files, other files of the test suite, or
+    Python files without coverage data), the whole test suite is selected.
+
+    Args:
+        test: target of pytest
+
+    Returns: sorted list of test modules and test node ids, or None to run the whole test suite
+    """
+    impact_map = epab.utils.ImpactMap()
+    if impact_map.green_sha is None or not CTX.repo.has_commit(impact_map.green_sha):
+        LOGGER.info('no previous successful run, running all tests')
+        return None
+    test_modules: typing.Set[str] = set()
+    node_ids: typing.Set[str] = set()
+    for path in CTX.repo.list_changed_files(impact_map.green_sha):
+        if path.startswith(f'{epab.utils.CACHE_DIR}/'):
+            continue
+        is_test_module = _changed_test_file(path, test)
+        if is_test_module:
+            if Path(path).exists():
+                test_modules.add(path)
+            continue
+        if is_test_module is False or path in _FULL_RUN_FILES:
+            LOGGER.info('%s changed, running all tests', path)
+            return None
+        tests = impact_map.tests_for(path)
+        if tests is None:
+            if path.endswith('.py'):
+                LOGGER.info('no coverage data for %s, running all tests', path)
+                return None
+            LOGGER.debug('ignoring change: %s', path)
+            continue
+        node_ids.update(tests)
+    selected = test_modules | {
+        node_id for node_id in node_ids
+        if node_id.split('::')[0] not in test_modules and Path(node_id.split('::')[0]).exists()
+    }
+    LOGGER.info('%s test modules and %s tests affected by the changes', len(test_modules), len(selected - test_modules))
+    return sorted(selected)
+
+
+def _record_test_impact(success: bool):
+    impact_map = epab.utils.ImpactMap()
+    if Path('.coverage').exists():
+        try:
+            impact_map.update(epab.utils.coverage_contexts('.coverage'))
+        except sqlite3.Error:
+            LOGGER.debug('unable to read coverage data', exc_info=True)
+    if success and CTX.repo is not None:
+        impact_map.green_sha = CTX.repo.get_sha()
+    impact_map.save()
+
+
+def _record_test_durations(junit_files: typing.Iterable[str]):
+    durations: typing.Dict[str, float] = {}
+    for junit_file in map(Path, junit_files):
+        if junit_file.exists():
+            try:
+                durations.update(epab.utils.junit_durations(junit_file))
+            except ElementTree.ParseError:
+                LOGGER.debug('unable to read test durations from %s', junit_file, exc_info=True)
+            # Reports are consumed, so that a run that did not write one is not recorded twice
+            junit_file.unlink()
+    sha = CTX.repo.get_sha() if CTX.repo is not None else None
+    epab.utils.DurationStore().record(sha, durations)
+
+
+def _test_modules(test: str) -> typing.List[str]:
+    return sorted(
+        path.as_posix() for path in Path(test).rglob('*.py')
+        if path.name.startswith('test_') or path.name.endswith('_test.py')
+    )
+
+
+def split_tests(targets: typing.List[str], workers: int) -> typing.List[typing.Tuple[typing.List[str], float]]:
+    """
+    Splits pytest targets into shards of similar duration
+
+    Targets are grouped by test module, and each module is weighted with the duration of its tests during previous
+    runs (modules that never ran are given the average duration of the others).
+
+    Args:
+        targets: test modules and test node ids
+        workers: maximum number of shards
+
+    Returns: list of tuples of (targets, expected duration in seconds)
+    """
+    store = epab.utils.DurationStore()
+    modules: typing.Dict[str, typing.List[str]] = {}
+    for target in targets:
+        modules.setdefault(target.split('::')[0], []).append(target)
+    costs: typing.Dict[str, typing.Optional[float]] = {}
+    for module, module_targets in modules.items():
+        durations = [duration for duration in map(store.duration, module_targets) if duration is not None]
+        costs[module] = sum(durations) if durations else None
+    known_costs = [cost for cost in costs.values() if cost is not None]
+    default_cost = sum(known_costs) / len(known_costs) if known_costs else _DEFAULT_MODULE_DURATION
+    weights = {module: default_cost if cost is None else cost for module, cost in costs.items()}
+    return [
+        ([target for module in shard for target in modules[module]], sum(weights[module] for module in shard))
+        for shard in epab.utils.split_into_shards(weights, workers)
+    ]
+
+
+def _run_shard(cmd: str, timeout: int) -> typing.Tuple[str, int, float]:
+    start = time.perf_counter()
+    output, code = epab.utils.run(cmd, mute=True, failure_ok=True, timeout=timeout)
+    return output, code, time.perf_counter() - start
+
+
+def _combine_coverage(shard_count: int):
+    data_files = [_Coverage.data_file(index) for index in range(shard_count)]
+    data_files = [data_file for data_file in data_files if Path(data_file).exists()]
+    if not data_files:
+        LOGGER.error('no coverage data found for the shards')
+        return
+    rcfile = _Coverage.config_file()
+    LOGGER.info('combining coverage data of %s shards', len(data_files))
+    epab.utils.run(f'coverage combine --rcfile={rcfile} {" ".join(data_files)}', mute=True)
+    epab.utils.run(f'coverage xml --rcfile={rcfile}', mute=True, failure_ok=True)
+    epab.utils.run(f'coverage html --rcfile={rcfile}', mute=True, failure_ok=True)
+
+
+def _run_shards(shards: typing.List[typing.Tuple[typing.List[str], float]], flags: str, timeout: int) -> int:
+    """
+    Runs each shard in its own pytest process, then combines their coverage data
+
+    Returns: exit code of the first failed shard, or 0
+    """
+    stale_files = [
+        *Path(_Coverage.data_file(0)).parent.glob('.coverage.*'),
+        *Path(_junit_file()).parent.glob('junit.*.xml'),
+    ]
+    for stale_file in stale_files:
+        stale_file.unlink()
+    commands = [
+        f'pytest {" ".join(shlex.quote(target) for target in targets)} {_build_command(index)}{flags}'
+        for index, (targets, _) in enumerate(shards)
+    ]
+    LOGGER.info('running tests in %s shards', len(shards))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        futures = [executor.submit(_run_shard, cmd, timeout) for cmd in commands]
+        results = []
+        for index, future in enumerate(futures):
+            output, code, elapsed = future.result()
+            if code == 0:
+                LOGGER.info('shard %s:\n%s', index, output)
+            results.append((code, elapsed))
+    elapsed_total = time.perf_counter() - start
+    for index, ((targets, expected), (code, elapsed)) in enumerate(zip(shards, results)):
+        LOGGER.info(
+            'shard %s: %s targets, %.1fs (expected %.1fs): %s',
+            index, len(targets), elapsed, expected, 'failed' if code else 'passed',
+        )
+    LOGGER.info('shards ran in %.1fs (sum of shards: %.1fs)', elapsed_total, sum(elapsed for _, elapsed in results))
+    _combine_coverage(len(shards))
+    return next((code for code, _ in results if code), 0)
+
+
+# pylint: disable=too-many-locals,too-many-branches
+@epab.utils.run_once
+@epab.utils.timeit
+def _pytest(test, *, long, show, exitfirst, last_failed, failed_first, rm_cov, affected=False, workers=1):
+    LOGGER.info('running test suite')
+    os.environ['PYTEST_QT_API'] = 'pyqt5'
+    args, timeout = command_plan()
+    targets = None
+    if affected:
+        targets = affected_tests(test)
+        if targets == []:
+            LOGGER.info('no test affected by the changes')
+            return
+        if targets is not None:
+            test = ' '.join(shlex.quote(item) for item in targets)
+    shards = None
+    if workers > 1:
+        if targets is None and Path(test).is_dir():
+            targets = _test_modules(test)
+        if targets:
+            shards = split_tests(targets, workers)
+        else:
+            LOGGER.warning('no test module found in "%s", running a single pytest process', test)
+    cmd = f'pytest {test} {args}'
 
     long = ' --long' if long else ''
     exitfirst = ' --exitfirst' if exitfirst else ''
@@ -172,13 +461,27 @@ def _pytest(test, *, long, show, exitfirst, last_failed, failed_first, rm_cov):
 
     if rm_cov and Path('./htmlcov').exists():
         shutil.rmtree('./htmlcov')
-    cmd = f'{cmd} {pytest_options()}{long}{exitfirst}{last_failed}{failed_first}'
+    flags = f'{long}{exitfirst}{last_failed}{failed_first}'
+    if affected:
+        flags += IMPACT_OPTIONS
 
+    success = False
     try:
-        elib_run.run(cmd, timeout=config.TEST_PYTEST_TIMEOUT())
+        if shards:
+            code = _run_shards(shards, flags, timeout)
+            if code:
+                LOGGER.error('test suite failed')
+                sys.exit(code)
+        else:
+            epab.utils.run(f'{cmd}{flags}', timeout=timeout)
+        success = True
     finally:
+        if affected:
+            _record_test_impact(success)
+        _record_test_durations(
+            [_junit_file(index) for index in range(len(shards))] if shards else [_junit_file()]
+        )
         upload_coverage()
-        _Coverage.remove_config_file()
     if show:
         # noinspection SpellCheckingInspection
         path = Path('./htmlcov/index.html').absolute()
@@ -194,7 +497,10 @@ def _pytest(test, *, long, show, exitfirst, last_failed, failed_first, rm_cov):
 @click.option('-ff', '--failed-first', is_flag=True, default=False,
               help='Run all tests but run the last failures first')
 @click.option('-t', '--test', default=config.TEST_TARGET(), help='Select which tests to run')
-def pytest(test, long, show, exitfirst, last_failed, failed_first, rm_cov):
+@click.option('--affected', is_flag=True, default=False,
+              help='Only run the tests affected by the changes since the last successful run')
+@click.option('-w', '--workers', default=1, type=int, help='Split the tests across that many pytest processes')
+def pytest(test, long, show, exitfirst, last_failed, failed_first, rm_cov, affected, workers):
     """
     Runs Pytest (https://docs.pytest.org/en/latest/)
     """
@@ -206,4 +512,6 @@ def pytest(test, long, show, exitfirst, last_failed, failed_first, rm_cov):
         last_failed=last_failed,
         failed_first=failed_first,
         rm_cov=rm_cov,
+        affected=affected,
+        workers=workers,
     )
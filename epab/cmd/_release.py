@@ -2,6 +2,7 @@
 """
 Creates a wheel from a Github repo
 """
+import functools
 import logging
 import os
 import shutil
@@ -75,7 +76,6 @@ def _print_build_info(current_branch: str, next_version: str):
 
 def _run_linters(ctx):
     ctx.invoke(epab.linters.lint)
-    _check_dirty('linters produced artifacts')
     LOGGER.info('linters OK')
 
 
@@ -114,50 +114,66 @@ def _set_release_description():
             os.putenv('RELEASE_DESCRIPTION', 'No description')
 
 
-@epab.utils.timeit
-def _release(ctx: click.Context):
-    CTX.stash = False
-
-    _remove_av_artifacts()
-
-    _set_release_description()
-
-    current_branch = CTX.repo.get_current_branch()
-    next_version = epab.utils.get_next_version()
-
-    _print_build_info(current_branch, next_version)
-
-    _check_dirty('initial check failed')
-
+def _log_commit():
     LOGGER.info('running on commit: %s', CTX.repo.latest_commit())
 
-    _run_linters(ctx)
-
-    _run_tests(ctx)
-
-    if CTX.appveyor:
-        _copy_artifacts()
 
+def _tag(next_version: str):
     CTX.repo.tag(next_version, overwrite=True)
 
-    _clean()
-
-    _check_dirty('last check before build')
-
-    if config.MAKE_GRAPH():
-        ctx.invoke(epab.cmd.graph)
-
-    _create_wheel()
 
+def _publish(current_branch: str):
     if current_branch == 'master':
         _upload_to_twine()
-
-    if current_branch != 'master':
+    else:
         CTX.repo.push_tags()
 
+
+def _update_av_build_info(next_version: str):
+    epab.utils.AV.set_env_var('EPAB_VERSION', next_version)
+    _update_av_build_name(next_version)
+
+
+def _release_pipeline(ctx: click.Context) -> epab.utils.Pipeline:
+    stages = [
+        epab.utils.Stage('remove_av_artifacts', _remove_av_artifacts, mutates_repo=True),
+        epab.utils.Stage('release_description', _set_release_description),
+        epab.utils.Stage('current_branch', CTX.repo.get_current_branch, outputs=['current_branch']),
+        epab.utils.Stage('next_version', epab.utils.get_next_version, outputs=['next_version']),
+        epab.utils.Stage('build_info', _print_build_info, inputs=['current_branch', 'next_version']),
+        epab.utils.Stage('initial_check', functools.partial(_check_dirty, 'initial check failed'),
+                         depends_on=['build_info']),
+        epab.utils.Stage('commit_info', _log_commit, depends_on=['initial_check']),
+        epab.utils.Stage('linters', functools.partial(_run_linters, ctx), depends_on=['initial_check']),
+        epab.utils.Stage('tests', functools.partial(_run_tests, ctx), depends_on=['initial_check']),
+        # Tests write to the working tree while they run: the linters' artifacts are only looked for once they are done
+        epab.utils.Stage('linters_check', functools.partial(_check_dirty, 'linters produced artifacts'),
+                         depends_on=['linters', 'tests']),
+    ]
     if CTX.appveyor:
-        epab.utils.AV.set_env_var('EPAB_VERSION', next_version)
-        _update_av_build_name(next_version)
+        stages.append(epab.utils.Stage('artifacts', _copy_artifacts, depends_on=['tests']))
+    stages.extend([
+        epab.utils.Stage('tag', _tag, inputs=['next_version'], mutates_repo=True),
+        epab.utils.Stage('clean', _clean),
+        epab.utils.Stage('final_check', functools.partial(_check_dirty, 'last check before build'),
+                         depends_on=['clean']),
+    ])
+    if config.MAKE_GRAPH():
+        stages.append(epab.utils.Stage('graph', functools.partial(ctx.invoke, epab.cmd.graph),
+                                       depends_on=['final_check']))
+    stages.extend([
+        epab.utils.Stage('wheel', _create_wheel, depends_on=['final_check']),
+        epab.utils.Stage('publish', _publish, inputs=['current_branch'], mutates_repo=True),
+    ])
+    if CTX.appveyor:
+        stages.append(epab.utils.Stage('av_build_info', _update_av_build_info, inputs=['next_version']))
+    return epab.utils.Pipeline('release', stages)
+
+
+@epab.utils.timeit
+def _release(ctx: click.Context):
+    CTX.stash = False
+    _release_pipeline(ctx).run()
 
 
 @click.command()
@@ -1,14 +1,19 @@
 # coding=utf-8
 """
 Click command to write the requirements
+
+Both requirement files are generated from a single dependency resolution, by reading "Pipfile.lock" directly. The
+hash of the lock file is written in a header comment, so that the files are only re-written when the lock changes.
 """
+import hashlib
+import json
 import logging
 import re
 import sys
+import typing
 from pathlib import Path
 
 import click
-import elib_run
 
 import epab.utils
 from epab.core import CTX
@@ -16,17 +21,37 @@ from epab.core import CTX
 LOGGER = logging.getLogger('EPAB')
 
 RE_REQ_PATTERN = re.compile(r'^.*==[\d\.]')
+HEADER = '# generated from Pipfile.lock (sha256: {lock_hash})'
+REQUIREMENT_FILES = {'default': 'requirements.txt', 'develop': 'requirements-dev.txt'}
 
 
-def _write_reqs_file(cmd, file_path):
-    LOGGER.info('writing: %s', file_path)
+def _requirements(packages: typing.Dict[str, dict]) -> typing.List[str]:
+    """
+    Returns: pinned requirements of a section of Pipfile.lock, sorted by name
+    """
     output = []
-    raw_output, _ = elib_run.run(cmd, mute=True, filters='Courtesy Notice: ')
-    # raw_output = raw_output.encode('utf8').replace(b'\r\n', b'\n').decode('utf8')
-    for line in raw_output.splitlines():
+    for name, spec in sorted(packages.items(), key=lambda item: item[0].lower()):
+        extras = f'[{",".join(sorted(spec["extras"]))}]' if spec.get('extras') else ''
+        line = f'{name}{extras}{spec.get("version", "")}'
+        if spec.get('markers'):
+            line = f'{line}; {spec["markers"]}'
         if RE_REQ_PATTERN.match(line):
             output.append(line)
-    Path(file_path).write_text('\n'.join(output))
+    return output
+
+
+def _header(file_path: str) -> typing.Optional[str]:
+    path = Path(file_path)
+    if not path.exists():
+        return None
+    with path.open(encoding='utf8') as stream:
+        return stream.readline().rstrip('\n')
+
+
+def _write_reqs_file(packages: typing.Dict[str, dict], file_path: str, header: str):
+    LOGGER.info('writing: %s', file_path)
+    content = '\n'.join([header] + _requirements(packages))
+    epab.utils.write_atomic(Path(file_path), f'{content}\n')
 
 
 @epab.utils.run_once
@@ -42,9 +67,19 @@ def _write_reqs(amend: bool = False, stage: bool = False):
     """
     LOGGER.info('writing requirements')
 
-    base_cmd = 'pipenv lock -r'
-    _write_reqs_file(f'{base_cmd}', 'requirements.txt')
-    _write_reqs_file(f'{base_cmd} -d', 'requirements-dev.txt')
+    epab.utils.run('pipenv lock', mute=True, filters='Courtesy Notice: ')
+    lock_file = Path('Pipfile.lock')
+    if not lock_file.exists():
+        LOGGER.error('Pipfile.lock not found')
+        sys.exit(-1)
+    lock_content = lock_file.read_bytes()
+    header = HEADER.format(lock_hash=hashlib.sha256(lock_content).hexdigest())
+    if all(_header(file_path) == header for file_path in REQUIREMENT_FILES.values()):
+        LOGGER.info('Pipfile.lock did not change, requirements are up-to-date')
+        return
+    lock = json.loads(lock_content.decode('utf8'))
+    for section, file_path in REQUIREMENT_FILES.items():
+        _write_reqs_file(lock.get(section, {}), file_path, header)
     files_to_add = ['Pipfile', 'requirements.txt', 'requirements-dev.txt']
 
     if amend:
@@ -0,0 +1,44 @@
+# coding=utf-8
+"""
+Reports the tests that became slower, from the durations recorded by "epab pytest"
+"""
+import logging
+import sys
+
+import click
+
+import epab.utils
+
+LOGGER = logging.getLogger('EPAB')
+
+
+@epab.utils.timeit
+def _test_stats(runs: int, threshold: float, min_duration: float, check: bool):
+    store = epab.utils.DurationStore()
+    LOGGER.info('%s test runs recorded', len(store.runs))
+    regressions = store.regressions(runs, threshold, min_duration)
+    if not regressions:
+        LOGGER.info('no test became more than %s%% slower over the last %s runs', threshold, runs)
+        return
+    LOGGER.info('%s tests became more than %s%% slower over the last %s runs:', len(regressions), threshold, runs)
+    for node_id, before, after in regressions:
+        growth = f'+{(after / before - 1) * 100:.0f}%' if before else 'new'
+        LOGGER.info('  %s: %.3fs -> %.3fs (%s)', node_id, before, after, growth)
+    if check:
+        LOGGER.error('some tests became slower')
+        sys.exit(1)
+
+
+@click.command()
+@click.option('-k', '--runs', default=5, type=click.IntRange(min=1), show_default=True,
+              help='Compare the median duration of the last runs of each test to the same number of runs before')
+@click.option('-t', '--threshold', default=20.0, type=click.FloatRange(min=0), show_default=True,
+              help='Minimum growth of the median duration, in percent')
+@click.option('-m', '--min-duration', default=0.1, type=click.FloatRange(min=0), show_default=True,
+              help='Ignore tests faster than this, in seconds')
+@click.option('-c', '--check', is_flag=True, default=False, help='Exit with an error if a test became slower')
+def test_stats(runs, threshold, min_duration, check):
+    """
+    Reports the tests that became slower over the last runs of "epab pytest"
+    """
+    _test_stats(runs, threshold, min_duration, check)
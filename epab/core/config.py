@@ -1,110 +1,288 @@
 # coding=utf-8
 """
 Handles EPAB's config file
+
+The config file is parsed once into an immutable snapshot that all config values read from; the snapshot is only
+re-parsed when the file changes.
 """
 
+import copy
+import hashlib
 import logging
+import os
 import pathlib
+import threading
+import types
+import typing
 
 import elib_config
+import tomlkit
+
+LOGGER = logging.getLogger('EPAB')
+
+
+def _plain(value: typing.Any) -> typing.Any:
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+class ConfigSnapshot:
+    """
+    Immutable view of the values of the config file
+
+    Args:
+        stamp: (path, mtime, size) of the config file when it was read
+        values: parsed content of the config file
+    """
+    __slots__ = ('_stamp', '_values')
+
+    def __init__(self, stamp: typing.Optional[tuple], values: typing.Mapping[str, typing.Any]) -> None:
+        object.__setattr__(self, '_stamp', stamp)
+        object.__setattr__(self, '_values', types.MappingProxyType(_plain(dict(values))))
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    @property
+    def stamp(self) -> typing.Optional[tuple]:
+        """
+        Returns: (path, mtime, size) of the config file when it was read
+        """
+        return self._stamp
+
+    def get(self, path: typing.Sequence[str]) -> typing.Optional[typing.Any]:
+        """
+        Returns a copy of a value of the config file
+
+        Args:
+            path: keys leading to the value
+
+        Returns: value, or None if it is not in the config file
+        """
+        value: typing.Any = self._values
+        for key in path:
+            try:
+                value = value[key]
+            except (KeyError, TypeError):
+                return None
+        return copy.deepcopy(value)
+
+
+_SNAPSHOT = ConfigSnapshot(None, {})
+_SNAPSHOT_LOCK = threading.Lock()
+
+# All the values of EPAB's config, in order of declaration
+_CONFIG_VALUES: typing.List[typing.Any] = []
+
+
+def _config_file_stamp() -> typing.Optional[tuple]:
+    config_file = pathlib.Path(elib_config.ELIBConfig.config_file_path).absolute()
+    try:
+        stat = config_file.stat()
+    except OSError:
+        return None
+    return str(config_file), stat.st_mtime_ns, stat.st_size
+
+
+def config_snapshot() -> ConfigSnapshot:
+    """
+    Returns the snapshot of the config file, reading the file again only if it changed
+    """
+    global _SNAPSHOT  # pylint: disable=global-statement
+    stamp = _config_file_stamp()
+    with _SNAPSHOT_LOCK:
+        if _SNAPSHOT.stamp != stamp:
+            LOGGER.debug('reading config file: %s', elib_config.ELIBConfig.config_file_path)
+            content = pathlib.Path(stamp[0]).read_text(encoding='utf8') if stamp else ''
+            _SNAPSHOT = ConfigSnapshot(stamp, tomlkit.parse(content))
+        return _SNAPSHOT
+
+
+def _from_environ(path: str) -> typing.Optional[str]:
+    var_name = elib_config.ELIBConfig.config_sep_str.join((elib_config.ELIBConfig.app_name, path)).upper()
+    for key, value in os.environ.items():
+        if key.upper() == var_name:
+            return value
+    return None
+
+
+class _SnapshotValue:
+    """
+    Reads values from the config snapshot instead of parsing the config file each time
+
+    Values are looked up the same way elib_config does it: in the environment first, then in the config file, then
+    in the default value.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super(_SnapshotValue, self).__init__(*args, **kwargs)  # type: ignore
+        _CONFIG_VALUES.append(self)
+
+    def raw_value(self) -> typing.Optional[object]:
+        """
+        Returns: raw value, before it is checked and cast
+        """
+        path: str = self.path  # type: ignore
+        raw_value: typing.Optional[object] = _from_environ(path)
+        if raw_value is None:
+            raw_value = config_snapshot().get(path.split(elib_config.ELIBConfig.config_sep_str))
+        if raw_value is None and self.default != elib_config.SENTINEL:  # type: ignore
+            raw_value = self.default  # type: ignore
+        return raw_value
+
+
+class _ConfigValueBool(_SnapshotValue, elib_config.ConfigValueBool):
+    pass
+
+
+class _ConfigValueInteger(_SnapshotValue, elib_config.ConfigValueInteger):
+    pass
+
 
-CHANGELOG_DISABLE = elib_config.ConfigValueBool(
+class _ConfigValueList(_SnapshotValue, elib_config.ConfigValueList):
+    pass
+
+
+class _ConfigValuePath(_SnapshotValue, elib_config.ConfigValuePath):
+    pass
+
+
+class _ConfigValueString(_SnapshotValue, elib_config.ConfigValueString):
+    pass
+
+
+CHANGELOG_DISABLE = _ConfigValueBool(
     'changelog', 'disable', description='Disable changelog building', default=False
 )
-CHANGELOG_FILE_PATH = elib_config.ConfigValuePath(
+CHANGELOG_FILE_PATH = _ConfigValuePath(
     'changelog', 'file_path', description='Path to changelog file', default='CHANGELOG.md'
 )
 CHANGELOG_FILE_PATH.must_be_file()
-TEST_RUNNER_OPTIONS = elib_config.ConfigValueString(
+CHANGELOG_INCREMENTAL = _ConfigValueBool(
+    'changelog', 'incremental', description='Only add the versions newer than the latest one of the changelog',
+    default=False
+)
+CHANGELOG_FULL_REBUILD_EVERY = _ConfigValueInteger(
+    'changelog', 'full_rebuild_every',
+    description='Rebuild the whole changelog every that many incremental updates, and compare it to the incremental '
+                'update (0 to never rebuild it)',
+    default=10
+)
+CHANGELOG_FULL_REBUILD_EVERY.set_limits(min_=0, max_=1000)
+TEST_RUNNER_OPTIONS = _ConfigValueString(
     'test', 'runner_options', description='Additional options for test run', default=''
 )
-TEST_DURATION_COUNT = elib_config.ConfigValueInteger(
+TEST_DURATION_COUNT = _ConfigValueInteger(
     'test', 'duration_count', description='Amount of "slow" tests to show', default=10
 )
 TEST_DURATION_COUNT.set_limits(min_=0, max_=50)
 
-TEST_TARGET = elib_config.ConfigValueString(
+TEST_TARGET = _ConfigValueString(
     'test', 'target', description='Target of pytest', default='test'
 )
 
-TEST_COVERAGE_FAIL_UNDER = elib_config.ConfigValueInteger(
+TEST_COVERAGE_FAIL_UNDER = _ConfigValueInteger(
     'test', 'coverage_fail_under', description='Minimal coverage to pass tests', default=20
 )
 TEST_COVERAGE_FAIL_UNDER.set_limits(min_=0, max_=100)
-TEST_PYTEST_TIMEOUT = elib_config.ConfigValueInteger(
+TEST_PYTEST_TIMEOUT = _ConfigValueInteger(
     'test', 'timeout', description='Timeout in seconds for pytest runner', default=300
 )
 TEST_PYTEST_TIMEOUT.set_limits(min_=0, max_=3600)
 
-LINT_LINE_LENGTH = elib_config.ConfigValueInteger(
+LINT_LINE_LENGTH = _ConfigValueInteger(
     'lint', 'line_length', description='Linter max line width', default=120
 )
 LINT_LINE_LENGTH.set_limits(min_=0, max_=500)
+LINT_CACHE = _ConfigValueBool(
+    'lint', 'cache', description='Skip linters whose inputs did not change since their last successful run',
+    default=True
+)
 
-PACKAGE_NAME = elib_config.ConfigValueString(
+PACKAGE_NAME = _ConfigValueString(
     'package_name', description='Package name'
 )
 
-FREEZE_ENTRY_POINT = elib_config.ConfigValueString(
+FREEZE_ENTRY_POINT = _ConfigValueString(
     'freeze', 'entry_point', description='Main entry point for pyinstaller', default=''
 )
-FREEZE_DATA_FILES = elib_config.ConfigValueList(
+FREEZE_DATA_FILES = _ConfigValueList(
     'freeze', 'data_files', description='PyInstaller data-files list', element_type=str, default=[]
 )
 
-DOC_REPO = elib_config.ConfigValueString(
+DOC_REPO = _ConfigValueString(
     'doc', 'repo', description='Documentation repository on Github', default=''
 )
-DOC_FOLDER = elib_config.ConfigValuePath(
+DOC_FOLDER = _ConfigValuePath(
     'doc', 'folder', description='Local documentation directory', default='./doc'
 )
 DOC_FOLDER.must_be_dir()
 
-QUIET = elib_config.ConfigValueBool(
+QUIET = _ConfigValueBool(
     'quiet', description='Less console output', default=False
 )
-VERBOSE = elib_config.ConfigValueBool(
+VERBOSE = _ConfigValueBool(
     'verbose', description='More console output', default=False
 )
 
-TEST_AV_RUNNER_OPTIONS = elib_config.ConfigValueString(
+TEST_AV_RUNNER_OPTIONS = _ConfigValueString(
     'appveyor', 'test_runner_options', description='Additional command line options for tests run on AV',
     default='--long'
 )
-ARTIFACTS = elib_config.ConfigValueList(
+ARTIFACTS = _ConfigValueList(
     'appveyor', 'artifacts', description='List of artifacts for Appveyor', element_type=str, default=[]
 )
-FLAKE8_EXCLUDE = elib_config.ConfigValueString(
+FLAKE8_EXCLUDE = _ConfigValueString(
     'lint', 'flake8_exclude', description='List of comma separated files for flake8 to exclude', default=''
 )
-MYPY_ARGS = elib_config.ConfigValueString(
+MYPY_ARGS = _ConfigValueString(
     'lint', 'mypy_args', description='Additional MyPy arguments', default=''
 )
-QT_RES_SRC = elib_config.ConfigValueString(
+MYPY_DAEMON = _ConfigValueBool(
+    'lint', 'mypy_daemon', description='Run MyPy through its daemon (dmypy), keeping it warm between runs',
+    default=False
+)
+QT_RES_SRC = _ConfigValueString(
     'qt', 'res_src', description='Qt resource file (.qrc) location', default=''
 )
-QT_RES_TGT = elib_config.ConfigValueString(
+QT_RES_TGT = _ConfigValueString(
     'qt', 'res_tgt', description='Compiled Qt resource file (.py) target location', default=''
 )
-UPLOAD_TO_TWINE = elib_config.ConfigValueBool(
+UPLOAD_TO_TWINE = _ConfigValueBool(
     'twine', 'upload', description='Upload package to Twine after build',
     default=True,
 )
-MAKE_GRAPH = elib_config.ConfigValueBool(
+MAKE_GRAPH = _ConfigValueBool(
     'graph', 'make',
     description='Generate graphs using PyReverse',
     default=True,
 )
 
 
-def setup_config(epab_version: str):
+def _config_fingerprint(epab_version: str) -> str:
+    hasher = hashlib.sha1()  # nosec
+    hasher.update(epab_version.encode('utf8'))
+    hasher.update(pathlib.Path('pyproject.toml').read_bytes())
+    prefix = f'{elib_config.ELIBConfig.app_name}{elib_config.ELIBConfig.config_sep_str}'.upper()
+    for key in sorted(os.environ):
+        if key.upper().startswith(prefix):
+            hasher.update(f'{key}={os.environ[key]}'.encode('utf8'))
+    for value in _CONFIG_VALUES:
+        hasher.update(repr((value.path, value.type_name, value.description, value.default)).encode('utf8'))
+    return hasher.hexdigest()
+
+
+def init_config(epab_version: str):
     """
-    Set up elib_config package
+    Points elib_config to EPAB's config file
+
+    Nothing is read or written: the config file is only read once a value is used.
 
     :param epab_version: installed version of EPAB as as string
     """
-    logger = logging.getLogger('EPAB')
-    logger.debug('setting up config')
     elib_config.ELIBConfig.setup(
         app_name='EPAB',
         app_version=epab_version,
@@ -112,7 +290,33 @@ def setup_config(epab_version: str):
         config_sep_str='__',
         root_path=['tool', 'epab']
     )
-    elib_config.write_example_config('pyproject.toml.example')
+
+
+def setup_config(epab_version: str):
+    """
+    Set up elib_config package, and validate the config
+
+    The example config file is only written, and the config only validated, when the config file, the environment or
+    EPAB itself changed since the last successful validation. Path values are always checked, since the files they
+    point to may have changed in the meantime.
+
+    :param epab_version: installed version of EPAB as as string
+    """
+    import epab.utils
+    LOGGER.debug('setting up config')
+    init_config(epab_version)
+    example = pathlib.Path('pyproject.toml.example')
     if not pathlib.Path('pyproject.toml').exists():
+        elib_config.write_example_config(str(example))
         raise FileNotFoundError('pyproject.toml')
+    fingerprint = _config_fingerprint(epab_version)
+    fingerprint_file = epab.utils.cache_path('config_fingerprint')
+    if example.exists() and fingerprint_file.exists() and fingerprint_file.read_text() == fingerprint:
+        LOGGER.debug('config unchanged since last validation')
+        for value in _CONFIG_VALUES:
+            if isinstance(value, elib_config.ConfigValuePath):
+                value()
+        return
+    elib_config.write_example_config(str(example))
     elib_config.validate_config()
+    epab.utils.write_atomic(fingerprint_file, fingerprint)
@@ -15,6 +15,7 @@ class CTX:
     """
     run_once: dict = {}
     known_executables: dict = {}
+    ref_snapshots: dict = {}
     repo: BaseRepo
     next_version: typing.Optional[str] = None
     stash: bool = False
@@ -24,6 +25,7 @@ class CTX:
     @staticmethod
     def _reset():
         CTX.known_executables = {}
+        CTX.ref_snapshots = {}
         CTX.run_once = {}
         CTX.repo = None
         CTX.next_version = None
@@ -2,9 +2,24 @@
 """
 EPAB's exceptions
 """
+# noinspection PyProtectedMember
+from elib_run._exc import ProcessTimeoutError as _ELIBRunProcessTimeoutError
 
 
 class ExecutableNotFoundError(FileNotFoundError):
     """
     Raised when an executable isn't found
     """
+
+
+class ProcessTimeoutError(_ELIBRunProcessTimeoutError, RuntimeError):
+    """
+    Raised when a process runs for longer than its timeout
+
+    It is also an elib_run ProcessTimeoutError, so that code catching the exceptions of "elib_run.run" keeps working
+    with "epab.utils.run".
+    """
+
+    def __init__(self, exe_name: str, timeout: float) -> None:
+        super(ProcessTimeoutError, self).__init__(exe_name, timeout, 'process killed')
+        self.timeout = timeout
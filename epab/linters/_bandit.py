@@ -2,22 +2,36 @@
 """
 Flake8 linter
 """
+import logging
 
 import click
 import elib_run
 
 import epab.utils
 from epab.core import config
+from ._changed import changed_python_files
+
+LOGGER = logging.getLogger('EPAB')
 
 
 @epab.utils.run_once
-def _bandit():
-    elib_run.run(f'bandit {config.PACKAGE_NAME()} -r', mute=True)
+@epab.utils.lint_cache('bandit')
+def _bandit(changed_only: bool = False, base_ref: str = 'HEAD'):
+    if changed_only:
+        targets = changed_python_files(base_ref)
+        if not targets:
+            LOGGER.info('bandit: no changed Python file, skipping')
+            return
+        elib_run.run(f'bandit {" ".join(targets)}', mute=True)
+    else:
+        elib_run.run(f'bandit {config.PACKAGE_NAME()} -r', mute=True)
 
 
 @click.command()
-def bandit():
+@click.option('-c', '--changed-only', is_flag=True, help='Only scan changed files')
+@click.option('-b', '--base-ref', default='HEAD', help='Reference to look for changes from (default: HEAD)')
+def bandit(changed_only: bool = False, base_ref: str = 'HEAD'):
     """
     Runs Flake8 (http://flake8.pycqa.org/en/latest/)
     """
-    _bandit()
+    _bandit(changed_only, base_ref)
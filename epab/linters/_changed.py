@@ -0,0 +1,36 @@
+# coding=utf-8
+"""
+Lists the files to lint when only linting changes
+"""
+import logging
+import typing
+from pathlib import Path
+
+import epab.utils
+from epab.core import CTX, config
+
+LOGGER = logging.getLogger('EPAB')
+
+
+def changed_python_files(base_ref: str = 'HEAD', with_dependents: bool = False) -> typing.List[str]:
+    """
+    Lists the Python files of the package that changed since base_ref
+
+    Args:
+        base_ref: reference to compare the working tree with
+        with_dependents: also include the modules of the package that import the changed files
+
+    Deleted files are not listed, but the modules that still import them are (with "with_dependents").
+
+    Returns: sorted list of paths relative to the root of the repository
+    """
+    package_dir = config.PACKAGE_NAME()
+    changed = [
+        path for path in CTX.repo.list_changed_files(base_ref)
+        if path.endswith('.py') and path.startswith(f'{package_dir}/')
+    ]
+    if with_dependents and changed:
+        changed = epab.utils.reverse_dependents(changed, package_dir)
+    changed = [path for path in changed if Path(path).exists()]
+    LOGGER.debug('changed Python files: %s', changed)
+    return changed
@@ -10,6 +10,7 @@ import epab.utils
 
 
 @epab.utils.run_once
+@epab.utils.lint_cache('pytest_dead_fixtures', 'pytest-deadfixtures')
 def _pytest_dead_fixtures():
     elib_run.run(f'pytest test --dead-fixtures --dup-fixtures', mute=True)
 
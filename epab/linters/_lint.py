@@ -2,11 +2,17 @@
 """
 Runs all linters
 """
+import concurrent.futures
 import logging
+import os
+import sys
+import time
+import typing
 
 import click
 
 import epab.utils
+from epab.core import CTX
 from ._bandit import bandit
 from ._dead_fixtures import pytest_dead_fixtures
 # from ._flake8 import flake8
@@ -15,33 +21,130 @@ from ._mypy import mypy
 from ._pylint import pylint
 from ._safety import safety
 
-# from epab.core import CTX
 # from ._sort import sort
 
 
 LOGGER = logging.getLogger('EPAB')
 
 
+def _run_linter(
+        ctx: click.Context,
+        linter: click.Command,
+        kwargs: dict,
+        log_buffer: epab.utils.LogBuffer,
+) -> typing.Tuple[int, float]:
+    log_buffer.start()
+    start = time.time()
+    return_code = 0
+    try:
+        ctx.invoke(linter, **kwargs)
+    except SystemExit as exc:
+        return_code = exc.code if isinstance(exc.code, int) else 1
+    finally:
+        log_buffer.flush()
+    return return_code, time.time() - start
+
+
+def _report(results: typing.Dict[str, typing.Optional[typing.Tuple[int, float]]]) -> int:
+    summary = []
+    exit_code = 0
+    for linter_name, result in results.items():
+        if result is None:
+            summary.append(f'{linter_name}: CANCELLED')
+            continue
+        return_code, elapsed = result
+        status = 'OK' if not return_code else f'FAILED ({return_code})'
+        summary.append(f'{linter_name}: {status} in {round(elapsed, 2)} seconds')
+        exit_code = exit_code or return_code
+    if exit_code:
+        LOGGER.error('linters summary:\n\t%s', '\n\t'.join(summary))
+    else:
+        LOGGER.debug('linters summary:\n\t%s', '\n\t'.join(summary))
+    return exit_code
+
+
+def _linters_for_changes(base_ref: str) -> typing.List[typing.Tuple[click.Command, dict]]:
+    changed_files = CTX.repo.list_changed_files(base_ref)
+    kwargs = dict(changed_only=True, base_ref=base_ref)
+    linters: typing.List[typing.Tuple[click.Command, dict]] = []
+    if any(path in ('Pipfile', 'Pipfile.lock') for path in changed_files):
+        linters.append((safety, {}))
+    linters.append((bandit, kwargs))
+    if any(path.startswith('test/') for path in changed_files):
+        linters.append((pytest_dead_fixtures, {}))
+    linters.extend([(pylint, kwargs), (mypy, kwargs)])
+    return linters
+
+
 @epab.utils.run_once
 @epab.utils.stashed
-def _lint(ctx: click.Context, amend: bool = False, stage: bool = False):
+def _lint(
+        ctx: click.Context,
+        amend: bool = False,
+        stage: bool = False,
+        jobs: typing.Optional[int] = None,
+        fail_fast: bool = False,
+        changed_only: bool = False,
+        base_ref: str = 'HEAD',
+):
     LOGGER.info('running all linters; stage: %s; amend: %s', stage, amend)
-    ctx.invoke(safety)
-    ctx.invoke(bandit)
-    ctx.invoke(pytest_dead_fixtures)
-    # ctx.invoke(pep8, amend=amend, stage=stage)
-    ctx.invoke(pylint)
-    # ctx.invoke(flake8)
-    ctx.invoke(mypy)
-    # if not CTX.appveyor:
-    #     ctx.invoke(sort, amend=amend, stage=stage)
+    if changed_only:
+        linters = _linters_for_changes(base_ref)
+    else:
+        linters = [
+            (safety, {}),
+            (bandit, {}),
+            (pytest_dead_fixtures, {}),
+            # (pep8, {}),
+            (pylint, {}),
+            # (flake8, {}),
+            (mypy, {}),
+            # (sort, {}),
+        ]
+    jobs = jobs or os.cpu_count() or 1
+    LOGGER.debug('running %s linters on %s workers; fail fast: %s', len(linters), jobs, fail_fast)
+    results: typing.Dict[str, typing.Optional[typing.Tuple[int, float]]] = {linter.name: None for linter, _ in linters}
+    log_buffer = epab.utils.LogBuffer()
+    log_buffer.install()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(_run_linter, ctx, linter, kwargs, log_buffer): linter.name
+                for linter, kwargs in linters
+            }
+            for future in concurrent.futures.as_completed(futures):
+                if future.cancelled():
+                    continue
+                results[futures[future]] = future.result()
+                if fail_fast and results[futures[future]][0]:
+                    LOGGER.error('%s failed; cancelling pending linters', futures[future])
+                    for pending_future in futures:
+                        pending_future.cancel()
+    finally:
+        log_buffer.uninstall()
+    exit_code = _report(results)
+    if exit_code:
+        sys.exit(exit_code)
 
 
 @click.command()
 @click.pass_context
 @click.option('-a', '--amend', is_flag=True, help='Amend last commit with changes')
 @click.option('-s', '--stage', is_flag=True, help='Stage changed files')
-def lint(ctx: click.Context, amend: bool = False, stage: bool = False):
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=None,
+              help='Number of linters to run concurrently (default: CPU count)')
+@click.option('-ff', '--fail-fast', is_flag=True, help='Cancel pending linters as soon as one fails')
+@click.option('-c', '--changed-only', is_flag=True, help='Only lint files changed since BASE_REF')
+@click.option('-b', '--base-ref', default='HEAD', help='Reference to look for changes from (default: HEAD)')
+def lint(
+        ctx: click.Context,
+        amend: bool = False,
+        stage: bool = False,
+        jobs: typing.Optional[int] = None,
+        fail_fast: bool = False,
+        changed_only: bool = False,
+        base_ref: str = 'HEAD',
+):
     """
     Runs all linters
 
@@ -49,5 +152,9 @@ def lint(ctx: click.Context, amend: bool = False, stage: bool = False):
         ctx: click context
         amend: whether or not to commit results
         stage: whether or not to stage changes
+        jobs: number of linters to run concurrently
+        fail_fast: cancel pending linters as soon as one fails
+        changed_only: only lint files changed since base_ref (and the modules importing them)
+        base_ref: reference to look for changes from
     """
-    _lint(ctx, amend, stage)
+    _lint(ctx, amend, stage, jobs, fail_fast, changed_only, base_ref)
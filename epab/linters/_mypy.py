@@ -2,29 +2,102 @@
 """
 Pep8 linter
 """
+import json
+import logging
+import re
 import sys
+import typing
+from pathlib import Path
 
 import click
 import elib_run
 
 import epab.utils
 from epab.core import config
+from ._changed import changed_python_files
+
+LOGGER = logging.getLogger('EPAB')
+
+# Exit code of dmypy both when the daemon itself failed and when the check hit a blocking error (e.g. a syntax error)
+_DAEMON_ERROR = 2
+
+# Error reported by the check ("path:line: error: ..."); a failure of the daemon itself does not report any
+_CHECK_ERROR_PATTERN = re.compile(r'^.+:[0-9]+(:[0-9]+)?: error: ', re.MULTILINE)
+
+
+def _status_file() -> str:
+    return str(epab.utils.cache_path('dmypy', 'status.json'))
+
+
+def _args_file() -> Path:
+    return epab.utils.cache_path('dmypy', 'args.json')
+
+
+def _daemon_args_changed(args: str) -> bool:
+    args_file = _args_file()
+    previous_args = json.loads(args_file.read_text(encoding='utf8')) if args_file.exists() else None
+    epab.utils.write_atomic(args_file, json.dumps(args))
+    return previous_args is not None and previous_args != args
+
+
+@epab.utils.timeit
+def _mypy_cold(args: str) -> int:
+    _, code = elib_run.run(f'mypy {args}', failure_ok=True)
+    return code
+
+
+@epab.utils.timeit
+def _mypy_daemon(args: str) -> typing.Optional[int]:
+    """
+    Runs MyPy through its daemon, starting it if needed
+
+    Returns: exit code of the check, or None if the daemon could not be used
+    """
+    if not elib_run.find_executable('dmypy'):
+        LOGGER.warning('dmypy not found; running mypy without daemon')
+        return None
+    if _daemon_args_changed(args):
+        LOGGER.warning('mypy arguments changed; stopping daemon and running mypy without daemon')
+        elib_run.run(f'dmypy --status-file {_status_file()} stop', mute=True, failure_ok=True)
+        return None
+    output, code = elib_run.run(f'dmypy --status-file {_status_file()} run -- {args}', failure_ok=True)
+    if code == _DAEMON_ERROR and not _CHECK_ERROR_PATTERN.search(output):
+        LOGGER.warning('mypy daemon failed; running mypy without daemon')
+        return None
+    return code
 
 
 @epab.utils.run_once
 @epab.utils.stashed
-def _mypy():
-    cmd = f'mypy -p {config.PACKAGE_NAME()} --ignore-missing-imports'
+@epab.utils.lint_cache('mypy')
+def _mypy(changed_only: bool = False, base_ref: str = 'HEAD', daemon: bool = None):
+    if daemon is None:
+        daemon = config.MYPY_DAEMON()
+    if changed_only and not daemon:
+        targets = changed_python_files(base_ref, with_dependents=True)
+        if not targets:
+            LOGGER.info('mypy: no changed Python file, skipping')
+            return
+        # Imported modules are still analyzed, but only errors in the targets are reported
+        args = f'{" ".join(targets)} --ignore-missing-imports --follow-imports=silent'
+    else:
+        # The daemon only re-checks what changed since its last run anyway
+        args = f'-p {config.PACKAGE_NAME()} --ignore-missing-imports'
     if config.MYPY_ARGS():
-        cmd += ' ' + config.MYPY_ARGS()
-    _, code = elib_run.run(cmd, failure_ok=True)
+        args += ' ' + config.MYPY_ARGS()
+    code = _mypy_daemon(args) if daemon else None
+    if code is None:
+        code = _mypy_cold(args)
     if code:
         sys.exit(code)
 
 
 @click.command()
-def mypy():
+@click.option('-c', '--changed-only', is_flag=True, help='Only check changed files, and the modules importing them')
+@click.option('-b', '--base-ref', default='HEAD', help='Reference to look for changes from (default: HEAD)')
+@click.option('--daemon/--no-daemon', default=None, help='Run through the mypy daemon (default: from config)')
+def mypy(changed_only: bool = False, base_ref: str = 'HEAD', daemon: bool = None):
     """
     Runs MyPy type-checker
     """
-    _mypy()
+    _mypy(changed_only, base_ref, daemon)
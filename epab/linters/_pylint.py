@@ -3,14 +3,17 @@
 Pylint linter
 """
 
+import logging
 import sys
 from pathlib import Path
 
 import click
-import elib_run
 
 import epab.utils
 from epab.core import config
+from ._changed import changed_python_files
+
+LOGGER = logging.getLogger('EPAB')
 
 IGNORE = '--ignore=CVS'
 LINE_LENGTH = f'--max-line-length={config.LINT_LINE_LENGTH()}'
@@ -32,24 +35,33 @@ BASE_CMD = ' '.join((IGNORE, LINE_LENGTH, JOBS, PERSISTENCE, INIT_HOOK, DISABLE,
 
 
 @epab.utils.run_once
-def _pylint(src, reports):
-    if src is None:
+@epab.utils.lint_cache('pylint')
+def _pylint(src, reports, changed_only: bool = False, base_ref: str = 'HEAD'):
+    if changed_only:
+        targets = changed_python_files(base_ref, with_dependents=True)
+        if not targets:
+            LOGGER.info('pylint: no changed Python file, skipping')
+            return
+        src = ' '.join(targets)
+    elif src is None:
         src = f'./{config.PACKAGE_NAME()}'
     cmd = f'pylint {src}'
     if reports:
         reports = '--reports=y'
     else:
         reports = '--reports=n'
-    elib_run.run(f'{cmd} {reports} {BASE_CMD}', mute=True)
+    epab.utils.run(f'{cmd} {reports} {BASE_CMD}', mute=True)
 
 
 @click.command()
 @click.argument('src', type=click.Path(exists=True), default=None, required=False)
 @click.option('-r', '--reports', is_flag=True, help='Display full report')
-def pylint(src, reports):
+@click.option('-c', '--changed-only', is_flag=True, help='Only lint changed files, and the modules importing them')
+@click.option('-b', '--base-ref', default='HEAD', help='Reference to look for changes from (default: HEAD)')
+def pylint(src, reports, changed_only: bool = False, base_ref: str = 'HEAD'):
     """
     Analyze a given python SRC (module or package) with Pylint (SRC must exist)
 
     Default module: CONFIG['package']
     """
-    _pylint(src, reports)
+    _pylint(src, reports, changed_only, base_ref)
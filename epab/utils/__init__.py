@@ -3,12 +3,25 @@
 Contains various utility functions
 """
 from ._av import AV
+from ._cache import CACHE_DIR, cache_path, write_atomic
+from ._changelog import ChangelogCommit, ChangelogVersion
 from ._ensure_exe import ensure_exe
 from ._exe_version import VersionInfo, get_product_version
-from ._gitignore import add_to_gitignore
+from ._git_batch import GIT_SPAWNS, GitBatch, SpawnCounter
+from ._gitignore import add_to_gitignore, ensure_gitignore_entries
+from ._imports import reverse_dependents
+from ._lint_cache import lint_cache
+from ._log_buffer import LogBuffer
 from ._next_version import get_next_version
+from ._pipeline import Pipeline, Stage
+from ._refs import RefSnapshot
 from ._repo import Repo
 from ._resource_path import resource_path
+from ._run import StreamingProcess, run
 from ._run_once import run_once
+from ._shards import split_into_shards
 from ._stashed import stashed
+from ._status import RepoStatus
+from ._test_durations import DurationStore, Regression, junit_durations
+from ._test_impact import ImpactMap, coverage_contexts
 from ._timeit import timeit
@@ -2,20 +2,29 @@
 """
 Convenience methods for AV
 """
+import os
 import subprocess  # nosec
+import typing
 
 import elib_run
 
+from ._av_sink import AVMessageSink, HTTPTransport, Message
+
 
 class AV:
     """
     Convenience methods for AV
     """
+    _sink: typing.Optional[AVMessageSink] = None
 
     @staticmethod
-    def _out(level, msg: str, details: str = None):
+    def _check_level(level: str):
         if level not in ('Information', 'Error'):
             raise ValueError(f'unknown level: {level}')
+
+    @staticmethod
+    def _out(level, msg: str, details: str = None):
+        AV._check_level(level)
         if details:
             subprocess.call(f'appveyor AddMessage "{msg}" -Category {level} -Details "{details}"')  # nosec
         else:
@@ -43,6 +52,43 @@ class AV:
         """
         AV._out('Error', msg, details)
 
+    @staticmethod
+    def _out_batch(batch: typing.List[Message]):
+        for level, msg, details in batch:
+            AV._out(level, msg, details)
+
+    @staticmethod
+    def sink() -> AVMessageSink:
+        """
+        Returns: the queue of messages sent in the background; messages go through the build worker API if
+            APPVEYOR_API_URL is set, or through the "appveyor" command otherwise
+        """
+        if AV._sink is None:
+            api_url = os.getenv('APPVEYOR_API_URL')
+            AV._sink = AVMessageSink(HTTPTransport(api_url) if api_url else AV._out_batch)
+        return AV._sink
+
+    @staticmethod
+    def post(level: str, msg: str, details: str = None):
+        """
+        Queues a message for AV without waiting for it to be sent
+
+        Args:
+            level: "Information" or "Error"
+            msg: message
+            details: message details
+        """
+        AV._check_level(level)
+        AV.sink().put(level, msg, details)
+
+    @staticmethod
+    def flush():
+        """
+        Waits until all messages queued with "post" have been sent
+        """
+        if AV._sink is not None:
+            AV._sink.flush()
+
     @staticmethod
     def update_build_version(build_version: str):
         """
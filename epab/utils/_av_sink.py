@@ -0,0 +1,161 @@
+# coding=utf-8
+"""
+Sends messages to AppVeyor from a background thread, so that logging never waits for the build worker
+
+Messages are taken off the queue in batches, but each message is still sent on its own: the build worker API only
+takes one message per request, and the "appveyor" command one message per call.
+"""
+import atexit
+import logging
+import queue
+import threading
+import typing
+import urllib.parse
+
+LOGGER = logging.getLogger('EPAB')
+
+Message = typing.Tuple[str, str, typing.Optional[str]]
+Transport = typing.Callable[[typing.List[Message]], None]
+
+_STOP = None
+
+
+class HTTPTransport:
+    """
+    Posts messages to the build worker API (see APPVEYOR_API_URL)
+
+    The API takes one message per request; the requests of a batch are sent one after the other on the same
+    connection.
+
+    Args:
+        api_url: base URL of the build worker API
+        timeout: timeout in seconds for each request
+    """
+
+    def __init__(self, api_url: str, timeout: float = 5) -> None:
+        url = urllib.parse.urlsplit(api_url)
+        self._host = url.hostname
+        self._port = url.port
+        self._path = url.path.rstrip('/') + '/api/build/messages'
+        self._timeout = timeout
+
+    def __call__(self, batch: typing.List[Message]):
+        import http.client
+        import json
+        connection = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+        try:
+            for category, msg, details in batch:
+                body = json.dumps({'message': msg, 'category': category, 'details': details or ''})
+                connection.request('POST', self._path, body=body, headers={'Content-Type': 'application/json'})
+                connection.getresponse().read()
+        finally:
+            connection.close()
+
+
+class AVMessageSink:
+    """
+    Queue of messages for AppVeyor, emptied in batches by a background thread
+
+    A batch is what the transport receives at once; it is up to the transport to send it in as few calls as it can.
+
+    When the queue is full, information messages are dropped (and counted), while error messages wait for room for
+    up to "block_timeout" seconds.
+
+    Args:
+        transport: callable sending a batch of (category, message, details) to AppVeyor
+        max_queue_size: maximum number of pending messages
+        batch_size: maximum number of messages handed to the transport at once
+        block_timeout: how long an error message waits for room in a full queue
+    """
+
+    def __init__(
+            self,
+            transport: Transport,
+            max_queue_size: int = 1000,
+            batch_size: int = 50,
+            block_timeout: float = 5,
+    ) -> None:
+        self._transport = transport
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._batch_size = batch_size
+        self._block_timeout = block_timeout
+        self._worker: typing.Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._registered = False
+        self.dropped = 0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='AVMessageSink', daemon=True)
+                self._worker.start()
+                if not self._registered:
+                    atexit.register(self.close)
+                    self._registered = True
+
+    def _next_batch(self) -> typing.List[typing.Optional[Message]]:
+        batch = [self._queue.get()]
+        while len(batch) < self._batch_size and batch[-1] is not _STOP:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            messages = [message for message in batch if message is not _STOP]
+            try:
+                if messages:
+                    self._transport(messages)
+            except Exception:  # pylint: disable=broad-except
+                # DEBUG records are not sent to AppVeyor, so this cannot loop back into the queue
+                LOGGER.debug('failed to send %s messages to AppVeyor', len(messages), exc_info=True)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(messages) != len(batch):
+                return
+
+    def put(self, category: str, msg: str, details: str = None) -> bool:
+        """
+        Queues a message
+
+        Args:
+            category: AppVeyor category ("Information" or "Error")
+            msg: message
+            details: message details
+
+        Returns: False if the message was dropped
+        """
+        self._ensure_worker()
+        try:
+            if category == 'Error':
+                self._queue.put((category, msg, details), timeout=self._block_timeout)
+            else:
+                self._queue.put_nowait((category, msg, details))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self):
+        """
+        Waits until all queued messages have been sent
+        """
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """
+        Sends the pending messages, reports dropped messages, and stops the background thread
+        """
+        if self._worker is None or not self._worker.is_alive():
+            return
+        if self.dropped:
+            self._queue.put(('Error', f'{self.dropped} messages were dropped (queue full)', None))
+            self.dropped = 0
+        self._queue.put(_STOP)
+        self._worker.join()
+        self._worker = None
@@ -0,0 +1,55 @@
+# coding=utf-8
+"""
+Manages EPAB's on-disk cache directory
+"""
+import os
+import stat
+import uuid
+from pathlib import Path
+
+CACHE_DIR = '.epab_cache'
+
+
+def cache_path(*parts: str) -> Path:
+    """
+    Returns a path inside EPAB's cache directory, creating the parent directories as needed
+
+    Args:
+        *parts: components of the path, relative to the cache directory
+
+    Returns: absolute path
+    """
+    path = Path(CACHE_DIR, *parts).absolute()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def write_atomic(path: Path, content: str, encoding: str = 'utf8'):
+    """
+    Writes a text file in one step, so that readers never see a partially written file
+
+    An existing file keeps its permissions; a new file gets the default permissions (0666 minus the umask).
+
+    Args:
+        path: file to write
+        content: text to write
+        encoding: text encoding
+    """
+    path = Path(path).absolute()
+    try:
+        mode = stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        mode = None
+    tmp_path = str(path.with_name(f'.{path.name}.{uuid.uuid4().hex}.tmp'))
+    # Unlike tempfile.mkstemp, which always uses 0600, the umask applies to the mode given to os.open
+    file_descriptor = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        with os.fdopen(file_descriptor, 'w', encoding=encoding, newline='') as stream:
+            stream.write(content)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, str(path))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,370 @@
+# coding=utf-8
+"""
+In-process equivalent of the history walk of "gitchangelog"
+
+Tags matching a filter are the versions; they are ordered by the commit date of the commit they point to, and HEAD is
+appended as the newest (unreleased) version. The commits of a version are those of
+"git log --topo-order --no-merges VERSION ^OLDER_VERSIONS...", in the same order:
+
+    * the commits of all the listed versions are collected in a single walk from all of them, by decreasing commit
+      date, like the "limited" walk of "git rev-list", until only commits of older, unlisted versions are left to visit
+    * each walked commit is given to the oldest version that contains it
+    * the commits of each version are then sorted with the topological sort of "git rev-list --topo-order"
+
+The next version can be given as a virtual tag on HEAD, so that the repository never has to be tagged temporarily.
+"""
+import datetime
+import heapq
+import itertools
+import logging
+import re
+import typing
+
+from ._describe import _tagger_date
+from ._git_batch import GitBatch
+from ._refs import RefSnapshot
+
+LOGGER = logging.getLogger('EPAB')
+
+# Number of extra commits "git rev-list" visits once only uninteresting commits are left, in case of clock skew
+_SLOP = 5
+
+
+class ChangelogCommit:
+    """
+    Commit as shown in the changelog
+
+    Args:
+        sha: full SHA of the commit
+        subject: first paragraph of the message, on a single line (like "%s" in "git log")
+        body: rest of the message (like "%b" in "git log")
+        author: name of the author
+    """
+    __slots__ = ('sha', 'subject', 'body', 'author')
+
+    def __init__(self, sha: str, subject: str, body: str, author: str) -> None:
+        self.sha = sha
+        self.subject = subject
+        self.body = body
+        self.author = author
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.sha[:7]}, {self.subject!r})'
+
+
+class ChangelogVersion:
+    """
+    Version of the changelog, with its commits
+
+    Args:
+        tag: name of the tag, or None for the unreleased commits
+        date: date of the version (tagger date for annotated tags, author date of the commit otherwise), YYYY-MM-DD
+        commits: commits of the version, in "git log --topo-order" order
+    """
+    __slots__ = ('tag', 'date', 'commits')
+
+    def __init__(self, tag: typing.Optional[str], date: str, commits: typing.List[ChangelogCommit]) -> None:
+        self.tag = tag
+        self.date = date
+        self.commits = commits
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.tag}, {self.date}, {len(self.commits)} commits)'
+
+
+class _Commit:
+    __slots__ = ('parents', 'author', 'author_date', 'date', 'message')
+
+    def __init__(self, content: bytes) -> None:
+        headers, _, message = content.partition(b'\n\n')
+        parents = []
+        encoding = 'utf8'
+        self.author = ''
+        self.author_date = 0
+        self.date = 0
+        for line in headers.split(b'\n'):
+            if line.startswith(b'parent '):
+                parents.append(line[7:].decode('ascii'))
+            elif line.startswith(b'author '):
+                identity, _, date = line[7:].rpartition(b'>')
+                self.author = identity.partition(b'<')[0].strip().decode('utf8', errors='replace')
+                self.author_date = int(date.split()[0])
+            elif line.startswith(b'committer '):
+                self.date = int(line.rsplit(b' ', 2)[1])
+            elif line.startswith(b'encoding '):
+                encoding = line[9:].decode('ascii')
+        self.parents = tuple(parents)
+        try:
+            self.message = message.decode(encoding, errors='replace')
+        except LookupError:
+            self.message = message.decode('utf8', errors='replace')
+
+
+# Commits never change, so their parsed content can be shared by all repositories
+_COMMITS: typing.Dict[str, _Commit] = {}
+
+
+def _commit(batch: GitBatch, sha: str) -> _Commit:
+    if sha not in _COMMITS:
+        commit = batch.read(sha)
+        if commit is None:
+            raise ValueError(f'commit not found: {sha}')
+        _COMMITS[sha] = _Commit(commit[2])
+    return _COMMITS[sha]
+
+
+def split_message(message: str) -> typing.Tuple[str, str]:
+    """
+    Splits a commit message the way "git log" does for "%s" and "%b"
+
+    Args:
+        message: raw commit message
+
+    Returns: tuple of (subject, body): the subject is the first paragraph, its lines joined with spaces, and the body
+    is everything after the blank lines that follow it
+    """
+    lines = message.split('\n')
+    index = 0
+    while index < len(lines) and not lines[index].strip():
+        index += 1
+    subject = []
+    while index < len(lines) and lines[index].strip():
+        subject.append(lines[index].rstrip())
+        index += 1
+    while index < len(lines) and not lines[index].strip():
+        index += 1
+    return ' '.join(subject), '\n'.join(lines[index:])
+
+
+def _limited_walk(batch: GitBatch, includes: typing.Iterable[str], excludes: typing.Iterable[str]) -> typing.Set[str]:
+    """
+    Lists the commits of "git rev-list INCLUDES... ^EXCLUDES...", walking them by decreasing commit date
+    """
+    sequence = itertools.count()
+    seen: typing.Set[str] = set()
+    uninteresting: typing.Set[str] = set()
+    queue: typing.List[typing.Tuple[int, int, str]] = []
+
+    def _push(sha: str):
+        seen.add(sha)
+        heapq.heappush(queue, (-_commit(batch, sha).date, next(sequence), sha))
+
+    def _mark_uninteresting(sha: str):
+        stack = [sha]
+        while stack:
+            current = stack.pop()
+            if current in uninteresting:
+                continue
+            uninteresting.add(current)
+            if current in seen:
+                stack.extend(_commit(batch, current).parents)
+
+    for sha in includes:
+        if sha not in seen:
+            _push(sha)
+    for sha in excludes:
+        uninteresting.add(sha)
+        if sha not in seen:
+            _push(sha)
+
+    interesting = []
+    slop = _SLOP
+    while queue:
+        _, _, sha = heapq.heappop(queue)
+        commit = _commit(batch, sha)
+        if sha in uninteresting:
+            for parent in commit.parents:
+                _mark_uninteresting(parent)
+                if parent not in seen:
+                    _push(parent)
+            if not queue:
+                break
+            if commit.date <= -queue[0][0] or any(queued not in uninteresting for _, _, queued in queue):
+                slop = _SLOP
+                continue
+            slop -= 1
+            if not slop:
+                break
+            continue
+        for parent in commit.parents:
+            if parent not in seen:
+                _push(parent)
+        interesting.append(sha)
+    return {sha for sha in interesting if sha not in uninteresting}
+
+
+def _topo_sort(batch: GitBatch, tip: str, commits: typing.Set[str]) -> typing.List[str]:
+    """
+    Sorts commits like "git rev-list --topo-order": a commit is only emitted once all its children were, the most
+    recent branch first
+
+    All the commits must be reachable from the tip through commits of the set.
+    """
+    if tip not in commits:
+        return []
+    in_degree = dict.fromkeys(commits, 1)
+    for sha in commits:
+        for parent in _commit(batch, sha).parents:
+            if parent in in_degree:
+                in_degree[parent] += 1
+    stack = [tip]
+    result = []
+    while stack:
+        sha = stack.pop()
+        for parent in _commit(batch, sha).parents:
+            if in_degree.get(parent):
+                in_degree[parent] -= 1
+                if in_degree[parent] == 1:
+                    stack.append(parent)
+        in_degree[sha] = 0
+        result.append(sha)
+    return result
+
+
+def _split_walk(batch: GitBatch, tips: typing.List[str], walked: typing.Set[str]) -> typing.List[typing.Set[str]]:
+    """
+    Splits walked commits between tips, each commit going to the last tip it is reachable from (through walked commits)
+
+    Returns: set of commits of each tip
+    """
+    owners: typing.Dict[str, int] = {}
+    for index in reversed(range(len(tips))):
+        stack = [tips[index]]
+        while stack:
+            sha = stack.pop()
+            if sha in owners or sha not in walked:
+                continue
+            owners[sha] = index
+            stack.extend(_commit(batch, sha).parents)
+    result: typing.List[typing.Set[str]] = [set() for _ in tips]
+    for sha, index in owners.items():
+        result[index].add(sha)
+    return result
+
+
+class _AncestorCheck:
+    """
+    Tells whether a commit is an ancestor of other commits, like "git merge-base --is-ancestor"
+
+    Each check stops as soon as the ancestor is found; the commits known not to lead to it are remembered, so that
+    no commit is visited twice across checks.
+
+    Args:
+        batch: GitBatch of the repository
+        ancestor: full SHA of the ancestor
+        within: if given, only the paths going through these commits are followed
+    """
+
+    def __init__(self, batch: GitBatch, ancestor: str, within: typing.Optional[typing.Set[str]] = None) -> None:
+        self._batch = batch
+        self._ancestor = ancestor
+        self._within = within
+        self._dead_ends: typing.Set[str] = set()
+
+    def __call__(self, descendant: str) -> bool:
+        stack = [descendant]
+        visited: typing.Set[str] = set()
+        while stack:
+            sha = stack.pop()
+            if sha == self._ancestor:
+                return True
+            if sha in visited or sha in self._dead_ends or (self._within is not None and sha not in self._within):
+                continue
+            visited.add(sha)
+            stack.extend(_commit(self._batch, sha).parents)
+        self._dead_ends.update(visited)
+        return False
+
+
+def _utc_date(timestamp: int) -> str:
+    return datetime.datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d')
+
+
+def _version_tags(batch: GitBatch, refs: RefSnapshot, head: str, tag_filter: str, next_version: typing.Optional[str]
+                  ) -> typing.List[typing.Tuple[str, str, str]]:
+    """
+    Returns: list of (tag name, commit SHA, date) for the tags matching the filter, oldest first
+    """
+    tags = dict(refs.tags)
+    if next_version:
+        tags[next_version] = head
+    result = []
+    for name in sorted(tags):
+        if not re.match(tag_filter, name):
+            continue
+        sha = tags[name]
+        header = batch.header(f'{sha}^{{commit}}')
+        if header is None:
+            LOGGER.debug('changelog: tag does not point to a commit, ignoring: %s', name)
+            continue
+        commit_sha = header[0]
+        if commit_sha != sha:
+            date = _tagger_date(batch, sha)
+        else:
+            date = _commit(batch, commit_sha).author_date
+        result.append((name, commit_sha, _utc_date(date)))
+    return sorted(result, key=lambda tag: _commit(batch, tag[1]).date)
+
+
+def changelog_versions(batch: GitBatch,
+                       refs: RefSnapshot,
+                       head: str,
+                       tag_filter: str,
+                       next_version: typing.Optional[str] = None,
+                       since: typing.Optional[str] = None,
+                       ) -> typing.List[ChangelogVersion]:
+    """
+    Lists the versions of the changelog and their commits, like "gitchangelog" does
+
+    With "since", only the versions newer than that tag are walked: the walk stops at the commits of the older
+    versions, so its cost depends on the number of new commits, not on the size of the history.
+
+    Args:
+        batch: GitBatch of the repository
+        refs: snapshot of the refs of the repository
+        head: full SHA of HEAD
+        tag_filter: regex the tags that are versions must match
+        next_version: name of a virtual tag on HEAD
+        since: name of a version: only the newer versions are listed
+
+    Returns: list of versions, the unreleased commits first (with a tag of None), then the newest version first
+
+    Raises:
+        ValueError: if "since" is not the tag of a version (the next version does not count, as it is not a tag yet)
+    """
+    tags = _version_tags(batch, refs, head, tag_filter, next_version)
+    entries = [(tag, sha, date) for tag, sha, date in reversed(tags)]
+    entries.insert(0, (None, head, _utc_date(_commit(batch, head).author_date)))
+    count = len(entries)
+    if since is not None:
+        names = [tag for tag, _, _ in entries]
+        if since == next_version or since not in names:
+            raise ValueError(f'unknown version: {since}')
+        count = names.index(since)
+    listed = entries[:count]
+    walked = _limited_walk(batch, [sha for _, sha, _ in listed], [sha for _, sha, _ in entries[count:]])
+    # Each commit belongs to the oldest version that contains it
+    commits_of_versions = _split_walk(batch, [sha for _, sha, _ in listed], walked)
+    # A path from a listed version to HEAD only goes through walked commits, unless HEAD is in an older version
+    head_is_ancestor_of = _AncestorCheck(batch, head, walked if head in walked else None)
+    head_commits: typing.Optional[typing.Set[str]] = None
+    versions = []
+    for (tag, sha, date), commits_of_version in zip(listed, commits_of_versions):
+        include = sha
+        if sha != head and head_is_ancestor_of(sha):
+            # The version is ahead of HEAD: only the commits of HEAD are shown, like "gitchangelog" does
+            include = head
+            if head_commits is None:
+                head_commits = _split_walk(batch, [head], walked)[0]
+            commits_of_version &= head_commits
+        shas = _topo_sort(batch, include, commits_of_version)
+        commits = []
+        for commit_sha in shas:
+            commit = _commit(batch, commit_sha)
+            if len(commit.parents) > 1:
+                continue
+            subject, body = split_message(commit.message)
+            commits.append(ChangelogCommit(commit_sha, subject, body, commit.author))
+        LOGGER.debug('changelog: %s: %s commits', tag or 'unreleased', len(commits))
+        versions.append(ChangelogVersion(tag, date, commits))
+    return versions
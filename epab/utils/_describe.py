@@ -0,0 +1,218 @@
+# coding=utf-8
+"""
+In-process equivalent of "git describe --tags --abbrev=0"
+
+The walk follows the algorithm of "git describe": commits are visited from HEAD by decreasing commit date, and the
+first 10 tagged commits found are candidates. The depth of a candidate is the number of visited commits that it does
+not contain; the candidate with the smallest depth wins (ties go to the candidate found first). Annotated tags are
+preferred over lightweight tags on the same commit.
+
+Parsed commits are kept in memory, and results are kept on disk per commit SHA, so that describing a commit that
+was already described (or a descendant of it through a linear history) does not walk the ancestry again.
+"""
+import hashlib
+import heapq
+import json
+import logging
+import typing
+
+from ._cache import cache_path, write_atomic
+from ._git_batch import GitBatch
+from ._refs import RefSnapshot
+
+LOGGER = logging.getLogger('EPAB')
+
+MAX_CANDIDATES = 10
+_MAX_CACHED_RESULTS = 64
+
+CommitInfo = typing.Tuple[typing.Tuple[str, ...], int]
+
+# Commits never change, so their parsed content can be shared by all repositories
+_COMMITS: typing.Dict[str, CommitInfo] = {}
+
+
+def _parse_commit(content: bytes) -> CommitInfo:
+    parents = []
+    date = 0
+    for line in content.split(b'\n'):
+        if not line:
+            break
+        if line.startswith(b'parent '):
+            parents.append(line[7:].decode('ascii'))
+        elif line.startswith(b'committer '):
+            date = int(line.rsplit(b' ', 2)[1])
+    return tuple(parents), date
+
+
+def _commit_info(batch: GitBatch, sha: str) -> CommitInfo:
+    if sha not in _COMMITS:
+        commit = batch.read(sha)
+        if commit is None:
+            raise ValueError(f'commit not found: {sha}')
+        _COMMITS[sha] = _parse_commit(commit[2])
+    return _COMMITS[sha]
+
+
+def _tagger_date(batch: GitBatch, tag_sha: str) -> int:
+    tag = batch.read(tag_sha)
+    if tag is None:
+        return 0
+    for line in tag[2].split(b'\n'):
+        if not line:
+            break
+        if line.startswith(b'tagger '):
+            return int(line.rsplit(b' ', 2)[1])
+    return 0
+
+
+def _tag_name(batch: GitBatch, refs: RefSnapshot, sha: str) -> typing.Optional[typing.Tuple[str, bool]]:
+    """
+    Picks the tag "git describe" uses for a commit: annotated tags first (the most recent one if there are several),
+    then the first lightweight tag by name
+
+    Returns: tuple of (tag name, is annotated), or None if the commit is not tagged
+    """
+    best: typing.Optional[typing.Tuple[str, bool]] = None
+    best_date = 0
+    for tag in refs.tags_for_commit(sha):
+        annotated = refs.tags[tag] != sha
+        if best is None or (annotated and not best[1]):
+            best = (tag, annotated)
+            best_date = _tagger_date(batch, refs.tags[tag]) if annotated else 0
+        elif annotated and best[1]:
+            date = _tagger_date(batch, refs.tags[tag])
+            if date > best_date:
+                best, best_date = (tag, annotated), date
+    return best
+
+
+class _Candidate:
+    __slots__ = ('name', 'depth', 'flag', 'found_order')
+
+    def __init__(self, name: str, depth: int, flag: int, found_order: int) -> None:
+        self.name = name
+        self.depth = depth
+        self.flag = flag
+        self.found_order = found_order
+
+
+def _walk(batch: GitBatch, refs: RefSnapshot, head: str) -> typing.Optional[str]:
+    flags: typing.Dict[str, int] = {head: 0}
+    queue: typing.List[typing.Tuple[int, int, str]] = [(-_commit_info(batch, head)[1], 0, head)]
+    sequence = 1
+    candidates: typing.List[_Candidate] = []
+    annotated_count = 0
+    seen_commits = 0
+    while queue:
+        _, _, sha = heapq.heappop(queue)
+        seen_commits += 1
+        name = _tag_name(batch, refs, sha)
+        if name is not None:
+            if len(candidates) == MAX_CANDIDATES:
+                break
+            candidate = _Candidate(name[0], seen_commits - 1, 1 << len(candidates), len(candidates))
+            candidates.append(candidate)
+            flags[sha] |= candidate.flag
+            if name[1]:
+                annotated_count += 1
+        for candidate in candidates:
+            if not flags[sha] & candidate.flag:
+                candidate.depth += 1
+        if annotated_count and not queue:
+            # Last remaining path: stop if it is contained in all the best candidates
+            best_depth = min(candidate.depth for candidate in candidates)
+            best_flags = sum(candidate.flag for candidate in candidates if candidate.depth == best_depth)
+            if flags[sha] & best_flags == best_flags:
+                break
+        if candidates:
+            # Once every commit left to visit is contained in the best candidate, its depth cannot grow anymore,
+            # while the depth of any other candidate (present or future) can only be larger: "git describe" would
+            # keep walking, but could not pick another tag.
+            best = min(candidates, key=lambda item: (item.depth, item.found_order))
+            if flags[sha] & best.flag and all(flags[queued] & best.flag for _, _, queued in queue):
+                return best.name
+        for parent in _commit_info(batch, sha)[0]:
+            if parent not in flags:
+                flags[parent] = 0
+                heapq.heappush(queue, (-_commit_info(batch, parent)[1], sequence, parent))
+                sequence += 1
+            flags[parent] |= flags[sha]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda item: (item.depth, item.found_order)).name
+
+
+def _tags_digest(refs: RefSnapshot) -> str:
+    digest = hashlib.sha1()  # nosec
+    for name, sha in sorted(refs.tags.items()):
+        digest.update(f'{name}\0{sha}\n'.encode('utf8'))
+    return digest.hexdigest()
+
+
+class _ResultCache:
+    """
+    Results of previous walks, by commit SHA, for a given set of tags
+    """
+
+    def __init__(self, tags_digest: str) -> None:
+        self._path = cache_path('describe.json')
+        self._tags_digest = tags_digest
+        self._results: typing.Dict[str, typing.Optional[str]] = {}
+        if self._path.exists():
+            try:
+                content = json.loads(self._path.read_text(encoding='utf8'))
+            except ValueError:
+                LOGGER.debug('invalid describe cache, ignoring: %s', self._path)
+            else:
+                if content.get('tags') == tags_digest:
+                    self._results = content['results']
+
+    def get(self, sha: str) -> typing.Tuple[bool, typing.Optional[str]]:
+        """
+        Returns: tuple of (found, tag)
+        """
+        return sha in self._results, self._results.get(sha)
+
+    def store(self, tag: typing.Optional[str], *shas: str):
+        """
+        Stores the result for one or more commits, dropping the oldest ones
+        """
+        for sha in shas:
+            self._results.pop(sha, None)
+            self._results[sha] = tag
+        while len(self._results) > _MAX_CACHED_RESULTS:
+            del self._results[next(iter(self._results))]
+        write_atomic(self._path, json.dumps({'tags': self._tags_digest, 'results': self._results}))
+
+
+def describe(batch: GitBatch, refs: RefSnapshot, head: str) -> typing.Optional[str]:
+    """
+    Finds the tag "git describe --tags --abbrev=0" would output for a commit
+
+    Args:
+        batch: GitBatch of the repository
+        refs: snapshot of the refs of the repository
+        head: full SHA of the commit to describe
+
+    Returns: tag name, or None if no tag can describe the commit
+    """
+    if not refs.tags:
+        return None
+    cache = _ResultCache(_tags_digest(refs))
+    # An untagged commit with a single parent is described by the same tag as its parent: every depth computed by
+    # the walk is one more than when starting from the parent.
+    sha = head
+    while True:
+        found, tag = cache.get(sha)
+        if found:
+            LOGGER.debug('describe: re-using result for %s', sha)
+            break
+        parents = _commit_info(batch, sha)[0]
+        if len(parents) != 1 or refs.tags_for_commit(sha):
+            tag = _walk(batch, refs, sha)
+            break
+        sha = parents[0]
+    if sha != head or not found:
+        cache.store(tag, *sorted({sha, head}))
+    LOGGER.debug('describe %s: %s', head, tag)
+    return tag
@@ -6,8 +6,6 @@ import traceback
 import typing
 from pathlib import Path
 
-import pefile
-
 
 class VersionInfo:
     """
@@ -60,6 +58,7 @@ def get_product_version(path: typing.Union[str, Path]) -> VersionInfo:
 
     Returns: VersionInfo
     """
+    import pefile
     path = Path(path).absolute()
     pe_info = pefile.PE(str(path))
 
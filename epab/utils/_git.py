@@ -0,0 +1,15 @@
+# coding=utf-8
+"""
+Lazy access to GitPython, which is slow to import and only needed once the repository is actually used
+"""
+import functools
+import types
+
+
+@functools.lru_cache()
+def git_module() -> types.ModuleType:
+    """
+    Returns: the "git" package of GitPython, imported on first use
+    """
+    import git
+    return git
@@ -0,0 +1,166 @@
+# coding=utf-8
+"""
+Reads Git objects through long-lived "git cat-file" processes, and counts the Git processes EPAB spawns
+"""
+import collections
+import functools
+import logging
+import threading
+import typing
+
+from ._git import git_module
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    import git
+
+LOGGER = logging.getLogger('EPAB')
+
+ObjectHeader = typing.Tuple[str, str, int]
+
+
+class SpawnCounter:
+    """
+    Thread-safe count of spawned processes, by command
+    """
+
+    def __init__(self) -> None:
+        self._counts: typing.Counter[str] = collections.Counter()
+        self._lock = threading.Lock()
+
+    def increment(self, command: str):
+        """
+        Records a spawned process
+
+        Args:
+            command: name of the command (for example "status" for "git status")
+        """
+        with self._lock:
+            self._counts[command] += 1
+
+    @property
+    def counts(self) -> typing.Dict[str, int]:
+        """
+        Returns: copy of the counts, by command
+        """
+        with self._lock:
+            return dict(self._counts)
+
+    @property
+    def total(self) -> int:
+        """
+        Returns: total count of spawned processes
+        """
+        with self._lock:
+            return sum(self._counts.values())
+
+    def reset(self):
+        """
+        Resets all counts to 0
+        """
+        with self._lock:
+            self._counts.clear()
+
+    def __str__(self) -> str:
+        counts = ', '.join(f'{command}: {count}' for command, count in sorted(self.counts.items()))
+        return f'{self.total} ({counts})' if counts else '0'
+
+
+GIT_SPAWNS = SpawnCounter()
+
+
+def _git_subcommand(command: typing.Union[str, typing.Sequence[typing.Any]]) -> str:
+    if isinstance(command, str):
+        command = command.split()
+    for arg in list(command)[1:]:
+        if not str(arg).startswith('-'):
+            return str(arg)
+    return 'git'
+
+
+@functools.lru_cache()
+def counting_repo_class() -> type:
+    """
+    Returns a subclass of git.Repo whose Git commands are counted in GIT_SPAWNS
+
+    The class is created on first use, so that GitPython is only imported when needed.
+    """
+    git = git_module()
+
+    class _CountingGit(git.Git):
+        def execute(self, command, *args, **kwargs):  # pylint: disable=arguments-differ
+            GIT_SPAWNS.increment(_git_subcommand(command))
+            return super(_CountingGit, self).execute(command, *args, **kwargs)
+
+    class _CountingRepo(git.Repo):
+        GitCommandWrapperType = _CountingGit
+
+    return _CountingRepo
+
+
+class GitBatch:
+    """
+    Reads objects through the "git cat-file --batch" and "git cat-file --batch-check" processes GitPython keeps alive
+
+    Those are the processes behind the object database of git.Repo ("repo.odb"), which only looks objects up by binary
+    SHA; "git.Git.get_object_header" and "git.Git.get_object_data" take any object name (for example "HEAD" or
+    "SHA^{commit}"). GitPython does not make them thread-safe, so requests are serialised.
+
+    Args:
+        git_cmd: git.Git object of the repository ("repo.git")
+    """
+
+    def __init__(self, git_cmd: 'git.Git') -> None:
+        self._git = git_cmd
+        self._lock = threading.Lock()
+
+    def _request(self, method: typing.Callable[[str], tuple], rev: str) -> typing.Optional[tuple]:
+        if '\n' in rev:
+            raise ValueError(f'invalid object name: {rev!r}')
+        with self._lock:
+            try:
+                try:
+                    return method(rev)
+                except OSError:
+                    LOGGER.debug('git cat-file stopped unexpectedly, restarting it')
+                    self._git.clear_cache()
+                    return method(rev)
+            except ValueError:
+                # The object does not exist, or its name is ambiguous
+                return None
+
+    def header(self, rev: str) -> typing.Optional[ObjectHeader]:
+        """
+        Looks up an object without reading its content
+
+        Args:
+            rev: object name, in any form accepted by "git rev-parse"
+
+        Returns: tuple of (sha, type, size), or None if the object does not exist
+        """
+        result = self._request(self._git.get_object_header, rev)
+        if result is None:
+            return None
+        sha, type_, size = result
+        return sha.decode('ascii'), type_.decode('ascii'), size
+
+    def read(self, rev: str) -> typing.Optional[typing.Tuple[str, str, bytes]]:
+        """
+        Reads an object
+
+        Args:
+            rev: object name, in any form accepted by "git rev-parse"
+
+        Returns: tuple of (sha, type, content), or None if the object does not exist
+        """
+        result = self._request(self._git.get_object_data, rev)
+        if result is None:
+            return None
+        sha, type_, _, content = result
+        return sha.decode('ascii'), type_.decode('ascii'), content
+
+    def close(self):
+        """
+        Stops both processes; they are started again on the next request
+        """
+        with self._lock:
+            self._git.clear_cache()
@@ -2,10 +2,81 @@
 """
 Manages .gitignore file
 """
-
+import hashlib
+import json
+import logging
+import typing
 from pathlib import Path
 
-GIT_IGNORE = Path('.gitignore').absolute()
+from ._cache import cache_path, write_atomic
+
+LOGGER = logging.getLogger('EPAB')
+
+
+def _state_file() -> Path:
+    return cache_path('gitignore.json')
+
+
+def _read_state() -> dict:
+    state_file = _state_file()
+    if not state_file.exists():
+        return {}
+    try:
+        return json.loads(state_file.read_text(encoding='utf8'))
+    except ValueError:
+        LOGGER.debug('invalid .gitignore cache, ignoring: %s', state_file)
+        return {}
+
+
+def _stamp(path: Path) -> typing.Optional[typing.List[int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def ensure_gitignore_entries(lines: typing.Iterable[str]) -> bool:
+    """
+    Makes sure the .gitignore file of the repo contains the given lines
+
+    The file is read once, and all missing lines are appended in a single write. If neither the file nor the lines
+    changed since the last call, the file is not even read.
+
+    Args:
+        lines: lines that must be in the file (compared with each line of the file as a whole)
+
+    Returns: True if the file was written
+    """
+    lines = list(dict.fromkeys(line.rstrip('\r\n') for line in lines))
+    git_ignore = Path('.gitignore').absolute()
+    entries_digest = hashlib.sha1('\n'.join(lines).encode('utf8')).hexdigest()  # nosec
+    state = _read_state()
+    if state.get('entries') == entries_digest and state.get('stamp') == _stamp(git_ignore):
+        LOGGER.debug('.gitignore unchanged')
+        return False
+
+    content = git_ignore.read_bytes() if git_ignore.exists() else b''
+    content_digest = hashlib.sha1(content).hexdigest()  # nosec
+    written = False
+    if state.get('entries') != entries_digest or state.get('content') != content_digest:
+        text = content.decode('utf8')
+        newline = '\r\n' if '\r\n' in text else '\n'
+        existing = set(text.splitlines())
+        missing = [line for line in lines if line not in existing]
+        if missing:
+            LOGGER.debug('adding to .gitignore: %s', missing)
+            if text and not text.endswith('\n'):
+                text += newline
+            text += ''.join(f'{line}{newline}' for line in missing)
+            write_atomic(git_ignore, text)
+            content_digest = hashlib.sha1(text.encode('utf8')).hexdigest()  # nosec
+            written = True
+    write_atomic(
+        _state_file(),
+        json.dumps({'entries': entries_digest, 'content': content_digest, 'stamp': _stamp(git_ignore)})
+    )
+    return written
 
 
 def add_to_gitignore(line: str):
@@ -15,12 +86,4 @@ def add_to_gitignore(line: str):
     Args:
         line: line to add
     """
-    if not line.endswith('\n'):
-        line = f'{line}\n'
-    if GIT_IGNORE.exists():
-        if line in GIT_IGNORE.read_text(encoding='utf8'):
-            return
-        previous_content = GIT_IGNORE.read_text(encoding='utf8')
-    else:
-        previous_content = ''
-    GIT_IGNORE.write_text(previous_content + line, encoding='utf8')
+    ensure_gitignore_entries([line])
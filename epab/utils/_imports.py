@@ -0,0 +1,120 @@
+# coding=utf-8
+"""
+Finds the modules of a package that (directly or not) import a given set of modules
+"""
+import ast
+import logging
+import typing
+from pathlib import Path
+
+LOGGER = logging.getLogger('EPAB')
+
+
+def _module_name(path: Path) -> str:
+    parts = list(path.with_suffix('').parts)
+    if parts[-1] == '__init__':
+        parts.pop()
+    return '.'.join(parts)
+
+
+def _resolve_relative(module: str, is_package: bool, level: int, name: typing.Optional[str]) -> str:
+    base = module.split('.')
+    # A module's own package is one level up; a package is its own package
+    base = base[:len(base) - level + (1 if is_package else 0)]
+    if name:
+        base.append(name)
+    return '.'.join(base)
+
+
+def _imported_modules(
+        tree: ast.AST,
+        module: str,
+        is_package: bool,
+        known_modules: typing.Container[str],
+) -> typing.Iterator[str]:
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                source = _resolve_relative(module, is_package, node.level, node.module)
+            else:
+                source = node.module or ''
+            for alias in node.names:
+                # "from package import module" depends on the module; "from module import name" on the module
+                submodule = f'{source}.{alias.name}'
+                yield submodule if submodule in known_modules else source
+
+
+def import_graph(
+        package_dir: typing.Union[str, Path],
+        missing_files: typing.Iterable[str] = (),
+) -> typing.Dict[str, typing.Set[str]]:
+    """
+    Parses all the modules of a package, and lists the modules of the package each of them imports
+
+    Args:
+        package_dir: path to the package, relative to the current directory
+        missing_files: paths to modules that do not exist any more (deleted or renamed); imports of those are kept in
+            the graph, but they are not listed as modules themselves
+
+    Returns: dictionary of module path -> set of imported module paths (paths are POSIX, relative to the current
+        directory)
+    """
+    paths = {
+        _module_name(path): path
+        for path in Path(package_dir).rglob('*.py')
+    }
+    for missing_file in missing_files:
+        paths.setdefault(_module_name(Path(missing_file)), Path(missing_file))
+    graph: typing.Dict[str, typing.Set[str]] = {}
+    for module, path in paths.items():
+        if not path.exists():
+            continue
+        try:
+            tree = ast.parse(path.read_bytes(), filename=str(path))
+        except SyntaxError:
+            LOGGER.debug('unable to parse, skipping: %s', path)
+            tree = ast.Module(body=[])
+        graph[path.as_posix()] = {
+            paths[name].as_posix()
+            for name in _imported_modules(tree, module, path.name == '__init__.py', paths)
+            if name in paths and paths[name] != path
+        }
+    return graph
+
+
+def reverse_dependents(
+        files: typing.Iterable[str],
+        package_dir: typing.Union[str, Path],
+) -> typing.List[str]:
+    """
+    Lists the modules of a package that depend on the given files, including the files themselves
+
+    Dependencies are transitive: if "a" imports "b" and "b" imports "c", then both "a" and "b" depend on "c".
+
+    Files that do not exist any more are looked for as well (the modules that still import them are listed), and are
+    listed themselves, like the other files.
+
+    Args:
+        files: paths to Python files, relative to the current directory
+        package_dir: path to the package, relative to the current directory
+
+    Returns: sorted list of POSIX paths, relative to the current directory
+    """
+    files = list(files)
+    importers: typing.Dict[str, typing.Set[str]] = {}
+    missing_files = [file for file in files if not Path(file).exists()]
+    for module, imported_modules in import_graph(package_dir, missing_files).items():
+        for imported_module in imported_modules:
+            importers.setdefault(imported_module, set()).add(module)
+    result = {Path(file).as_posix() for file in files}
+    to_visit = list(result)
+    while to_visit:
+        for importer in importers.get(to_visit.pop(), ()):
+            if importer not in result:
+                result.add(importer)
+                to_visit.append(importer)
+    LOGGER.debug('modules depending on %s: %s', files, sorted(result))
+    return sorted(result)
@@ -0,0 +1,110 @@
+# coding=utf-8
+"""
+Skips linters whose inputs did not change since their last successful run
+
+The inputs of a linter are identified by: the tool name and version, the arguments it is called with, the content of
+"pyproject.toml", and the fingerprint of the working tree (see Repo.tree_fingerprint).
+"""
+import functools
+import hashlib
+import json
+import logging
+import typing
+from pathlib import Path
+
+from epab.core import CTX, config
+from ._cache import cache_path, write_atomic
+
+LOGGER = logging.getLogger('EPAB')
+
+_MAX_KEYS = 20
+
+
+def _tool_version(distribution: str) -> str:
+    import pkg_resources
+    try:
+        return pkg_resources.get_distribution(distribution).version
+    except pkg_resources.DistributionNotFound:
+        return 'unknown'
+
+
+def _config_digest() -> str:
+    config_file = Path('pyproject.toml')
+    if not config_file.exists():
+        return ''
+    return hashlib.sha1(config_file.read_bytes()).hexdigest()  # nosec
+
+
+def _cache_file(tool: str) -> Path:
+    return cache_path('lint', f'{tool}.json')
+
+
+def _successful_keys(tool: str) -> typing.List[str]:
+    cache_file = _cache_file(tool)
+    if not cache_file.exists():
+        return []
+    try:
+        keys = json.loads(cache_file.read_text(encoding='utf8'))
+    except ValueError:
+        LOGGER.debug('%s: corrupted lint cache, ignoring', tool)
+        return []
+    return keys if isinstance(keys, list) else []
+
+
+def _store_successful_key(tool: str, key: str):
+    keys = [other_key for other_key in _successful_keys(tool) if other_key != key]
+    keys.append(key)
+    write_atomic(_cache_file(tool), json.dumps(keys[-_MAX_KEYS:]))
+
+
+def lint_cache_key(tool: str, distribution: str, *args, **kwargs) -> str:
+    """
+    Computes the key identifying the inputs of a linter run
+
+    Args:
+        tool: name of the linter
+        distribution: name of the distribution providing the linter
+        *args: arguments of the linter function
+        **kwargs: keyword arguments of the linter function
+
+    Returns: hex digest
+    """
+    inputs = [
+        tool,
+        _tool_version(distribution),
+        repr(args),
+        repr(sorted(kwargs.items())),
+        _config_digest(),
+        CTX.repo.tree_fingerprint(),
+    ]
+    return hashlib.sha1('\0'.join(inputs).encode('utf8')).hexdigest()  # nosec
+
+
+def lint_cache(tool: str, distribution: str = None):
+    """
+    Decorator that skips a linter if it already succeeded with the exact same inputs
+
+    Only successful runs are recorded; a failing linter (one that raises, or calls sys.exit) always runs again.
+
+    Args:
+        tool: name of the linter
+        distribution: name of the distribution providing the linter (defaults to the name of the linter)
+    """
+
+    def _decorator(func):
+
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            if not config.LINT_CACHE():
+                return func(*args, **kwargs)
+            key = lint_cache_key(tool, distribution or tool, *args, **kwargs)
+            if key in _successful_keys(tool):
+                LOGGER.info('%s: no change since last successful run, skipping', tool)
+                return None
+            result = func(*args, **kwargs)
+            _store_successful_key(tool, key)
+            return result
+
+        return _wrapper
+
+    return _decorator
@@ -0,0 +1,78 @@
+# coding=utf-8
+"""
+Holds back log records emitted from worker threads, so that each task's output is printed in one block
+"""
+import logging
+import threading
+import typing
+
+_LOGGER_NAMES = ('EPAB', 'elib_run', 'elib_run.process')
+
+
+class LogBuffer(logging.Filter):
+    """
+    Holds back log records emitted from worker threads, so that each task's output is printed in one block
+
+    The buffer is installed as a filter on the handlers of EPAB's loggers; records emitted by a thread that called
+    "start" are withheld from those handlers until the same thread calls "flush".
+    """
+
+    def __init__(self):
+        super(LogBuffer, self).__init__()
+        self._buffers: typing.Dict[int, typing.List[logging.LogRecord]] = {}
+        self._handlers: typing.List[logging.Handler] = []
+        self._lock = threading.Lock()
+
+    def install(self):
+        """
+        Adds the buffer to the handlers of EPAB's loggers
+        """
+        for logger_name in _LOGGER_NAMES:
+            for handler in logging.getLogger(logger_name).handlers:
+                if handler not in self._handlers:
+                    handler.addFilter(self)
+                    self._handlers.append(handler)
+
+    def uninstall(self):
+        """
+        Removes the buffer from the handlers
+        """
+        for handler in self._handlers:
+            handler.removeFilter(self)
+        self._handlers = []
+
+    def start(self):
+        """
+        Starts buffering the records emitted by the current thread
+        """
+        self._buffers[threading.get_ident()] = []
+
+    def _handlers_for(self, record: logging.LogRecord) -> typing.List[logging.Handler]:
+        handlers: typing.List[logging.Handler] = []
+        logger: typing.Optional[logging.Logger] = logging.getLogger(record.name)
+        while logger:
+            handlers.extend(
+                handler for handler in logger.handlers
+                if handler in self._handlers and record.levelno >= handler.level
+            )
+            logger = logger.parent if logger.propagate else None  # type: ignore
+        return handlers
+
+    def flush(self):
+        """
+        Stops buffering the records emitted by the current thread, and emits them all at once
+        """
+        records = self._buffers.pop(threading.get_ident(), [])
+        with self._lock:
+            for record in records:
+                for handler in self._handlers_for(record):
+                    handler.handle(record)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        buffer = self._buffers.get(threading.get_ident())
+        if buffer is None:
+            return True
+        # The same record goes through each handler in turn; keep only one copy
+        if not buffer or buffer[-1] is not record:
+            buffer.append(record)
+        return False
@@ -3,6 +3,7 @@
 Computes next version
 """
 import datetime
+import functools
 import logging
 import re
 import typing
@@ -88,6 +89,11 @@ class Tag:
         return self._tag_str
 
 
+@functools.lru_cache(maxsize=None)
+def _parse_tag(tag_str: str) -> Tag:
+    return Tag(tag_str)
+
+
 def _get_datetime() -> datetime.datetime:  # pragma: no cover
     return datetime.datetime.utcnow()
 
@@ -124,7 +130,7 @@ def _next_alpha_version(next_stable_version: str, list_of_tags: typing.List[Tag]
 
 
 def _get_current_calver_tags(calver: str) -> typing.List[Tag]:
-    return [Tag(tag) for tag in CTX.repo.list_tags(calver)]
+    return [_parse_tag(tag) for tag in CTX.repo.list_tags_with_prefix(f'{calver}.')]
 
 
 def get_next_version() -> str:
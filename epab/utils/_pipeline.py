@@ -0,0 +1,187 @@
+# coding=utf-8
+"""
+Runs a graph of stages, executing independent stages concurrently
+"""
+import concurrent.futures
+import logging
+import os
+import time
+import typing
+
+from ._log_buffer import LogBuffer
+
+LOGGER = logging.getLogger('EPAB')
+
+
+class Stage:
+    """
+    One step of a pipeline
+
+    A stage runs after all the stages it depends on, either explicitly (through "depends_on") or implicitly
+    (by consuming the "outputs" of an earlier stage as its "inputs").
+
+    Stages that mutate the repository (tagging, amending, stashing, ...) are barriers: they wait for all the stages
+    declared before them, and all stages declared after them wait for them.
+
+    Args:
+        name: unique name of the stage
+        func: callable running the stage; it receives the values of its inputs as keyword arguments, and returns
+            the value of its output (or a tuple of values if it has more than one output)
+        depends_on: names of the stages that must complete before this one
+        inputs: names of the values this stage consumes
+        outputs: names of the values this stage produces
+        mutates_repo: whether this stage changes the state of the repository
+    """
+
+    def __init__(
+            self,
+            name: str,
+            func: typing.Callable,
+            depends_on: typing.Iterable[str] = (),
+            inputs: typing.Iterable[str] = (),
+            outputs: typing.Iterable[str] = (),
+            mutates_repo: bool = False,
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.mutates_repo = mutates_repo
+
+    def run(self, values: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+        """
+        Runs the stage
+
+        Args:
+            values: values produced by the previous stages
+
+        Returns: values produced by this stage
+        """
+        result = self.func(**{input_: values[input_] for input_ in self.inputs})
+        if not self.outputs:
+            return {}
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+        return dict(zip(self.outputs, result))
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.name})'
+
+
+class Pipeline:
+    """
+    Graph of stages
+
+    Stages must be declared in an order that satisfies their dependencies; this makes the graph acyclic by
+    construction, and gives a deterministic order for the stages that mutate the repository.
+
+    Args:
+        name: name of the pipeline
+        stages: stages to run
+    """
+
+    def __init__(self, name: str, stages: typing.Iterable[Stage]) -> None:
+        self.name = name
+        self._stages = list(stages)
+        self._dependencies = self._resolve_dependencies()
+
+    def _resolve_dependencies(self) -> typing.Dict[str, typing.Set[str]]:
+        dependencies: typing.Dict[str, typing.Set[str]] = {}
+        producers: typing.Dict[str, str] = {}
+        last_barrier: typing.Optional[str] = None
+        for stage in self._stages:
+            if stage.name in dependencies:
+                raise ValueError(f'{self.name}: duplicate stage: {stage.name}')
+            stage_dependencies = set()
+            for dependency in stage.depends_on:
+                if dependency not in dependencies:
+                    raise ValueError(f'{self.name}: stage "{stage.name}" depends on unknown stage "{dependency}"')
+                stage_dependencies.add(dependency)
+            for input_ in stage.inputs:
+                if input_ not in producers:
+                    raise ValueError(f'{self.name}: no stage produces "{input_}" before "{stage.name}"')
+                stage_dependencies.add(producers[input_])
+            if stage.mutates_repo:
+                stage_dependencies.update(dependencies)
+                last_barrier = stage.name
+            elif last_barrier:
+                stage_dependencies.add(last_barrier)
+            for output in stage.outputs:
+                producers[output] = stage.name
+            dependencies[stage.name] = stage_dependencies
+        return dependencies
+
+    @property
+    def dependencies(self) -> typing.Dict[str, typing.Set[str]]:
+        """
+        Returns: names of the stages each stage waits for
+        """
+        return {name: set(dependencies) for name, dependencies in self._dependencies.items()}
+
+    @staticmethod
+    def _run_stage(
+            stage: Stage,
+            values: typing.Dict[str, typing.Any],
+            log_buffer: typing.Optional[LogBuffer],
+    ) -> typing.Dict[str, typing.Any]:
+        if log_buffer:
+            log_buffer.start()
+        start = time.time()
+        try:
+            LOGGER.debug('stage started: %s', stage.name)
+            return stage.run(values)
+        finally:
+            LOGGER.debug('stage done: %s (%s seconds)', stage.name, round(time.time() - start, 2))
+            if log_buffer:
+                log_buffer.flush()
+
+    def run(self, jobs: typing.Optional[int] = None) -> typing.Dict[str, typing.Any]:
+        """
+        Runs all stages
+
+        When a stage fails, no new stage is started; the stages already running are allowed to complete, and the
+        exception of the failed stage is then raised again.
+
+        Args:
+            jobs: maximum number of stages running concurrently (defaults to the CPU count)
+
+        Returns: values produced by the stages
+        """
+        jobs = jobs or os.cpu_count() or 1
+        LOGGER.debug('%s: running %s stages on %s workers', self.name, len(self._stages), jobs)
+        values: typing.Dict[str, typing.Any] = {}
+        done: typing.Set[str] = set()
+        pending = list(self._stages)
+        running: typing.Dict[concurrent.futures.Future, Stage] = {}
+        failure: typing.Optional[BaseException] = None
+        log_buffer = LogBuffer() if jobs > 1 else None
+        if log_buffer:
+            log_buffer.install()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+                while pending or running:
+                    if failure is None:
+                        for stage in [stage for stage in pending if self._dependencies[stage.name] <= done]:
+                            pending.remove(stage)
+                            running[executor.submit(self._run_stage, stage, dict(values), log_buffer)] = stage
+                    if not running:
+                        break
+                    finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in finished:
+                        stage = running.pop(future)
+                        try:
+                            values.update(future.result())
+                        except BaseException as exc:  # pylint: disable=broad-except
+                            if failure is None:
+                                LOGGER.debug('%s: stage failed: %s', self.name, stage.name)
+                                failure = exc
+                            continue
+                        done.add(stage.name)
+        finally:
+            if log_buffer:
+                log_buffer.uninstall()
+        if failure is not None:
+            raise failure
+        return values
+
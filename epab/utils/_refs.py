@@ -0,0 +1,213 @@
+# coding=utf-8
+"""
+Snapshot of the Git ref database (branches & tags)
+
+Reading "self.repo.tags" or "self.repo.heads" through GitPython re-walks the whole ref database every time, which
+becomes very slow on repositories with tens of thousands of tags. A snapshot reads "packed-refs" and the loose refs
+once, and is re-used as long as the ref database does not change on disk.
+"""
+import bisect
+import logging
+import os
+import typing
+from pathlib import Path
+
+from epab.core import CTX
+
+LOGGER = logging.getLogger('EPAB')
+
+_HEADS_PREFIX = 'refs/heads/'
+_TAGS_PREFIX = 'refs/tags/'
+
+
+def _mtime(path: Path) -> typing.Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _snapshot_key(git_dir: Path) -> typing.Tuple[typing.Optional[int], ...]:
+    return tuple(
+        _mtime(path) for path in (
+            Path(git_dir, 'packed-refs'),
+            Path(git_dir, 'refs'),
+            Path(git_dir, _HEADS_PREFIX),
+            Path(git_dir, _TAGS_PREFIX),
+        )
+    )
+
+
+class RefSnapshot:
+    """
+    Immutable view of the branches and tags of a repository at a given point in time
+
+    Args:
+        git_dir: path to the ".git" directory of the repository
+        peel: optional callable returning the SHA of the commit a tag object points to; it is only used for tags
+              whose target commit is not already known from "packed-refs"
+    """
+
+    def __init__(
+            self,
+            git_dir: typing.Union[str, Path],
+            peel: typing.Optional[typing.Callable[[str], str]] = None,
+    ) -> None:
+        self._git_dir = Path(git_dir)
+        self._peel = peel
+        self._heads: typing.Dict[str, str] = {}
+        self._tags: typing.Dict[str, str] = {}
+        # Tags whose target commit is known without reading any object
+        self._peeled_tags: typing.Dict[str, str] = {}
+        self._tags_by_commit: typing.Optional[typing.Dict[str, typing.List[str]]] = None
+        self._sorted_tags: typing.Optional[typing.List[str]] = None
+        self._read_packed_refs()
+        self._read_loose_refs(_HEADS_PREFIX, self._heads)
+        self._read_loose_refs(_TAGS_PREFIX, self._tags)
+        LOGGER.debug('ref snapshot: %s branches, %s tags', len(self._heads), len(self._tags))
+
+    def _read_packed_refs(self):
+        packed_refs = Path(self._git_dir, 'packed-refs')
+        if not packed_refs.exists():
+            return
+        # When "packed-refs" is written with the "peeled" trait, annotated tags are followed by a "^<sha>" line
+        # giving the commit they point to, and tags without such a line point directly to a commit.
+        peeled_trait = False
+        last_tag: typing.Optional[str] = None
+        with packed_refs.open(encoding='utf8') as stream:
+            for line in stream:
+                line = line.rstrip('\n')
+                if line.startswith('#'):
+                    peeled_trait = 'peeled' in line.split()
+                    continue
+                if line.startswith('^'):
+                    if last_tag is not None:
+                        self._peeled_tags[last_tag] = line[1:]
+                    continue
+                sha, _, ref_name = line.partition(' ')
+                last_tag = None
+                if ref_name.startswith(_TAGS_PREFIX):
+                    last_tag = ref_name[len(_TAGS_PREFIX):]
+                    self._tags[last_tag] = sha
+                    if peeled_trait:
+                        self._peeled_tags[last_tag] = sha
+                elif ref_name.startswith(_HEADS_PREFIX):
+                    self._heads[ref_name[len(_HEADS_PREFIX):]] = sha
+
+    def _read_loose_refs(self, prefix: str, refs: typing.Dict[str, str]):
+        # Loose refs take precedence over packed ones
+        root = Path(self._git_dir, prefix)
+        for dir_path, _, file_names in os.walk(str(root)):
+            for file_name in file_names:
+                ref_path = Path(dir_path, file_name)
+                content = ref_path.read_text(encoding='utf8').strip()
+                if not content or content.startswith('ref:'):
+                    continue
+                ref_name = ref_path.relative_to(root).as_posix()
+                refs[ref_name] = content
+                if refs is self._tags:
+                    self._peeled_tags.pop(ref_name, None)
+
+    def _build_tags_by_commit(self) -> typing.Dict[str, typing.List[str]]:
+        tags_by_commit: typing.Dict[str, typing.List[str]] = {}
+        peel_count = 0
+        for tag_name in sorted(self._tags):
+            commit_sha = self._peeled_tags.get(tag_name)
+            if commit_sha is None:
+                commit_sha = self._tags[tag_name]
+                if self._peel is not None:
+                    commit_sha = self._peel(commit_sha)
+                    peel_count += 1
+            tags_by_commit.setdefault(commit_sha, []).append(tag_name)
+        LOGGER.debug('commit to tags index: %s commits, %s tags peeled from objects', len(tags_by_commit), peel_count)
+        return tags_by_commit
+
+    @property
+    def heads(self) -> typing.Dict[str, str]:
+        """
+        Returns: mapping of branch names to commit SHA
+        """
+        return self._heads
+
+    @property
+    def tags(self) -> typing.Dict[str, str]:
+        """
+        Returns: mapping of tag names to the SHA of the object they point to
+        """
+        return self._tags
+
+    def tags_for_commit(self, sha: str) -> typing.List[str]:
+        """
+        Args:
+            sha: full SHA of a commit
+
+        Returns: sorted list of the tags pointing to that commit (annotated tags are peeled)
+        """
+        if self._tags_by_commit is None:
+            self._tags_by_commit = self._build_tags_by_commit()
+        return list(self._tags_by_commit.get(sha, []))
+
+    def branch_names(self) -> typing.List[str]:
+        """
+        Returns: sorted list of branch names
+        """
+        return sorted(self._heads)
+
+    def tag_names(self) -> typing.List[str]:
+        """
+        Returns: sorted list of tag names
+        """
+        if self._sorted_tags is None:
+            self._sorted_tags = sorted(self._tags)
+        return list(self._sorted_tags)
+
+    def tags_with_prefix(self, prefix: str) -> typing.List[str]:
+        """
+        Looks up tags by prefix with a binary search in the sorted tag names
+
+        Args:
+            prefix: start of the tag names
+
+        Returns: sorted list of tag names starting with "prefix"
+        """
+        if self._sorted_tags is None:
+            self._sorted_tags = sorted(self._tags)
+        start = bisect.bisect_left(self._sorted_tags, prefix)
+        end = start
+        while end < len(self._sorted_tags) and self._sorted_tags[end].startswith(prefix):
+            end += 1
+        return self._sorted_tags[start:end]
+
+
+def get_ref_snapshot(
+        git_dir: typing.Union[str, Path],
+        peel: typing.Optional[typing.Callable[[str], str]] = None,
+) -> RefSnapshot:
+    """
+    Returns the ref snapshot for a repository, re-reading the ref database only if it changed since last time
+
+    Args:
+        git_dir: path to the ".git" directory of the repository
+        peel: optional callable returning the SHA of the commit a tag object points to
+
+    Returns: RefSnapshot
+    """
+    git_dir = str(Path(git_dir).absolute())
+    key = _snapshot_key(Path(git_dir))
+    cached = CTX.ref_snapshots.get(git_dir)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    LOGGER.debug('reading ref database: %s', git_dir)
+    snapshot = RefSnapshot(git_dir, peel)
+    CTX.ref_snapshots[git_dir] = (key, snapshot)
+    return snapshot
+
+
+def invalidate_ref_snapshot(git_dir: typing.Union[str, Path]):
+    """
+    Discards the cached ref snapshot of a repository
+
+    Args:
+        git_dir: path to the ".git" directory of the repository
+    """
+    CTX.ref_snapshots.pop(str(Path(git_dir).absolute()), None)
@@ -2,25 +2,129 @@
 """
 Manages the local Git repo
 """
+import functools
+import hashlib
 import logging
 import os
 import sys
+import threading
 import typing
-
-import git
-from git.exc import GitCommandError
+from pathlib import Path
 
 from epab.bases.repo import BaseRepo
+from ._cache import CACHE_DIR
+from ._changelog import ChangelogVersion, changelog_versions
+from ._describe import describe
+from ._git import git_module
+from ._git_batch import GitBatch, counting_repo_class
+from ._refs import RefSnapshot, get_ref_snapshot, invalidate_ref_snapshot
+from ._stat_cache import modified_files, worktree_stamp
+from ._status import RepoStatus
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    import git
 
 LOGGER = logging.getLogger('EPAB')
 
 
+def _status_query(func):
+    """
+    Makes a Repo method work on a single working tree status scan
+
+    Nested calls re-use the status of the outermost one; the outermost call re-uses the status of a previous query if
+    the working tree stamp (HEAD, index, tracked files and their directories) did not change since, and if the
+    repository was not changed through this object.
+    """
+
+    @functools.wraps(func)
+    def _wrapper(self, *args, **kwargs):
+        local = self._status_local
+        depth = getattr(local, 'depth', 0)
+        if not depth:
+            local.checked = None
+        local.depth = depth + 1
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            local.depth = depth
+
+    return _wrapper
+
+
 # pylint: disable=too-many-public-methods
 class Repo(BaseRepo):
     """
     Wrapper for git.Repo
     """
 
+    def __init__(self):
+        super(Repo, self).__init__()
+        self._batch = GitBatch(self.repo.git)
+        # Incremented every time the index or the working tree may have changed
+        self._generation = 0
+        # Status queries can run from several threads (see epab.utils.Pipeline)
+        self._status_lock = threading.RLock()
+        self._status_local = threading.local()
+        # (generation, working tree stamp, status) of the latest scan
+        self._status_cache: typing.Optional[typing.Tuple[int, typing.Optional[str], RepoStatus]] = None
+
+    @staticmethod
+    def _open_repo() -> 'git.Repo':
+        # Git commands are counted in epab.utils.GIT_SPAWNS
+        return counting_repo_class()()
+
+    def _peel_tag(self, sha: str) -> str:
+        header = self._batch.header(f'{sha}^{{commit}}')
+        if header is None:
+            LOGGER.debug('tag object does not point to a commit: %s', sha)
+            return sha
+        return header[0]
+
+    def _refs(self) -> RefSnapshot:
+        return get_ref_snapshot(self.repo.git_dir, self._peel_tag)
+
+    def _invalidate_refs(self):
+        LOGGER.debug('invalidating ref snapshot')
+        invalidate_ref_snapshot(self.repo.git_dir)
+
+    def _invalidate_status(self):
+        with self._status_lock:
+            self._generation += 1
+
+    def _list_untracked_files(self) -> typing.List[str]:
+        untracked: str = self.repo.git.ls_files('--others', '--exclude-standard', '-z')
+        return [path for path in untracked.split('\0') if path]
+
+    def _worktree_stamp(self) -> typing.Optional[str]:
+        head = self._batch.header('HEAD')
+        return worktree_stamp(self.repo, head[0] if head else None)
+
+    def _status(self) -> RepoStatus:
+        with self._status_lock:
+            cache = self._status_cache
+            if cache is not None and cache[0] == self._generation:
+                if getattr(self._status_local, 'checked', None) is cache:
+                    return cache[2]
+                stamp = self._worktree_stamp()
+                if stamp is not None and stamp == cache[1]:
+                    # The stamp does not cover untracked files, so only those are listed again
+                    LOGGER.debug('tracked files unchanged since the last status scan')
+                    status = RepoStatus(cache[2].staged, cache[2].modified, self._list_untracked_files)
+                    self._status_cache = self._status_local.checked = (self._generation, stamp, status)
+                    return status
+            else:
+                stamp = self._worktree_stamp()
+            LOGGER.debug('scanning working tree status')
+            staged: str = self.repo.git.diff_index('--cached', '--name-only', '-z', 'HEAD')
+            status = RepoStatus(
+                staged=[path for path in staged.split('\0') if path],
+                modified=modified_files(self.repo),
+                untracked=self._list_untracked_files,
+            )
+            LOGGER.debug('working tree status: %s', status)
+            self._status_cache = self._status_local.checked = (self._generation, stamp, status)
+            return status
+
     def get_current_branch(self) -> str:
         """
         :return: current branch
@@ -42,7 +146,7 @@ class Repo(BaseRepo):
         LOGGER.info('tagging repo: %s', tag)
         try:
             self.repo.create_tag(tag)
-        except GitCommandError as exc:
+        except git_module().exc.GitCommandError as exc:
             if 'already exists' in exc.stderr and overwrite:
                 LOGGER.info('overwriting existing tag')
                 self.remove_tag(tag)
@@ -50,6 +154,8 @@ class Repo(BaseRepo):
             else:
                 LOGGER.exception('error while tagging repo')
                 raise
+        finally:
+            self._invalidate_refs()
 
     def list_tags(self, pattern: str = None) -> typing.List[str]:
         """
@@ -60,7 +166,7 @@ class Repo(BaseRepo):
         :return: existing tags
         :rtype: list of str
         """
-        tags: typing.List[str] = [str(tag) for tag in self.repo.tags]
+        tags: typing.List[str] = self._refs().tag_names()
         if not pattern:
             LOGGER.debug('tags found in repo: %s', tags)
             return tags
@@ -70,6 +176,19 @@ class Repo(BaseRepo):
         LOGGER.debug('filtered tags: %s', filtered_tags)
         return filtered_tags
 
+    def list_tags_with_prefix(self, prefix: str) -> typing.List[str]:
+        """
+        Returns list of tags starting with "prefix"
+
+        :param prefix: start of the tags
+        :type prefix: str
+        :return: matching tags
+        :rtype: list of str
+        """
+        tags: typing.List[str] = self._refs().tags_with_prefix(prefix)
+        LOGGER.debug('tags starting with %s: %s', prefix, tags)
+        return tags
+
     def remove_tag(self, *tag: str):
         """
         Removes tag(s) from the rpo
@@ -79,29 +198,54 @@ class Repo(BaseRepo):
         """
         LOGGER.info('removing tag(s) from repo: %s', tag)
 
-        self.repo.delete_tag(*tag)
+        try:
+            self.repo.delete_tag(*tag)
+        finally:
+            self._invalidate_refs()
 
     def get_latest_tag(self) -> typing.Optional[str]:
         """
         :return:latest tag on the repo in the form TAG[-DISTANCE+[DIRTY]]
         :rtype: str
         """
-        try:
-            latest_tag: str = self.repo.git.describe(tags=True, abbrev=0)
-            LOGGER.debug('latest tag: %s', latest_tag)
-            return latest_tag
-        except GitCommandError as exc:
-            if 'No names found' in exc.stderr:
-                LOGGER.debug('no tag found in repo')
-                return None
-            raise  # pragma: no cover
-
-    def latest_commit(self) -> git.Commit:
+        refs = self._refs()
+        if not refs.tags:
+            LOGGER.debug('no tag found in repo')
+            return None
+        head = self._batch.header('HEAD')
+        if head is None:
+            LOGGER.debug('no commit found in repo')
+            return None
+        latest_tag = describe(self._batch, refs, head[0])
+        LOGGER.debug('latest tag: %s', latest_tag)
+        return latest_tag
+
+    def changelog_versions(
+            self, tag_filter: str, next_version: str = None, since: str = None
+    ) -> typing.List[ChangelogVersion]:
+        """
+        :param tag_filter: regex the tags that are versions must match
+        :type tag_filter: str
+        :param next_version: name of the next version, shown as a tag on the latest commit (the repo is not tagged)
+        :type next_version: str
+        :param since: only list the versions newer than this one
+        :type since: str
+        :return: versions of the changelog, the unreleased commits first
+        :rtype: list of ChangelogVersion
+        :raises ValueError: if "since" is not a version
+        """
+        head = self._batch.header('HEAD')
+        if head is None:
+            LOGGER.debug('no commit found in repo')
+            return []
+        return changelog_versions(self._batch, self._refs(), head[0], tag_filter, next_version, since)
+
+    def latest_commit(self) -> 'git.Commit':
         """
         :return: latest commit
         :rtype: git.Commit object
         """
-        latest_commit: git.Commit = self.repo.head.commit
+        latest_commit: 'git.Commit' = self.repo.head.commit
         LOGGER.debug('latest commit: %s', latest_commit)
         return latest_commit
 
@@ -117,25 +261,35 @@ class Repo(BaseRepo):
         LOGGER.debug('latest commit is NOT tagged')
         return False
 
+    def tags_for_commit(self, sha: str) -> typing.List[str]:
+        """
+        :param sha: full SHA of a commit
+        :type sha: str
+        :return: tags pointing to that commit
+        :rtype: list of str
+        """
+        tags: typing.List[str] = self._refs().tags_for_commit(sha)
+        LOGGER.debug('tags on commit %s: %s', sha, tags)
+        return tags
+
     def get_current_tag(self) -> typing.Optional[str]:
         """
         :return: tag name if current commit is on tag, else None
         :rtype: optional str
         """
-        tags = list(self.repo.tags)
-        if not tags:
+        if not self._refs().tags:
             LOGGER.debug('no tag found')
             return None
-        for tag in tags:
-            LOGGER.debug('tag found: %s; comparing with commit', tag)
-            if tag.commit == self.latest_commit():
-                tag_name: str = tag.name
-                LOGGER.debug('found tag on commit: %s', tag_name)
-                return tag_name
+        tags = self.tags_for_commit(self.get_sha())
+        if tags:
+            tag_name: str = tags[0]
+            LOGGER.debug('found tag on commit: %s', tag_name)
+            return tag_name
 
         LOGGER.debug('no tag found on latest commit')
         return None
 
+    @_status_query
     def stash(self, stash_name: str):
         """
         Stashes the current working tree changes
@@ -156,6 +310,7 @@ class Repo(BaseRepo):
             if self.changed_files():
                 LOGGER.info('stashing changes')
                 self.repo.git.stash('push', '-u', '-k', '-m', f'"{stash_name}"')
+                self._invalidate_status()
                 self.stashed = True
             else:
                 LOGGER.info('no changes to stash')
@@ -169,6 +324,7 @@ class Repo(BaseRepo):
         else:
             LOGGER.info('popping stash')
             self.repo.git.stash('pop')
+            self._invalidate_status()
             self.stashed = False
 
     @staticmethod
@@ -187,16 +343,23 @@ class Repo(BaseRepo):
         :return: last commit message
         :rtype: str
         """
-        last_msg: str = self.latest_commit().message.rstrip()
+        commit = self._batch.read('HEAD')
+        if commit is None:
+            LOGGER.error('no commit found in repository')
+            sys.exit(-1)
+        _, _, content = commit
+        # The message follows the headers of the commit object, after the first empty line
+        last_msg: str = content.decode('utf8').partition('\n\n')[2].rstrip()
         LOGGER.debug('last msg: %s', last_msg)
         return last_msg
 
+    @_status_query
     def untracked_files(self) -> typing.List[str]:
         """
         :return: of untracked files
         :rtype: list
         """
-        untracked_files = list(self.repo.untracked_files)
+        untracked_files = self._status().untracked
         LOGGER.debug('untracked files: %s', untracked_files)
         return untracked_files
 
@@ -209,39 +372,93 @@ class Repo(BaseRepo):
         LOGGER.debug('git status: %s', status)
         return status
 
+    @_status_query
     def list_staged_files(self) -> typing.List[str]:
         """
         :return: staged files
         :rtype: list of str
         """
-        staged_files: typing.List[str] = [x.a_path for x in self.repo.index.diff('HEAD')]
+        staged_files: typing.List[str] = self._status().staged
         LOGGER.debug('staged files: %s', staged_files)
         return staged_files
 
+    @_status_query
     def index_is_empty(self) -> bool:
         """
         :return: True if index is empty (no staged changes)
         :rtype: bool
         """
-        index_empty: bool = len(self.repo.index.diff(self.repo.head.commit)) == 0
+        index_empty: bool = not self._status().staged
         LOGGER.debug('index is empty: %s', index_empty)
         return index_empty
 
+    @_status_query
     def changed_files(self) -> typing.List[str]:
         """
         :return: changed files
         :rtype: list of str
         """
-        changed_files: typing.List[str] = [x.a_path for x in self.repo.index.diff(None)]
+        changed_files: typing.List[str] = self._status().modified
         LOGGER.debug('changed files: %s', changed_files)
         return changed_files
 
+    @_status_query
+    def list_changed_files(self, base_ref: str = 'HEAD') -> typing.List[str]:
+        """
+        Lists files that differ between base_ref and the working tree, including staged and untracked files
+
+        Deleted files are included.
+
+        :param base_ref: reference to compare the working tree with
+        :type base_ref: str
+        :return: changed files
+        :rtype: list of str
+        """
+        status = self._status()
+        if base_ref == 'HEAD':
+            changed = set(status.staged + status.modified)
+        else:
+            diff: str = self.repo.git.diff('--name-only', '-z', base_ref)
+            changed = {path for path in diff.split('\0') if path}
+        changed.update(status.untracked)
+        changed_files = sorted(changed)
+        LOGGER.debug('files changed since %s: %s', base_ref, changed_files)
+        return changed_files
+
+    @_status_query
+    def tree_fingerprint(self) -> str:
+        """
+        Computes a digest of the content of the working tree
+
+        Tracked files are identified by the blob SHAs recorded in the index, so only the modified and untracked files
+        need to be read. EPAB's own cache directory is left out.
+
+        :return: hex digest
+        :rtype: str
+        """
+        digest = hashlib.sha1()  # nosec
+        for (path, stage), entry in sorted(self.repo.index.entries.items()):
+            digest.update(f'{path}\0{stage}\0{entry.hexsha}\n'.encode('utf8'))
+        status = self._status()
+        for path in sorted(set(status.modified + status.untracked)):
+            if path.startswith(f'{CACHE_DIR}/'):
+                continue
+            digest.update(f'{path}\0'.encode('utf8'))
+            file_path = Path(self.repo.working_tree_dir, path)
+            if file_path.is_file():
+                digest.update(file_path.read_bytes())
+            digest.update(b'\n')
+        fingerprint = digest.hexdigest()
+        LOGGER.debug('working tree fingerprint: %s', fingerprint)
+        return fingerprint
+
     def reset_index(self):
         """
         Resets changes in the index (working tree untouched)
         """
         LOGGER.warning('resetting changes')
         self.repo.index.reset()
+        self._invalidate_status()
 
     def stage_all(self):
         """
@@ -249,6 +466,7 @@ class Repo(BaseRepo):
         """
         LOGGER.info('Staging all files')
         self.repo.git.add(A=True)
+        self._invalidate_status()
 
     def stage_modified(self):
         """
@@ -256,6 +474,7 @@ class Repo(BaseRepo):
         """
         LOGGER.info('Staging modified files')
         self.repo.git.add(u=True)
+        self._invalidate_status()
 
     def stage_subset(self, *files_to_add: str):
         """
@@ -266,6 +485,7 @@ class Repo(BaseRepo):
         """
         LOGGER.info('staging files: %s', files_to_add)
         self.repo.git.add(*files_to_add, A=True)
+        self._invalidate_status()
 
     @staticmethod
     def add_skip_ci_to_commit_msg(message: str) -> str:
@@ -298,6 +518,7 @@ class Repo(BaseRepo):
 
         return files_to_add
 
+    @_status_query
     def commit(
             self,
             message: str,
@@ -339,6 +560,8 @@ class Repo(BaseRepo):
             sys.exit(-1)
 
         self.repo.index.commit(message=message)
+        self._invalidate_refs()
+        self._invalidate_status()
 
     def _sanitize_amend_commit_message(
             self,
@@ -412,10 +635,13 @@ class Repo(BaseRepo):
         else:
             self.stage_all()
         self.repo.index.commit(message, skip_hooks=True)
+        self._invalidate_refs()
+        self._invalidate_status()
         if latest_tag:
             LOGGER.info('resetting tag: %s', latest_tag)
             self.tag(latest_tag)
 
+    @_status_query
     def merge(self, ref_name: str):
         """
         Merges two refs
@@ -428,6 +654,8 @@ class Repo(BaseRepo):
             sys.exit(-1)
         LOGGER.info('merging ref: "%s" into branch: %s', ref_name, self.get_current_branch())
         self.repo.git.merge(ref_name)
+        self._invalidate_refs()
+        self._invalidate_status()
 
     def push(self, set_upstream: bool = True):
         """
@@ -437,7 +665,7 @@ class Repo(BaseRepo):
 
         try:
             self.repo.git.push()
-        except GitCommandError as error:
+        except git_module().exc.GitCommandError as error:
             if 'has no upstream branch' in error.stderr and set_upstream:
                 self.repo.git.push(f'--set-upstream origin {self.get_current_branch()}')
             else:
@@ -457,10 +685,20 @@ class Repo(BaseRepo):
         :return: branches names
         :rtype: list of str
         """
-        branches: typing.List[str] = [head.name for head in self.repo.heads]
+        branches: typing.List[str] = self._refs().branch_names()
         LOGGER.debug('branches: %s', branches)
         return branches
 
+    def has_commit(self, sha: str) -> bool:
+        """
+        :param sha: SHA of a commit
+        :type sha: str
+        :return: True if the commit exists in the repository
+        :rtype: bool
+        """
+        header = self._batch.header(f'{sha}^{{commit}}')
+        return header is not None
+
     def get_sha(self) -> str:
         """
         :return: SHA of the latest commit
@@ -482,10 +720,11 @@ class Repo(BaseRepo):
     def _validate_branch_name(self, branch_name: str):
         try:
             self.repo.git.check_ref_format('--branch', branch_name)
-        except git.exc.GitCommandError:  # pylint: disable=no-member
+        except git_module().exc.GitCommandError:
             LOGGER.error('invalid branch name: %s', branch_name)
             sys.exit(-1)
 
+    @_status_query
     def checkout(self, reference: str):
         """
         Checks out a reference.
@@ -504,16 +743,15 @@ class Repo(BaseRepo):
             LOGGER.error('repository is dirty; cannot checkout. Status:\n %s', self.status())
             sys.exit(-1)
 
-        LOGGER.debug('going through all present references')
-        for head in self.repo.heads:
-            if head.name == reference:
-                LOGGER.debug('resetting repo index and working tree to: %s', reference)
-                self.repo.head.reference = head
-                self.repo.head.reset(index=True, working_tree=True)
-                break
-        else:
+        LOGGER.debug('looking up reference in ref snapshot')
+        if reference not in self._refs().heads:
             LOGGER.error('reference not found: %s', reference)
             sys.exit(-1)
+        LOGGER.debug('resetting repo index and working tree to: %s', reference)
+        self.repo.head.reference = self.repo.heads[reference]
+        self.repo.head.reset(index=True, working_tree=True)
+        self._invalidate_refs()
+        self._invalidate_status()
 
     def create_branch(self, branch_name: str):
         """
@@ -530,6 +768,7 @@ class Repo(BaseRepo):
             sys.exit(-1)
         new_branch = self.repo.create_head(branch_name)
         new_branch.commit = self.repo.head.commit
+        self._invalidate_refs()
 
     def create_branch_and_checkout(self, branch_name: str):
         """
@@ -541,6 +780,7 @@ class Repo(BaseRepo):
         self.create_branch(branch_name)
         self.checkout(branch_name)
 
+    @_status_query
     def is_dirty(self, untracked=False) -> bool:
         """
         Checks if the current repository contains uncommitted or untracked changes
@@ -7,8 +7,6 @@ import sys
 import typing
 from pathlib import Path
 
-import pkg_resources
-
 
 def _get_from_dev(package_name: str, relative_path: Path) -> Path:
     return Path(package_name, relative_path).absolute()
@@ -19,6 +17,7 @@ def _get_from_sys(_: str, relative_path: Path) -> Path:
 
 
 def _get_from_package(package_name: str, relative_path: Path) -> Path:
+    import pkg_resources
     return Path(pkg_resources.resource_filename(package_name, str(relative_path))).absolute()
 
 
@@ -0,0 +1,150 @@
+# coding=utf-8
+"""
+Runs external tools, streaming their output line by line
+
+The output is never accumulated: each line is logged as soon as it is read (unless muted), and only the last lines are
+kept in a ring buffer, for the caller and for error reports.
+"""
+import collections
+import logging
+import re
+import shlex
+import subprocess  # nosec
+import sys
+import threading
+import typing
+
+import elib_run
+
+from epab.exc import ProcessTimeoutError
+
+# Same logger as elib_run, so that the output of both runners is handled the same way
+_LOGGER_PROCESS = logging.getLogger('elib_run.process')
+
+DEFAULT_TIMEOUT = float(60)
+DEFAULT_TAIL = 1000
+
+
+class StreamingProcess:
+    """
+    Sub-process whose output (stdout and stderr) is read line by line
+
+    Args:
+        cmd: command to execute (executable followed by its arguments)
+        paths: paths to search the executable in
+        cwd: working directory
+        timeout: the process is killed after that many seconds
+        filters: regexes of lines to leave out of the output
+        tail: number of lines kept in the ring buffer, or None to keep them all
+    """
+
+    def __init__(self,
+                 cmd: str,
+                 *paths: str,
+                 cwd: str = '.',
+                 timeout: float = DEFAULT_TIMEOUT,
+                 filters: typing.Optional[typing.Union[typing.Iterable[str], str]] = None,
+                 tail: typing.Optional[int] = DEFAULT_TAIL,
+                 ) -> None:
+        exe_name, _, args = cmd.partition(' ')
+        exe_path = elib_run.find_executable(exe_name, *paths)
+        if not exe_path:
+            raise elib_run.ExecutableNotFoundError(exe_name)
+        self.exe_path = exe_path
+        self.args = shlex.split(args)
+        self.cwd = cwd
+        self.timeout = timeout
+        if isinstance(filters, str):
+            filters = [filters]
+        self._filters = [re.compile(filter_) for filter_ in filters or ()]
+        self.tail: typing.Deque[str] = collections.deque(maxlen=tail)
+        self.return_code: typing.Optional[int] = None
+        self._timed_out = False
+
+    def __str__(self) -> str:
+        return f'"{" ".join([str(self.exe_path.absolute())] + self.args)}" in "{self.cwd}"'
+
+    def _kill(self, process: subprocess.Popen):
+        self._timed_out = True
+        process.kill()
+
+    def lines(self) -> typing.Iterator[str]:
+        """
+        Starts the process and yields its output, line by line
+
+        Empty and filtered lines are skipped. The return code is available once the generator is exhausted; if the
+        generator is closed early, the process is killed.
+
+        Raises:
+            ProcessTimeoutError: if the process runs for longer than the timeout
+        """
+        process = subprocess.Popen(  # nosec
+            [str(self.exe_path.absolute())] + self.args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=self.cwd,
+        )
+        timer = threading.Timer(self.timeout, self._kill, (process,))
+        timer.start()
+        try:
+            for raw_line in iter(process.stdout.readline, b''):
+                line = raw_line.decode('utf8', errors='replace').rstrip()
+                if not line or any(filter_.match(line) for filter_ in self._filters):
+                    continue
+                self.tail.append(line)
+                yield line
+            process.wait()
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+        if self._timed_out:
+            self.return_code = -1
+            raise ProcessTimeoutError(self.exe_path.name, self.timeout)
+        self.return_code = process.returncode
+
+
+def run(cmd: str,
+        *paths: str,
+        cwd: str = '.',
+        mute: bool = False,
+        filters: typing.Optional[typing.Union[typing.Iterable[str], str]] = None,
+        failure_ok: bool = False,
+        timeout: float = DEFAULT_TIMEOUT,
+        tail: typing.Optional[int] = DEFAULT_TAIL,
+        ) -> typing.Tuple[str, int]:
+    """
+    Executes a command, logging its output as it runs
+
+    Drop-in replacement for "elib_run.run" that only keeps the last lines of the output in memory.
+
+    Args:
+        cmd: command to execute
+        paths: paths to search the executable in
+        cwd: working directory
+        mute: if True, the output is only logged if the command fails
+        filters: regexes of lines to leave out of the output
+        failure_ok: if False, a return code different than 0 exits the application
+        timeout: the process is killed after that many seconds
+        tail: number of lines of output to return, or None to return the whole output
+
+    Returns: tuple of (last lines of the output, return code)
+    """
+    process = StreamingProcess(cmd, *paths, cwd=cwd, timeout=timeout, filters=filters, tail=tail)
+    if not mute:
+        _LOGGER_PROCESS.info('%s: running', process)
+    for line in process.lines():
+        if not mute:
+            _LOGGER_PROCESS.debug(line)
+    output = '\n'.join(process.tail)
+    if process.return_code:
+        _LOGGER_PROCESS.error('%s: command failed: %s', process, process.return_code)
+        if mute:
+            _LOGGER_PROCESS.error('process output (last %s lines):\n%s', len(process.tail), output)
+        if not failure_ok:
+            sys.exit(process.return_code)
+    else:
+        _LOGGER_PROCESS.info('%s: success: %s', process, process.return_code)
+    return output, process.return_code
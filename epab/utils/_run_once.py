@@ -4,11 +4,17 @@ Simple decorator to ensure a function is ran only once
 """
 
 import logging
+import threading
+import typing
 
 from epab.core import CTX
 
 LOGGER = logging.getLogger('EPAB')
 
+# One lock per decorated function, so that concurrent pipeline stages calling the same function wait for each other
+_LOCKS: typing.Dict[str, typing.ContextManager] = {}
+_LOCKS_LOCK = threading.Lock()
+
 
 def run_once(func):
     """
@@ -16,13 +22,16 @@ def run_once(func):
     """
 
     def _inner(*args, **kwargs):
-        if func.__name__ in CTX.run_once:
-            LOGGER.info('skipping %s', func.__name__)
-            return CTX.run_once[func.__name__]
-
-        LOGGER.info('running: %s', func.__name__)
-        result = func(*args, **kwargs)
-        CTX.run_once[func.__name__] = result
-        return result
+        with _LOCKS_LOCK:
+            lock = _LOCKS.setdefault(func.__name__, threading.RLock())
+        with lock:
+            if func.__name__ in CTX.run_once:
+                LOGGER.info('skipping %s', func.__name__)
+                return CTX.run_once[func.__name__]
+
+            LOGGER.info('running: %s', func.__name__)
+            result = func(*args, **kwargs)
+            CTX.run_once[func.__name__] = result
+            return result
 
     return _inner
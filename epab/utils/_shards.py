@@ -0,0 +1,29 @@
+# coding=utf-8
+"""
+Splits work into shards of similar cost
+"""
+import typing
+
+
+def split_into_shards(costs: typing.Dict[str, float], count: int) -> typing.List[typing.List[str]]:
+    """
+    Splits items into shards of similar total cost
+
+    Items are assigned from the most to the least expensive, each to the shard with the lowest total so far (longest
+    processing time first).
+
+    Args:
+        costs: mapping of item -> cost
+        count: maximum number of shards
+
+    Returns: list of non-empty shards, each a sorted list of items
+    """
+    if count < 1:
+        raise ValueError(f'invalid shard count: {count}')
+    shards: typing.List[typing.List[str]] = [[] for _ in range(min(count, len(costs)))]
+    totals = [0.0] * len(shards)
+    for item in sorted(costs, key=lambda name: (-costs[name], name)):
+        index = totals.index(min(totals))
+        shards[index].append(item)
+        totals[index] += costs[item]
+    return [sorted(shard) for shard in shards]
@@ -0,0 +1,171 @@
+# coding=utf-8
+"""
+Compares the working tree with the index using the stat data cached in the index entries
+
+Only the files whose stat data changed (or that are "racily clean", i.e. modified during the same timestamp
+granularity as the index itself was written) are hashed; every other file is trusted to be unchanged, the same
+way Git itself does it.
+"""
+import hashlib
+import logging
+import os
+import stat
+import time
+import typing
+from pathlib import Path
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    import git
+
+LOGGER = logging.getLogger('EPAB')
+
+_HASH_CHUNK_SIZE = 100
+_MASK_32 = 0xFFFFFFFF
+_NS_PER_S = 1000000000
+_ASSUME_VALID = 0x8000
+_MODE_GITLINK = 0o160000
+_MODE_SYMLINK = 0o120000
+# Stat data this recent cannot be told apart from a change made right after it was read, on file systems with a coarse
+# timestamp granularity (2 seconds on FAT)
+_RACY_MARGIN_NS = 2 * _NS_PER_S
+
+
+def _blob_sha(data: bytes) -> str:
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()  # nosec
+
+
+def _time_matches(entry_time: typing.Tuple[int, int], stat_time_ns: int) -> bool:
+    entry_sec, entry_ns = entry_time
+    if entry_sec != (stat_time_ns // _NS_PER_S) & _MASK_32:
+        return False
+    # Some writers only store seconds in the index
+    return not entry_ns or entry_ns == stat_time_ns % _NS_PER_S
+
+
+def _stat_matches(entry: 'git.IndexEntry', stat_result: os.stat_result) -> bool:
+    if entry.size != stat_result.st_size & _MASK_32:
+        return False
+    if not _time_matches(entry.mtime, stat_result.st_mtime_ns):
+        return False
+    if not _time_matches(entry.ctime, stat_result.st_ctime_ns):
+        return False
+    return not entry.inode or entry.inode == stat_result.st_ino & _MASK_32
+
+
+def _mode_changed(entry: 'git.IndexEntry', stat_result: os.stat_result) -> bool:
+    if (entry.mode == _MODE_SYMLINK) != stat.S_ISLNK(stat_result.st_mode):
+        return True
+    if stat.S_ISDIR(stat_result.st_mode):
+        return True
+    if stat.S_ISREG(stat_result.st_mode) and os.name != 'nt':
+        return bool(stat_result.st_mode & stat.S_IXUSR) != bool(entry.mode & stat.S_IXUSR)
+    return False
+
+
+def _is_racily_clean(entry: 'git.IndexEntry', index_mtime_ns: int) -> bool:
+    entry_sec, entry_ns = entry.mtime
+    if not entry_ns:
+        return entry_sec >= index_mtime_ns // _NS_PER_S
+    return entry_sec * _NS_PER_S + entry_ns >= index_mtime_ns
+
+
+def _hash_files(repo: 'git.Repo', paths: typing.List[str]) -> typing.List[str]:
+    # "git hash-object" applies the same filters (e.g. line endings) as "git add" would
+    shas: typing.List[str] = []
+    for start in range(0, len(paths), _HASH_CHUNK_SIZE):
+        output: str = repo.git.hash_object('--', *paths[start:start + _HASH_CHUNK_SIZE])
+        shas.extend(output.splitlines())
+    return shas
+
+
+def modified_files(repo: 'git.Repo') -> typing.List[str]:
+    """
+    Lists tracked files whose content in the working tree differs from the index
+
+    Args:
+        repo: git.Repo object
+
+    Returns: list of paths relative to the root of the working tree
+    """
+    index = repo.index
+    index_mtime_ns = os.stat(index.path).st_mtime_ns
+    working_dir = Path(repo.working_tree_dir)
+    modified: typing.List[str] = []
+    to_hash: typing.List['git.IndexEntry'] = []
+    trusted_count = 0
+    racy_count = 0
+    for (path, stage), entry in index.entries.items():
+        if stage:
+            # Unmerged entries
+            if path not in modified:
+                modified.append(path)
+            continue
+        if entry.mode == _MODE_GITLINK or entry.flags & _ASSUME_VALID:
+            trusted_count += 1
+            continue
+        file_path = Path(working_dir, path)
+        try:
+            stat_result = os.lstat(str(file_path))
+        except (FileNotFoundError, NotADirectoryError):
+            modified.append(path)
+            continue
+        if _mode_changed(entry, stat_result):
+            modified.append(path)
+            continue
+        if _stat_matches(entry, stat_result):
+            if not _is_racily_clean(entry, index_mtime_ns):
+                trusted_count += 1
+                continue
+            racy_count += 1
+        if stat.S_ISLNK(stat_result.st_mode):
+            link_target = os.readlink(str(file_path)).encode('utf8')
+            if _blob_sha(link_target) != entry.hexsha:
+                modified.append(path)
+            continue
+        to_hash.append(entry)
+
+    for entry, sha in zip(to_hash, _hash_files(repo, [entry.path for entry in to_hash])):
+        if sha != entry.hexsha:
+            modified.append(entry.path)
+
+    LOGGER.debug('stat cache: %s files trusted, %s files hashed (%s racily clean)',
+                 trusted_count, len(to_hash), racy_count)
+    return sorted(modified)
+
+
+def worktree_stamp(repo: 'git.Repo', head: typing.Optional[str]) -> typing.Optional[str]:
+    """
+    Fingerprints the state the staged and modified files depend on, without reading the content of any file
+
+    The stamp covers HEAD and the stat data of the index and of the tracked files. Untracked files are not covered: a
+    file added to a new directory does not change the stat data of anything tracked.
+
+    Args:
+        repo: git.Repo object
+        head: SHA of HEAD
+
+    Returns: digest of the stamp, or None if some of the stat data is too recent to be trusted
+    """
+    now_ns = int(time.time() * _NS_PER_S)
+    index = repo.index
+    working_dir = Path(repo.working_tree_dir)
+    stamps: typing.List[typing.Any] = [head]
+    mtimes: typing.List[int] = []
+
+    def _stamp(path: str, stat_func: typing.Callable[[str], os.stat_result]):
+        try:
+            stat_result = stat_func(str(Path(working_dir, path)))
+        except (FileNotFoundError, NotADirectoryError):
+            stamps.append((path, None))
+            return
+        stamps.append((path, stat_result.st_mtime_ns, stat_result.st_ctime_ns, stat_result.st_size,
+                       stat_result.st_ino, stat_result.st_mode))
+        mtimes.append(stat_result.st_mtime_ns)
+
+    _stamp(index.path, os.stat)
+    for path, _ in sorted(index.entries):
+        _stamp(path, os.lstat)
+    if mtimes and max(mtimes) >= now_ns - _RACY_MARGIN_NS:
+        LOGGER.debug('working tree stamp: stat data too recent to be trusted')
+        return None
+    return hashlib.sha1(repr(stamps).encode('utf8')).hexdigest()  # nosec
@@ -0,0 +1,54 @@
+# coding=utf-8
+"""
+Working tree status of a repository
+"""
+import typing
+
+
+class RepoStatus:
+    """
+    Staged, modified and untracked files of a repository
+
+    Untracked files require a walk of the whole working tree; they are only listed the first time they are asked for.
+
+    Args:
+        staged: files with changes in the index
+        modified: tracked files with changes in the working tree that are not staged
+        untracked: list of untracked files, or a callable returning it
+    """
+
+    def __init__(
+            self,
+            staged: typing.List[str],
+            modified: typing.List[str],
+            untracked: typing.Union[typing.List[str], typing.Callable[[], typing.List[str]]],
+    ) -> None:
+        self._staged = staged
+        self._modified = modified
+        self._untracked = untracked
+
+    @property
+    def staged(self) -> typing.List[str]:
+        """
+        Returns: files with changes in the index
+        """
+        return list(self._staged)
+
+    @property
+    def modified(self) -> typing.List[str]:
+        """
+        Returns: tracked files with changes in the working tree that are not staged
+        """
+        return list(self._modified)
+
+    @property
+    def untracked(self) -> typing.List[str]:
+        """
+        Returns: untracked files
+        """
+        if callable(self._untracked):
+            self._untracked = self._untracked()
+        return list(self._untracked)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(staged={self._staged}, modified={self._modified})'
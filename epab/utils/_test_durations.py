@@ -0,0 +1,149 @@
+# coding=utf-8
+"""
+Keeps the duration of each test across runs, read from the JUnit XML reports written by pytest
+
+The history is a JSON lines file in EPAB's cache directory: each run appends one line with the SHA of the commit that
+was tested and the duration of each test that ran.
+"""
+import json
+import logging
+import statistics
+import typing
+import xml.etree.ElementTree as ElementTree  # nosec
+from pathlib import Path
+
+from ._cache import cache_path
+
+LOGGER = logging.getLogger('EPAB')
+
+# Tuple of (test node id, median duration before, median duration during the last runs)
+Regression = typing.Tuple[str, float, float]
+
+
+def _node_id(test_case: ElementTree.Element) -> typing.Optional[str]:
+    file = test_case.get('file')
+    name = test_case.get('name')
+    if not file or not name:
+        return None
+    file = Path(file).as_posix()
+    module = file[:-3].replace('/', '.') if file.endswith('.py') else file
+    classname = test_case.get('classname', '')
+    classes = classname[len(module) + 1:] if classname.startswith(f'{module}.') else ''
+    return '::'.join(part for part in (file, classes.replace('.', '::'), name) if part)
+
+
+def junit_durations(junit_file: typing.Union[str, Path]) -> typing.Dict[str, float]:
+    """
+    Reads the duration of each test from a JUnit XML report ("xunit1" family, which records the file of each test)
+
+    Args:
+        junit_file: path to the report
+
+    Returns: mapping of test node id -> duration in seconds
+    """
+    durations: typing.Dict[str, float] = {}
+    for test_case in ElementTree.parse(str(junit_file)).iter('testcase'):  # nosec
+        node_id = _node_id(test_case)
+        if node_id is not None:
+            durations[node_id] = float(test_case.get('time', 0))
+    return durations
+
+
+class DurationStore:
+    """
+    History of the duration of each test, one entry per run
+    """
+
+    def __init__(self) -> None:
+        self._path = cache_path('test_durations.jsonl')
+        self._runs: typing.List[typing.Tuple[typing.Optional[str], typing.Dict[str, float]]] = []
+        self._latest: typing.Optional[typing.Dict[str, float]] = None
+        if self._path.exists():
+            for line in self._path.read_text(encoding='utf8').splitlines():
+                try:
+                    run = json.loads(line)
+                    self._runs.append((run['sha'], dict(run['durations'])))
+                except (ValueError, KeyError, TypeError):
+                    LOGGER.debug('invalid test durations entry, ignoring: %s', line)
+
+    @property
+    def runs(self) -> typing.List[typing.Tuple[typing.Optional[str], typing.Dict[str, float]]]:
+        """
+        Returns: list of tuples of (commit SHA, mapping of test node id -> duration in seconds), oldest first
+        """
+        return [(sha, dict(durations)) for sha, durations in self._runs]
+
+    @property
+    def durations(self) -> typing.Dict[str, float]:
+        """
+        Returns: mapping of test node id -> duration in seconds during the last run of each test
+        """
+        if self._latest is None:
+            self._latest = {}
+            for _, durations in self._runs:
+                self._latest.update(durations)
+        return dict(self._latest)
+
+    def record(self, sha: typing.Optional[str], durations: typing.Dict[str, float]):
+        """
+        Appends the durations of a run to the history
+
+        Args:
+            sha: SHA of the commit that was tested
+            durations: mapping of test node id -> duration in seconds
+        """
+        if not durations:
+            LOGGER.debug('no test duration to record')
+            return
+        durations = {node_id: round(duration, 3) for node_id, duration in durations.items()}
+        with self._path.open('a', encoding='utf8') as stream:
+            stream.write(json.dumps({'sha': sha, 'durations': durations}, sort_keys=True, separators=(',', ':')))
+            stream.write('\n')
+        self._runs.append((sha, durations))
+        self._latest = None
+
+    def duration(self, target: str) -> typing.Optional[float]:
+        """
+        Returns the expected duration of a pytest target
+
+        Args:
+            target: test module (all its tests) or test node id (the test and its parameters)
+
+        Returns: duration in seconds, or None if no test of that target ran before
+        """
+        prefixes = (f'{target}::', f'{target}[')
+        matching = [
+            duration for node_id, duration in self.durations.items()
+            if node_id == target or node_id.startswith(prefixes)
+        ]
+        return sum(matching) if matching else None
+
+    def regressions(self, runs: int, threshold: float, min_duration: float = 0) -> typing.List[Regression]:
+        """
+        Finds the tests that became slower
+
+        The median duration of a test during its last runs is compared to its median duration during the same number
+        of runs before them; tests that did not run twice that number of times are left out.
+
+        Args:
+            runs: number of runs to compare
+            threshold: minimum growth of the median duration, in percent
+            min_duration: tests faster than this (in seconds, during the last runs) are left out
+
+        Returns: list of regressions, the largest growth first
+        """
+        if runs < 1:
+            raise ValueError(f'invalid number of runs: {runs}')
+        history: typing.Dict[str, typing.List[float]] = {}
+        for _, durations in self._runs:
+            for node_id, duration in durations.items():
+                history.setdefault(node_id, []).append(duration)
+        result = []
+        for node_id, durations in history.items():
+            if len(durations) < runs * 2:
+                continue
+            before = statistics.median(durations[-runs * 2:-runs])
+            after = statistics.median(durations[-runs:])
+            if after >= min_duration and after > before * (1 + threshold / 100):
+                result.append((node_id, before, after))
+        return sorted(result, key=lambda item: (-(item[2] / item[1] if item[1] else float('inf')), item[0]))
@@ -0,0 +1,121 @@
+# coding=utf-8
+"""
+Maps source files to the tests that execute them, from the per-test coverage contexts recorded by pytest-cov
+("--cov-context=test"), to only run the tests affected by a change set
+"""
+import json
+import logging
+import os
+import sqlite3
+import typing
+from pathlib import Path
+
+from ._cache import cache_path, write_atomic
+
+LOGGER = logging.getLogger('EPAB')
+
+_QUERY = """
+SELECT DISTINCT file.path, context.context FROM {table}
+JOIN file ON file.id = {table}.file_id
+JOIN context ON context.id = {table}.context_id
+"""
+
+
+def coverage_contexts(coverage_file: typing.Union[str, Path] = '.coverage') -> typing.Dict[str, typing.Set[str]]:
+    """
+    Reads which tests executed which files from a coverage data file (coverage 5+ SQLite format)
+
+    Files outside of the current directory and code executed outside of a test (for example at import time) are left
+    out.
+
+    Args:
+        coverage_file: path to the coverage data file
+
+    Returns: mapping of file path (POSIX, relative to the current directory) -> set of test node ids
+    """
+    root = Path(os.path.abspath('.'))
+    result: typing.Dict[str, typing.Set[str]] = {}
+    connection = sqlite3.connect(str(coverage_file))
+    try:
+        for table in ('line_bits', 'arc'):
+            try:
+                rows = connection.execute(_QUERY.format(table=table)).fetchall()
+            except sqlite3.OperationalError:
+                LOGGER.debug('no "%s" table in %s', table, coverage_file)
+                continue
+            for path, context in rows:
+                test = context.rpartition('|')[0]
+                if not test:
+                    continue
+                try:
+                    relative_path = Path(os.path.abspath(path)).relative_to(root).as_posix()
+                except ValueError:
+                    continue
+                result.setdefault(relative_path, set()).add(test)
+    finally:
+        connection.close()
+    return result
+
+
+class ImpactMap:
+    """
+    Persistent mapping of source files to the tests that execute them
+
+    The map is updated after each run with the coverage data of the tests that ran, so that running a subset of the
+    tests keeps the mapping of the other tests.
+    """
+
+    def __init__(self) -> None:
+        self._path = cache_path('test_impact.json')
+        self._files: typing.Dict[str, typing.Set[str]] = {}
+        self.green_sha: typing.Optional[str] = None
+        if self._path.exists():
+            try:
+                content = json.loads(self._path.read_text(encoding='utf8'))
+                self._files = {path: set(tests) for path, tests in content['files'].items()}
+                self.green_sha = content['green_sha']
+            except (ValueError, KeyError):
+                LOGGER.debug('invalid test impact map, ignoring: %s', self._path)
+
+    @property
+    def files(self) -> typing.List[str]:
+        """
+        Returns: sorted list of the files known to the map
+        """
+        return sorted(self._files)
+
+    def update(self, contexts: typing.Dict[str, typing.Set[str]]):
+        """
+        Replaces the mapping of the tests found in new coverage data
+
+        Args:
+            contexts: output of coverage_contexts
+        """
+        tests_run = set().union(*contexts.values()) if contexts else set()
+        for path in list(self._files):
+            self._files[path] -= tests_run
+            if not self._files[path]:
+                del self._files[path]
+        for path, tests in contexts.items():
+            self._files.setdefault(path, set()).update(tests)
+        LOGGER.debug('test impact map: %s tests updated, %s files', len(tests_run), len(self._files))
+
+    def tests_for(self, path: str) -> typing.Optional[typing.Set[str]]:
+        """
+        Args:
+            path: POSIX path relative to the root of the repository
+
+        Returns: set of test node ids executing that file, or None if the file is not known
+        """
+        tests = self._files.get(path)
+        return None if tests is None else set(tests)
+
+    def save(self):
+        """
+        Writes the map to EPAB's cache directory
+        """
+        content = {
+            'green_sha': self.green_sha,
+            'files': {path: sorted(tests) for path, tests in sorted(self._files.items())},
+        }
+        write_atomic(self._path, json.dumps(content))
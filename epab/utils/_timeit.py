@@ -3,10 +3,11 @@
 Simple decorator to time functions
 """
 
+import logging
 import time
 from functools import wraps
 
-from epab._logging import LOGGER
+LOGGER = logging.getLogger('EPAB')
 
 
 def timeit(func):
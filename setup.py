@@ -13,14 +13,13 @@ requirements = [
     'isort',
     'safety',
     'flake8',
-    'coverage',
+    'coverage>=5.0',
     'hypothesis',
     'pytest-cache',
-    'pytest-cov',
+    'pytest-cov>=2.8',
     'pytest-vcr',
     'pytest-pycharm',
     'pytest',
-    'gitchangelog',
     'gitpython',
     'mockito',
     'setuptools-scm',
@@ -28,6 +27,7 @@ requirements = [
     'pefile',
     'mypy',
     'toml',
+    'tomlkit',
     'sarge',
     'pytest-repeat',
     'pytest-faker',
@@ -12,6 +12,7 @@ from mockito import unstub, verifyNoUnwantedInteractions, verifyStubbedInvocatio
 # noinspection PyProtectedMember
 from epab._logging import _setup_logging
 from epab.core import CTX, config as epab_config
+from epab.utils import AV
 
 
 def pytest_configure(config):
@@ -56,6 +57,8 @@ def _global_tear_down(tmpdir, monkeypatch):
     CTX._reset()
     orig_dir = os.getcwd()
     epab_config.CHANGELOG_DISABLE.default = False
+    epab_config.CHANGELOG_INCREMENTAL.default = False
+    epab_config.CHANGELOG_FULL_REBUILD_EVERY.default = 10
     epab_config.ARTIFACTS.default = []
     epab_config.TEST_RUNNER_OPTIONS.default = ''
     epab_config.TEST_AV_RUNNER_OPTIONS.default = '--long'
@@ -65,6 +68,8 @@ def _global_tear_down(tmpdir, monkeypatch):
     epab_config.QT_RES_TGT.default = ''
     epab_config.QUIET.default = False
     epab_config.MYPY_ARGS.default = ''
+    epab_config.LINT_CACHE.default = False
+    epab_config.MYPY_DAEMON.default = False
     folder = Path(tmpdir).absolute()
     os.chdir(folder)
     yield
@@ -80,6 +85,7 @@ def _logging():
 def _mockito():
     unstub()
     yield
+    AV.flush()
     verifyNoUnwantedInteractions()
     verifyStubbedInvocationsAreUsed()
     unstub()
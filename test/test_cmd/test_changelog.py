@@ -2,99 +2,267 @@
 
 from pathlib import Path
 
-import elib_run
 import pytest
 from mockito import expect, mock, verify, when
 
 import epab.utils
 # noinspection PyProtectedMember
-from epab.cmd._chglog import _chglog
+from epab.cmd._chglog import TAG_FILTER_REGEXP, _chglog, render_changelog
 from epab.core import CTX, config
+from epab.utils import ChangelogCommit, ChangelogVersion
 
 
-# @pytest.fixture(autouse=True, name='repo')
-# def _all():
-#     repo = mock(spec=epab.utils.Repo)
-#     when(elib_run).run(...).thenReturn(('', 0))
-#     CTX.repo = repo
-#     when(epab.utils).ensure_exe(...)
-#     yield repo
+def _commit(subject, body='', author='author'):
+    return ChangelogCommit('0' * 40, subject, body, author)
 
 
-def test_changelog_config_disabled(caplog):
+@pytest.fixture(name='repo')
+def _repo():
+    repo = mock(spec=epab.utils.Repo)
+    CTX.repo = repo
+    yield repo
+
+
+def test_changelog_config_disabled(repo, caplog):
     caplog.set_level(10)
     changelog = Path('CHANGELOG.md')
     config.CHANGELOG_DISABLE.default = True
     assert config.CHANGELOG_DISABLE() is True
-    expect(elib_run, times=0).run(...)
+    expect(repo, times=0).changelog_versions(...)
     _chglog()
     assert 'skipping changelog update as per config' in caplog.text
     assert not changelog.exists()
 
 
-@pytest.mark.parametrize(
-    'src,result',
-    [
-        ('content', 'content'),
-        ('content    \r\n\r\ncontent', 'content    \n\n\n\ncontent'),
-        ('content  \r\n\r\n\r\ncontent', 'content  \n\n\n\n\n\ncontent'),
-
-    ]
-)
-def test_changelog(src, result, caplog):
+def test_changelog(repo, caplog):
     caplog.set_level(10)
     changelog = Path('CHANGELOG.md')
     assert config.CHANGELOG_DISABLE() is False
-    when(epab.utils).ensure_exe(...)
-    when(elib_run).run('gitchangelog', mute=True).thenReturn((src, 0))
+    versions = [ChangelogVersion(None, '2018-01-02', [_commit('new: usr: some feature')])]
+    when(repo).changelog_versions(TAG_FILTER_REGEXP, None).thenReturn(versions)
     _chglog()
     assert 'writing changelog' in caplog.text
-    assert changelog.exists()
-    assert changelog.read_text() == result
+    assert changelog.read_text(encoding='utf8') == '# Changelog\n## (unreleased)\n### New\n* Some feature. [author]'
 
 
-def test_straight_commit():
-    repo = mock(spec=epab.utils.Repo)
-    CTX.repo = repo
-    when(epab.utils).ensure_exe(...)
-    when(elib_run).run(...).thenReturn(('', 0))
+def test_render():
+    versions = [
+        ChangelogVersion(None, '2018-01-03', [_commit('chg: dev: update reqs'), _commit('@wip something')]),
+        ChangelogVersion('2018.1.2.1', '2018-01-02', [
+            _commit('fix: broken thing', 'details\n\n  more details  \n\nSigned-off-by: someone\nCo-authored-by: x\n'),
+            _commit('something else!', author='other'),
+            _commit('new: usr: feature @minor'),
+            _commit('new: feature'),
+            _commit('chg: usr: change'),
+            _commit('release 2018.1.2.1'),
+        ]),
+        ChangelogVersion('2018.1.1.1', '2018-01-01', [_commit('first commit'), _commit('  ')]),
+        ChangelogVersion('2018.1.0.1', '2017-12-31', [_commit('fix: usr: subject @tag'), _commit('new: pkg: x')]),
+    ]
+    assert render_changelog(versions) == '\n'.join([
+        '# Changelog',
+        '## 2018.1.2.1 (2018-01-02)',
+        '### New',
+        '* Feature. [author]',
+        '### Changes',
+        '* Change. [author]',
+        '### Fix',
+        '* Broken thing. [author]',
+        '  details',
+        '    more details',
+        '### Other',
+        '* Something else! [other]',
+        '## 2018.1.1.1 (2018-01-01)',
+        '### Other',
+        '* No commit message. [author]',
+        '## 2018.1.0.1 (2017-12-31)',
+        '### Fix',
+        '* Fix: usr: subject @tag. [author]',
+    ])
+
+
+def test_render_no_version():
+    assert render_changelog([]) == '# Changelog'
+
+
+def test_straight_commit(repo):
+    when(repo).changelog_versions(...).thenReturn([])
     when(repo).amend_commit(append_to_msg='update changelog [auto]', files_to_add=str(config.CHANGELOG_FILE_PATH()))
     _chglog(True)
 
 
-def test_commit_amend():
-    repo = mock(spec=epab.utils.Repo)
-    CTX.repo = repo
-    when(epab.utils).ensure_exe(...)
-    when(elib_run).run(...).thenReturn(('', 0))
+def test_commit_amend(repo):
+    when(repo).changelog_versions(...).thenReturn([])
     when(repo).stage_subset(str(config.CHANGELOG_FILE_PATH()))
     _chglog(stage=True)
 
 
-def test_flags_exclusion():
-    repo = mock(spec=epab.utils.Repo)
-    CTX.repo = repo
-    when(epab.utils).ensure_exe(...)
-    when(elib_run).run(...).thenReturn(('', 0))
+def test_flags_exclusion(repo):
+    when(repo).changelog_versions(...).thenReturn([])
     when(repo).amend_commit(...)
     _chglog(amend=True, stage=True)
 
 
-def test_next_version():
-    repo = mock(spec=epab.utils.Repo)
-    CTX.repo = repo
-    when(epab.utils).ensure_exe(...)
-    when(elib_run).run(...).thenReturn(('', 0))
-    when(repo).tag('test')
-    when(repo).remove_tag('test')
+def test_next_version(repo):
+    when(repo).changelog_versions(TAG_FILTER_REGEXP, 'test').thenReturn([])
     _chglog(next_version='test')
+    verify(repo, times=0).tag(...)
 
 
-def test_auto_next_version():
-    repo = mock(spec=epab.utils.Repo)
-    CTX.repo = repo
-    when(epab.utils).ensure_exe(...)
-    when(elib_run).run(...).thenReturn(('', 0))
+def test_auto_next_version(repo):
+    when(repo).changelog_versions(TAG_FILTER_REGEXP, 'test').thenReturn([])
     when(epab.utils).get_next_version().thenReturn('test')
     _chglog(auto_next_version=True)
     verify(epab.utils).get_next_version()
+
+
+_EXISTING = '\n'.join([
+    '# Changelog',
+    '## (unreleased)',
+    '### Other',
+    '* Old unreleased change. [author]',
+    '## 2018.1.2.1 (2018-01-02)',
+    '### Other',
+    '* Released change. [author]',
+])
+
+
+def _incremental_repo(repo, full=None):
+    Path('CHANGELOG.md').write_text(_EXISTING, encoding='utf8')
+    when(repo).list_tags().thenReturn(['2018.1.2.1', 'other'])
+    new_versions = [
+        ChangelogVersion(None, '2018-01-04', [_commit('unreleased change')]),
+        ChangelogVersion('2018.1.3.1', '2018-01-03', [_commit('new change')]),
+    ]
+    when(repo).changelog_versions(TAG_FILTER_REGEXP, None, '2018.1.2.1').thenReturn(new_versions)
+    if full is not None:
+        when(repo).changelog_versions(TAG_FILTER_REGEXP, None).thenReturn(full)
+
+
+_INCREMENTAL = '\n'.join([
+    '# Changelog',
+    '## (unreleased)',
+    '### Other',
+    '* Unreleased change. [author]',
+    '## 2018.1.3.1 (2018-01-03)',
+    '### Other',
+    '* New change. [author]',
+    '## 2018.1.2.1 (2018-01-02)',
+    '### Other',
+    '* Released change. [author]',
+])
+
+
+def test_incremental(repo):
+    _incremental_repo(repo)
+    _chglog(incremental=True)
+    assert Path('CHANGELOG.md').read_text(encoding='utf8') == _INCREMENTAL
+
+
+def test_incremental_config(repo):
+    config.CHANGELOG_INCREMENTAL.default = True
+    _incremental_repo(repo)
+    _chglog()
+    assert Path('CHANGELOG.md').read_text(encoding='utf8') == _INCREMENTAL
+
+
+@pytest.mark.parametrize(
+    'existing',
+    [
+        '',
+        '# Changelog',
+        '# Changelog\n## (unreleased)\n### Other\n* Change. [author]',
+        '# Changelog\n## unknown (2018-01-01)\n### Other\n* Change. [author]',
+        '# Other title\n## 2018.1.2.1 (2018-01-02)\n### Other\n* Change. [author]',
+    ]
+)
+def test_incremental_no_version(repo, existing, caplog):
+    Path('CHANGELOG.md').write_text(existing, encoding='utf8')
+    if existing.startswith('# Changelog'):
+        when(repo).list_tags().thenReturn(['2018.1.2.1'])
+    when(repo).changelog_versions(TAG_FILTER_REGEXP, None).thenReturn([])
+    _chglog(incremental=True)
+    assert Path('CHANGELOG.md').read_text(encoding='utf8') == '# Changelog'
+    assert 'no released version found in the changelog, rebuilding it' in caplog.text
+
+
+def test_incremental_no_file(repo):
+    when(repo).changelog_versions(TAG_FILTER_REGEXP, None).thenReturn([])
+    _chglog(incremental=True)
+    assert Path('CHANGELOG.md').read_text(encoding='utf8') == '# Changelog'
+
+
+def test_incremental_next_version(repo):
+    Path('CHANGELOG.md').write_text(_EXISTING.replace('(unreleased)', '2018.1.3.1 (2018-01-03)'), encoding='utf8')
+    when(repo).list_tags().thenReturn(['2018.1.2.1', '2018.1.3.1'])
+    versions = [ChangelogVersion('2018.1.3.1', '2018-01-04', [_commit('newer change')])]
+    when(repo).changelog_versions(TAG_FILTER_REGEXP, '2018.1.3.1', '2018.1.2.1').thenReturn(versions)
+    _chglog(next_version='2018.1.3.1', incremental=True)
+    assert Path('CHANGELOG.md').read_text(encoding='utf8') == '\n'.join([
+        '# Changelog',
+        '## 2018.1.3.1 (2018-01-04)',
+        '### Other',
+        '* Newer change. [author]',
+        '## 2018.1.2.1 (2018-01-02)',
+        '### Other',
+        '* Released change. [author]',
+    ])
+
+
+def test_incremental_not_a_version(repo):
+    Path('CHANGELOG.md').write_text(_EXISTING, encoding='utf8')
+    when(repo).list_tags().thenReturn(['2018.1.2.1'])
+    when(repo).changelog_versions(TAG_FILTER_REGEXP, None, '2018.1.2.1').thenRaise(ValueError)
+    when(repo).changelog_versions(TAG_FILTER_REGEXP, None).thenReturn([])
+    _chglog(incremental=True)
+    assert Path('CHANGELOG.md').read_text(encoding='utf8') == '# Changelog'
+
+
+def test_incremental_full_rebuild(repo, caplog):
+    config.CHANGELOG_FULL_REBUILD_EVERY.default = 3
+    full = [ChangelogVersion('2018.1.3.1', '2018-01-03', [_commit('full')])]
+    _incremental_repo(repo, full)
+    for _ in range(2):
+        CTX.run_once = {}
+        _chglog(incremental=True)
+        assert Path('CHANGELOG.md').read_text(encoding='utf8') == _INCREMENTAL
+        Path('CHANGELOG.md').write_text(_EXISTING, encoding='utf8')
+    CTX.run_once = {}
+    _chglog(incremental=True)
+    assert 'incremental changelog update differs from a full rebuild' in caplog.text
+    assert '-* New change. [author]' in caplog.text
+    assert Path('CHANGELOG.md').read_text(encoding='utf8') == '\n'.join([
+        '# Changelog', '## 2018.1.3.1 (2018-01-03)', '### Other', '* Full. [author]'
+    ])
+    Path('CHANGELOG.md').write_text(_EXISTING, encoding='utf8')
+    CTX.run_once = {}
+    _chglog(incremental=True)
+    assert Path('CHANGELOG.md').read_text(encoding='utf8') == _INCREMENTAL
+
+
+def test_incremental_never_rebuild(repo):
+    config.CHANGELOG_FULL_REBUILD_EVERY.default = 0
+    _incremental_repo(repo)
+    for _ in range(12):
+        CTX.run_once = {}
+        Path('CHANGELOG.md').write_text(_EXISTING, encoding='utf8')
+        _chglog(incremental=True)
+        assert Path('CHANGELOG.md').read_text(encoding='utf8') == _INCREMENTAL
+
+
+def test_check(repo, caplog):
+    _incremental_repo(repo, [
+        ChangelogVersion(None, '2018-01-04', [_commit('unreleased change')]),
+        ChangelogVersion('2018.1.3.1', '2018-01-03', [_commit('new change')]),
+        ChangelogVersion('2018.1.2.1', '2018-01-02', [_commit('released change')]),
+    ])
+    _chglog(check=True)
+    assert 'incremental changelog update is consistent with a full rebuild' in caplog.text
+    assert Path('CHANGELOG.md').read_text(encoding='utf8') == _INCREMENTAL
+
+
+def test_check_differs(repo):
+    _incremental_repo(repo, [])
+    with pytest.raises(SystemExit):
+        _chglog(check=True)
+    assert Path('CHANGELOG.md').read_text(encoding='utf8') == _EXISTING
@@ -25,8 +25,8 @@ def test_freeze():
     when(freeze)._install_pyinstaller()
     when(freeze)._patch('version')
 
-    expect(elib_run).run('pipenv clean', failure_ok=True)
-    expect(elib_run).run(contains('pyinstaller --log-level=WARN'), timeout=300)
+    expect(epab.utils).run('pipenv clean', failure_ok=True)
+    expect(epab.utils).run(contains('pyinstaller --log-level=WARN'), timeout=300)
 
     freeze._freeze('version')
 
@@ -49,7 +49,7 @@ def test_patch():
 
     when(repo).get_current_branch().thenReturn('branch')
     when(repo).get_sha().thenReturn('sha')
-    when(elib_run).run(
+    when(epab.utils).run(
         'dummy.exe '
         f'./dist/{package_name}.exe '
         '/high version '
@@ -69,13 +69,13 @@ def test_patch():
 
 
 def test_install_pyinstaller_installed():
-    expect(elib_run).run('pyinstaller --version').thenReturn(('version   ', 0))
+    expect(epab.utils).run('pyinstaller --version').thenReturn(('version   ', 0))
     freeze._install_pyinstaller()
 
 
 def test_install_pyinstaller_not_installed():
-    when(elib_run).run('pip install pyinstaller==3.4')
-    when(elib_run).run('pyinstaller --version') \
+    when(epab.utils).run('pip install pyinstaller==3.4')
+    when(epab.utils).run('pyinstaller --version') \
         .thenRaise(elib_run.ExecutableNotFoundError('pyinstaller')) \
         .thenReturn(('version', 0))
 
@@ -103,8 +103,8 @@ def test_with_data_files():
 
     when(freeze)._install_pyinstaller()
     when(freeze)._patch('version')
-    expect(elib_run).run('pipenv clean', failure_ok=True)
-    expect(elib_run).run(and_(
+    expect(epab.utils).run('pipenv clean', failure_ok=True)
+    expect(epab.utils).run(and_(
         contains('pyinstaller --log-level=WARN'),
         contains('--add-data "file1"'),
         contains('--add-data "file2"')), timeout=300)
@@ -1,17 +1,21 @@
 # coding=utf-8
 
 import itertools
+import logging.handlers
 import subprocess
+import threading
+import time
 from pathlib import Path
 
 import elib_run
 import pytest
-from mockito import mock, verify, verifyNoMoreInteractions, verifyStubbedInvocationsAreUsed, when
+from click.testing import CliRunner
+from mockito import expect, mock, verify, verifyNoMoreInteractions, verifyStubbedInvocationsAreUsed, when
 
 import epab.utils
 from epab.core import CTX, config
 # noinspection PyProtectedMember
-from epab.linters import _bandit, _dead_fixtures, _lint, _mypy, _pylint, _safety, _sort
+from epab.linters import _bandit, _changed, _dead_fixtures, _lint, _mypy, _pylint, _safety, _sort
 
 
 @pytest.fixture(autouse=True, name='repo')
@@ -62,6 +66,138 @@ def test_lint_appveyor(amend_stage):
     _check_invocations(context, amend, stage)
 
 
+def test_lint_failure():
+    context = mock()
+    when(context).invoke(_bandit.bandit).thenRaise(SystemExit(2))
+    with pytest.raises(SystemExit) as exc_info:
+        _lint._lint(context, jobs=2)
+    assert exc_info.value.code == 2
+    _check_invocations(context, False, False)
+
+
+def test_lint_fail_fast():
+    invoked = []
+
+    class _Context:
+
+        @staticmethod
+        def invoke(linter):
+            invoked.append(linter)
+            if linter is _safety.safety:
+                raise SystemExit(1)
+            time.sleep(0.2)
+
+    with pytest.raises(SystemExit):
+        _lint._lint(_Context(), jobs=1, fail_fast=True)
+    assert invoked[0] is _safety.safety
+    assert _mypy.mypy not in invoked
+
+
+@pytest.mark.parametrize('jobs', ['0', '-1'])
+def test_lint_invalid_jobs(jobs):
+    when(_lint)._lint(...)
+    result = CliRunner().invoke(_lint.lint, ['-j', jobs])
+    assert result.exit_code == 2
+    assert 'Invalid value' in result.output
+    verify(_lint, times=0)._lint(...)
+
+
+def test_lint_output_is_buffered():
+    handler = logging.handlers.BufferingHandler(100)
+    logging.getLogger('EPAB').addHandler(handler)
+    log_buffer = epab.utils.LogBuffer()
+    log_buffer.install()
+    messages = []
+
+    def _linter():
+        log_buffer.start()
+        _lint.LOGGER.info('from linter')
+        messages.extend(record.msg for record in handler.buffer)
+        log_buffer.flush()
+
+    try:
+        thread = threading.Thread(target=_linter)
+        thread.start()
+        thread.join()
+    finally:
+        log_buffer.uninstall()
+        logging.getLogger('EPAB').removeHandler(handler)
+    assert not messages
+    assert [record.msg for record in handler.buffer] == ['from linter']
+
+
+@pytest.mark.parametrize(
+    'changed_files,extra_linters',
+    [
+        (['test_package/module.py'], []),
+        (['Pipfile.lock'], [_safety.safety]),
+        (['test/test_module.py'], [_dead_fixtures.pytest_dead_fixtures]),
+    ]
+)
+def test_lint_changed_only(repo, changed_files, extra_linters):
+    when(repo).list_changed_files('base').thenReturn(changed_files)
+    context = mock()
+    _lint._lint(context, changed_only=True, base_ref='base')
+    for linter in (_bandit.bandit, _pylint.pylint, _mypy.mypy):
+        verify(context).invoke(linter, changed_only=True, base_ref='base')
+    for linter in extra_linters:
+        verify(context).invoke(linter)
+    verifyNoMoreInteractions(context)
+
+
+def test_changed_python_files(repo):
+    Path('test_package').mkdir()
+    Path('test_package/__init__.py').write_text('from ._module import func\n')
+    Path('test_package/_module.py').touch()
+    Path('test_package/_other.py').touch()
+    when(repo).list_changed_files('HEAD').thenReturn(
+        ['test_package/_module.py', 'test_package/_deleted.py', 'test_package/data.txt', 'setup.py']
+    )
+    assert _changed.changed_python_files() == ['test_package/_module.py']
+    assert _changed.changed_python_files(with_dependents=True) == [
+        'test_package/__init__.py', 'test_package/_module.py'
+    ]
+
+
+def test_changed_python_files_deleted_module(repo):
+    Path('test_package').mkdir()
+    Path('test_package/__init__.py').touch()
+    Path('test_package/_module.py').write_text('from ._deleted import func\n')
+    Path('test_package/_other.py').touch()
+    when(repo).list_changed_files('HEAD').thenReturn(['test_package/_deleted.py'])
+    assert _changed.changed_python_files() == []
+    assert _changed.changed_python_files(with_dependents=True) == ['test_package/_module.py']
+
+
+def test_pylint_changed_only():
+    when(_pylint).changed_python_files('HEAD', with_dependents=True).thenReturn(['a.py', 'b.py'])
+    when(epab.utils).run(f'pylint a.py b.py --reports=n {_pylint.BASE_CMD}', mute=True)
+    _pylint._pylint(None, False, changed_only=True)
+    verifyStubbedInvocationsAreUsed()
+
+
+def test_pylint_changed_only_nothing_changed():
+    when(_pylint).changed_python_files('HEAD', with_dependents=True).thenReturn([])
+    expect(epab.utils, times=0).run(...)
+    _pylint._pylint(None, False, changed_only=True)
+
+
+def test_mypy_changed_only():
+    when(_mypy).changed_python_files('base', with_dependents=True).thenReturn(['a.py'])
+    when(elib_run).run(
+        'mypy a.py --ignore-missing-imports --follow-imports=silent', failure_ok=True
+    ).thenReturn(('', 0))
+    _mypy._mypy(changed_only=True, base_ref='base')
+    verifyStubbedInvocationsAreUsed()
+
+
+def test_bandit_changed_only():
+    when(_bandit).changed_python_files('HEAD').thenReturn(['a.py', 'b.py'])
+    when(elib_run).run('bandit a.py b.py', mute=True)
+    _bandit._bandit(changed_only=True)
+    verifyStubbedInvocationsAreUsed()
+
+
 def test_isort_package_dir():
     Path(f'./{config.PACKAGE_NAME()}').mkdir()
     test_file = Path(f'./{config.PACKAGE_NAME()}/test.py')
@@ -129,9 +265,9 @@ def test_safety():
 )
 def test_pylint(params, cmd):
     config.PACKAGE_NAME.default = 'test'
-    with when(elib_run).run(f'{cmd} {_pylint.BASE_CMD}', mute=True):
+    with when(epab.utils).run(f'{cmd} {_pylint.BASE_CMD}', mute=True):
         _pylint._pylint(*params)
-        verify(elib_run).run(...)
+        verify(epab.utils).run(...)
 
 
 def test_dead_fixtures():
@@ -159,6 +295,77 @@ def test_mypy_fails():
     verifyStubbedInvocationsAreUsed()
 
 
+def _dmypy_cmd(action):
+    status_file = Path('.epab_cache/dmypy/status.json').absolute()
+    return f'dmypy --status-file {status_file} {action}'
+
+
+def test_mypy_daemon():
+    when(elib_run).find_executable('dmypy').thenReturn('dmypy')
+    when(elib_run).run(
+        _dmypy_cmd('run -- -p test_package --ignore-missing-imports'), failure_ok=True
+    ).thenReturn(('', 0))
+    expect(_mypy, times=0)._mypy_cold(...)
+    _mypy._mypy(daemon=True)
+    verifyStubbedInvocationsAreUsed()
+
+
+def test_mypy_daemon_from_config():
+    config.MYPY_DAEMON.default = True
+    when(_mypy)._mypy_daemon('-p test_package --ignore-missing-imports').thenReturn(0)
+    _mypy._mypy()
+    verifyStubbedInvocationsAreUsed()
+
+
+def test_mypy_daemon_type_errors():
+    when(elib_run).find_executable('dmypy').thenReturn('dmypy')
+    when(elib_run).run(
+        _dmypy_cmd('run -- -p test_package --ignore-missing-imports'), failure_ok=True
+    ).thenReturn(('', 1))
+    expect(_mypy, times=0)._mypy_cold(...)
+    with pytest.raises(SystemExit):
+        _mypy._mypy(daemon=True)
+
+
+def test_mypy_daemon_blocking_error():
+    when(elib_run).find_executable('dmypy').thenReturn('dmypy')
+    when(elib_run).run(
+        _dmypy_cmd('run -- -p test_package --ignore-missing-imports'), failure_ok=True
+    ).thenReturn(('test_package/module.py:3:5: error: invalid syntax  [syntax]\nFound 1 error in 1 file '
+                  '(errors prevented further checking)', 2))
+    expect(_mypy, times=0)._mypy_cold(...)
+    with pytest.raises(SystemExit) as exc_info:
+        _mypy._mypy(daemon=True)
+    assert exc_info.value.code == 2
+
+
+@pytest.mark.parametrize('daemon_available', [True, False])
+def test_mypy_daemon_fallback(daemon_available):
+    when(elib_run).find_executable('dmypy').thenReturn('dmypy' if daemon_available else None)
+    if daemon_available:
+        when(elib_run).run(
+            _dmypy_cmd('run -- -p test_package --ignore-missing-imports'), failure_ok=True
+        ).thenReturn(('Daemon has died', 2))
+    when(elib_run).run('mypy -p test_package --ignore-missing-imports', failure_ok=True).thenReturn(('', 0))
+    _mypy._mypy(daemon=True)
+    verifyStubbedInvocationsAreUsed()
+
+
+def test_mypy_daemon_args_changed():
+    when(elib_run).find_executable('dmypy').thenReturn('dmypy')
+    when(elib_run).run(
+        _dmypy_cmd('run -- -p test_package --ignore-missing-imports'), failure_ok=True
+    ).thenReturn(('', 0))
+    _mypy._mypy_daemon('-p test_package --ignore-missing-imports')
+    config.MYPY_ARGS.default = 'some --params'
+    when(elib_run).run(_dmypy_cmd('stop'), mute=True, failure_ok=True).thenReturn(('', 0))
+    when(elib_run).run(
+        'mypy -p test_package --ignore-missing-imports some --params', failure_ok=True
+    ).thenReturn(('', 0))
+    _mypy._mypy(daemon=True)
+    verifyStubbedInvocationsAreUsed()
+
+
 def test_mypy_config():
     config.MYPY_ARGS.default = 'some --params'
     when(elib_run).run(
@@ -0,0 +1,85 @@
+# coding=utf-8
+import sys
+from pathlib import Path
+
+import pytest
+from mockito import verify, when
+
+# noinspection PyProtectedMember
+from epab.cmd import _pipenv
+from epab.core import CTX
+
+
+@pytest.fixture(autouse=True, name='site_packages')
+def _site_packages(monkeypatch):
+    site_packages = Path('site-packages').absolute()
+    site_packages.mkdir()
+    Path(site_packages, 'package-1.0.dist-info').mkdir()
+    Path(site_packages, 'module.py').write_text('')
+    monkeypatch.setattr(sys, 'path', ['', str(site_packages), str(Path('missing').absolute())])
+    Path('Pipfile').write_text('[packages]\n')
+    Path('Pipfile.lock').write_text('{}')
+    yield site_packages
+
+
+def _run_twice(func, **kwargs):
+    func(**kwargs)
+    CTX.run_once = {}
+    func(**kwargs)
+    CTX.run_once = {}
+
+
+def test_installed_distributions(site_packages):
+    assert _pipenv._installed_distributions() == [f'{site_packages}/package-1.0.dist-info']
+
+
+@pytest.mark.parametrize(
+    'func, cmd',
+    [
+        (_pipenv._check, 'pipenv check'),
+        (_pipenv._clean, 'pipenv clean'),
+        (_pipenv._update, 'pipenv update --dev'),
+    ]
+)
+def test_skip_unchanged(func, cmd, caplog):
+    when(_pipenv).run(cmd, mute=True, timeout=300)
+    _run_twice(func)
+    verify(_pipenv, times=1).run(...)
+    assert 'did not change, skipping' in caplog.text
+    _run_twice(func, force=True)
+    verify(_pipenv, times=3).run(...)
+
+
+@pytest.mark.parametrize('file_name', ['Pipfile', 'Pipfile.lock'])
+def test_pipfile_changed(file_name):
+    when(_pipenv).run('pipenv check', mute=True, timeout=300)
+    _run_twice(_pipenv._check)
+    Path(file_name).write_text('changed')
+    _run_twice(_pipenv._check)
+    verify(_pipenv, times=2).run(...)
+
+
+def test_distributions_changed(site_packages):
+    when(_pipenv).run('pipenv clean', mute=True, timeout=300)
+    _run_twice(_pipenv._clean)
+    Path(site_packages, 'package-1.0.dist-info').rename(Path(site_packages, 'package-1.1.dist-info'))
+    _run_twice(_pipenv._clean)
+    verify(_pipenv, times=2).run(...)
+
+
+def test_commands_independent():
+    when(_pipenv).run('pipenv check', mute=True, timeout=300)
+    when(_pipenv).run('pipenv clean', mute=True, timeout=300)
+    _pipenv._check()
+    _pipenv._clean()
+    verify(_pipenv, times=2).run(...)
+
+
+def test_failure_not_recorded():
+    when(_pipenv).run('pipenv check', mute=True, timeout=300).thenRaise(SystemExit(1))
+    with pytest.raises(SystemExit):
+        _pipenv._check()
+    CTX.run_once = {}
+    with pytest.raises(SystemExit):
+        _pipenv._check()
+    verify(_pipenv, times=2).run(...)
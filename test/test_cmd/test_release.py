@@ -1,6 +1,7 @@
 # coding=utf-8
 import shutil
 import subprocess
+import sys
 from pathlib import Path
 
 import elib_run
@@ -15,6 +16,7 @@ from epab.cmd import _release
 from epab.core import CTX, config
 
 RELEASE_ARTIFACTS = ['.eggs', 'build', 'package.egg-info']
+BUILD_WHEEL = f'{sys.executable} setup.py bdist_wheel'.replace('\\', '/')
 
 
 def _create_dummy_release_artifacts():
@@ -54,13 +56,23 @@ def test_release_on_master():
 
     expect(ctx).invoke(epab.linters.lint)
     expect(ctx).invoke(epab.cmd.pytest, long=True)
-    expect(elib_run).run(contains('python.exe setup.py bdist_wheel'))
+    expect(elib_run).run(BUILD_WHEEL)
     expect(elib_run).run(f'twine upload dist/* --skip-existing', mute=True)
 
     config.PACKAGE_NAME.default = 'test'
     epab.cmd._release._release(ctx)
 
 
+def test_linters_check_waits_for_tests():
+    ctx = mock()
+    CTX.repo = mock()
+    dependencies = _release._release_pipeline(ctx).dependencies
+    assert 'tests' not in dependencies['linters']
+    assert 'linters' not in dependencies['tests']
+    assert {'linters', 'tests'} <= dependencies['linters_check']
+    assert 'linters_check' in dependencies['tag']
+
+
 def test_dirty_initial_check(caplog):
     ctx = mock()
     repo = mock()
@@ -127,7 +139,7 @@ def test_appveyor(monkeypatch):
 
     expect(elib_run).run(contains('appveyor SetVariable -Name RELEASE_DESCRIPTION -Value')),
     expect(elib_run).run('appveyor UpdateBuild -Version next_version-0001-ABCDEF')
-    expect(elib_run).run(contains('python.exe setup.py bdist_wheel'))
+    expect(elib_run).run(BUILD_WHEEL)
     expect(elib_run).run('appveyor SetVariable -Name EPAB_VERSION -Value next_version')
     expect(subprocess, atleast=1).call(...)
 
@@ -161,7 +173,7 @@ def test_appveyor_artifacts(monkeypatch):
 
     expect(elib_run).run('appveyor UpdateBuild -Version next_version-0001-ABCDEF')
     expect(elib_run).run(contains('appveyor SetVariable -Name RELEASE_DESCRIPTION -Value'))
-    expect(elib_run).run(contains('python.exe setup.py bdist_wheel'))
+    expect(elib_run).run(BUILD_WHEEL)
     expect(elib_run).run('appveyor SetVariable -Name EPAB_VERSION -Value next_version')
     expect(subprocess, atleast=1).call(...)
     expect(shutil, times=3).copy(...)
@@ -184,7 +196,7 @@ def test_appveyor_no_artifacts(monkeypatch):
 
     expect(elib_run).run(contains('appveyor SetVariable -Name RELEASE_DESCRIPTION -Value ')),
     expect(elib_run).run('appveyor UpdateBuild -Version next_version-0001-ABCDEF')
-    expect(elib_run).run(contains('python.exe setup.py bdist_wheel'))
+    expect(elib_run).run(BUILD_WHEEL)
     expect(elib_run).run('appveyor SetVariable -Name EPAB_VERSION -Value next_version')
     expect(shutil, times=0).copy(...)
     expect(subprocess, atleast=1).call(...)
@@ -1,8 +1,11 @@
 # coding=utf-8
 
+import hashlib
+import json
+import os
+import stat
 from pathlib import Path
 
-import elib_run
 import pytest
 from mockito import mock, verify, when
 
@@ -19,90 +22,126 @@ def _all():
     yield repo
 
 
-def test_empty_requirements():
+def _write_lock(default=None, develop=None):
+    lock = {'_meta': {'hash': {'sha256': 'hash'}}, 'default': default or {}, 'develop': develop or {}}
+    Path('Pipfile.lock').write_text(json.dumps(lock))
+
+
+@pytest.fixture(name='pipenv_lock')
+def _pipenv_lock():
+    when(epab.utils).run('pipenv lock', mute=True, filters='Courtesy Notice: ').thenReturn(('', 0))
+
+
+def _lines(file_path):
+    return Path(file_path).read_text().splitlines()[1:]
+
+
+def test_empty_requirements(pipenv_lock):
     reqs = Path('requirements.txt')
     reqs_dev = Path('requirements-dev.txt')
     assert not reqs.exists()
     assert not reqs_dev.exists()
-    when(elib_run).run('pipenv lock -r', mute=True, filters='Courtesy Notice: ').thenReturn(('', 0))
-    when(elib_run).run('pipenv lock -r -d', mute=True, filters='Courtesy Notice: ').thenReturn(('', 0))
+    _write_lock()
     epab.cmd._reqs._write_reqs(False, False)
     assert reqs.exists()
     assert reqs_dev.exists()
-    assert not reqs.read_text()
-    assert not reqs_dev.read_text()
+    assert not _lines(reqs)
+    assert not _lines(reqs_dev)
 
 
-def test_requirements_no_dev_packages():
-    reqs = Path('requirements.txt')
-    reqs_dev = Path('requirements-dev.txt')
-    when(elib_run).run('pipenv lock -r', mute=True, filters='Courtesy Notice: ').thenReturn(('reqs==0.1.0', 0))
-    when(elib_run).run('pipenv lock -r -d', mute=True, filters='Courtesy Notice: ').thenReturn(('', 0))
+def test_requirements_no_dev_packages(pipenv_lock):
+    _write_lock(default={'reqs': {'version': '==0.1.0', 'hashes': ['sha256:hash']}})
     epab.cmd._reqs._write_reqs(False, False)
-    assert reqs.exists()
-    assert reqs_dev.exists()
-    assert reqs.read_text() == 'reqs==0.1.0'
-    assert not reqs_dev.read_text()
+    assert _lines('requirements.txt') == ['reqs==0.1.0']
+    assert not _lines('requirements-dev.txt')
+
+
+def test_requirements_with_dev_packages(pipenv_lock):
+    _write_lock(
+        default={
+            'reqs': {'version': '==0.1.0'},
+            'Other': {'version': '==1.0', 'markers': "sys_platform == 'win32'", 'extras': ['b', 'a']},
+            'editable': {'editable': True, 'path': '.'},
+            'git_package': {'git': 'https://github.com/some/repo.git', 'ref': 'sha'},
+        },
+        develop={'reqs': {'version': '==0.1.1'}},
+    )
+    epab.cmd._reqs._write_reqs(False, False)
+    assert _lines('requirements.txt') == ["Other[a,b]==1.0; sys_platform == 'win32'", 'reqs==0.1.0']
+    assert _lines('requirements-dev.txt') == ['reqs==0.1.1']
 
 
-def test_requirements_with_dev_packages():
-    reqs = Path('requirements.txt')
-    reqs_dev = Path('requirements-dev.txt')
-    when(elib_run).run('pipenv lock -r', mute=True, filters='Courtesy Notice: ') \
-        .thenReturn(('bad line\nreqs==0.1.0', 0))
-    when(elib_run).run('pipenv lock -r -d', mute=True, filters='Courtesy Notice: ') \
-        .thenReturn(('bad line\nreqs==0.1.1', 0))
+def test_requirements_header(pipenv_lock):
+    _write_lock(default={'reqs': {'version': '==0.1.0'}})
+    lock_hash = hashlib.sha256(Path('Pipfile.lock').read_bytes()).hexdigest()
     epab.cmd._reqs._write_reqs(False, False)
-    assert reqs.exists()
-    assert reqs_dev.exists()
-    assert reqs.read_text() == 'reqs==0.1.0'
-    assert reqs_dev.read_text() == 'reqs==0.1.1'
+    for file_path in ('requirements.txt', 'requirements-dev.txt'):
+        assert Path(file_path).read_text().splitlines()[0] == f'# generated from Pipfile.lock (sha256: {lock_hash})'
+
+
+def test_requirements_unchanged_lock(pipenv_lock, repo, caplog):
+    _write_lock(default={'reqs': {'version': '==0.1.0'}})
+    epab.cmd._reqs._write_reqs(False, False)
+    CTX.run_once = {}
+    when(epab.utils).write_atomic(...)
+    epab.cmd._reqs._write_reqs(amend=True)
+    assert 'requirements are up-to-date' in caplog.text
+    verify(epab.utils, times=0).write_atomic(...)
+    verify(repo, times=0).amend_commit(...)
+
+
+def test_requirements_changed_lock(pipenv_lock):
+    _write_lock(default={'reqs': {'version': '==0.1.0'}})
+    epab.cmd._reqs._write_reqs(False, False)
+    CTX.run_once = {}
+    _write_lock(default={'reqs': {'version': '==0.2.0'}})
+    epab.cmd._reqs._write_reqs(False, False)
+    assert _lines('requirements.txt') == ['reqs==0.2.0']
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='no POSIX file modes on Windows')
+def test_requirements_keep_file_mode(pipenv_lock):
+    for file_path in ('requirements.txt', 'requirements-dev.txt'):
+        Path(file_path).write_text('')
+        os.chmod(file_path, 0o644)
+    _write_lock(default={'reqs': {'version': '==0.1.0'}})
+    epab.cmd._reqs._write_reqs(False, False)
+    for file_path in ('requirements.txt', 'requirements-dev.txt'):
+        assert stat.S_IMODE(os.stat(file_path).st_mode) == 0o644
 
 
-# @pytest.mark.long
-def test_requirements_run_invocation():
-    when(elib_run).run('pipenv lock -r', mute=True, filters='Courtesy Notice: ').thenReturn(('reqs', 0))
-    when(elib_run).run('pipenv lock -r -d', mute=True, filters='Courtesy Notice: ').thenReturn(('reqs', 0))
-    epab.cmd._reqs._write_reqs()
+def test_requirements_lock_not_found(pipenv_lock):
+    with pytest.raises(SystemExit):
+        epab.cmd._reqs._write_reqs(False, False)
 
 
-def test_requirements_output(caplog):
+def test_requirements_output(pipenv_lock, caplog):
     caplog.set_level(10)
-    when(Path).write_text(...)
-    when(elib_run).run(...).thenReturn(('', 0))
+    _write_lock()
     _reqs._write_reqs()
     assert 'running: _write_reqs' in caplog.text
     assert 'writing requirements' in caplog.text
     assert 'writing: requirements.txt' in caplog.text
     assert 'writing: requirements-dev.txt' in caplog.text
-    verify(Path, times=2).write_text(...)
-    verify(elib_run, times=2).run(...)
+    verify(epab.utils, times=1).run(...)
 
 
-def test_straight_commit(repo):
+def test_straight_commit(pipenv_lock, repo):
     files_to_add = ['Pipfile', 'requirements.txt', 'requirements-dev.txt']
-    when(Path).write_text(...)
-    when(elib_run).run(...).thenReturn(('', 0))
+    _write_lock()
     epab.cmd._reqs._write_reqs(amend=True)
     verify(repo).amend_commit(append_to_msg='update requirements [auto]', files_to_add=files_to_add)
-    verify(Path, times=2).write_text(...)
-    verify(elib_run, times=2).run(...)
 
 
-def test_commit_amend(repo):
+def test_commit_amend(pipenv_lock, repo):
     files_to_add = ['Pipfile', 'requirements.txt', 'requirements-dev.txt']
-    when(Path).write_text(...)
-    when(elib_run).run(...).thenReturn(('', 0))
+    _write_lock()
     epab.cmd._reqs._write_reqs(stage=True)
     verify(repo).stage_subset(*files_to_add)
-    verify(Path, times=2).write_text(...)
-    verify(elib_run, times=2).run(...)
 
 
-def test_flags_exclusion(repo):
-    when(Path).write_text(...)
-    when(elib_run).run(...).thenReturn(('', 0))
+def test_flags_exclusion(pipenv_lock, repo):
+    _write_lock()
     epab.cmd._reqs._write_reqs(amend=True, stage=True)
     verify(repo).amend_commit(...)
-    verify(Path, times=2).write_text(...)
-    verify(elib_run, times=2).run(...)
+    verify(repo, times=0).stage_subset(...)
@@ -6,12 +6,13 @@ import subprocess
 import webbrowser
 from pathlib import Path
 
-import elib_run
 import pytest
-from mockito import verifyStubbedInvocationsAreUsed, when
+from mockito import unstub, verifyStubbedInvocationsAreUsed, when
 
+import epab.utils
 from epab._logging import _setup_logging
-from epab.cmd._pytest import _Coverage, _pytest, pytest_options
+from epab.cmd import _pytest as pytest_module
+from epab.cmd._pytest import _Coverage, _pytest, command_plan, pytest_options
 from epab.core import CTX, config
 
 DEFAULT_OPTS = dict(
@@ -27,30 +28,59 @@ _TIMEOUT = config.TEST_PYTEST_TIMEOUT()
 
 
 def test_environ():
-    when(elib_run).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT)
+    when(epab.utils).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT)
     _pytest('test', **DEFAULT_OPTS)
     assert os.environ.get('PYTEST_QT_API') == 'pyqt5'
     verifyStubbedInvocationsAreUsed()
 
 
+def test_no_test_contexts():
+    when(epab.utils).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT)
+    _pytest('test', **DEFAULT_OPTS)
+    assert '--cov-context' not in pytest_options()
+    assert epab.utils.ImpactMap().green_sha is None
+
+
 def test_coverage_config_creation():
-    when(elib_run).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT)
-    when(_Coverage).remove_config_file()
+    when(epab.utils).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT)
     _pytest('test', **DEFAULT_OPTS)
-    assert pathlib.Path('.coveragerc').exists()
+    assert pathlib.Path(_Coverage.config_file()).exists()
+    assert '--cov-config .epab_cache/pytest/coveragerc' in pytest_options()
+    assert not pathlib.Path('.coveragerc').exists()
     verifyStubbedInvocationsAreUsed()
 
 
-def test_coverage_config_removal_despite_error():
+def test_coverage_config_outside_working_tree_despite_error():
     with pytest.raises(RuntimeError):
-        when(elib_run).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT).thenRaise(RuntimeError('test'))
+        when(epab.utils).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT).thenRaise(RuntimeError('test'))
         _pytest('test', **DEFAULT_OPTS)
     assert not pathlib.Path('.coveragerc').exists()
     verifyStubbedInvocationsAreUsed()
 
 
+def test_command_plan_cached():
+    Path('pyproject.toml').write_text('[tool.epab]\n')
+    plan = command_plan()
+    assert plan == (pytest_options(), _TIMEOUT)
+    when(pytest_module)._build_command(...)
+    when(_Coverage).install()
+    assert command_plan() == plan
+    unstub()
+    config.TEST_RUNNER_OPTIONS.default = '-s'
+    assert command_plan() == plan
+    Path('pyproject.toml').write_text('[tool.epab]\n[tool.epab.test]\nrunner_options = "-s"\n')
+    assert command_plan() == (f'-s {pytest_options()}', _TIMEOUT)
+
+
+def test_command_plan_missing_coverage_config():
+    plan = command_plan()
+    Path(_Coverage.config_file()).unlink()
+    assert command_plan() == plan
+    assert Path(_Coverage.config_file()).exists()
+
+
 def test_cmd():
-    when(elib_run).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT)
+    when(epab.utils).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT)
     _pytest('test', **DEFAULT_OPTS)
     verifyStubbedInvocationsAreUsed()
 
@@ -62,9 +92,9 @@ def test_cmd_with_coverage(monkeypatch, caplog):
     monkeypatch.setenv('CODACY_PROJECT_TOKEN', 'test')
     Path('coverage.xml').touch()
     when(subprocess).call(...)
-    when(elib_run).run(f'pytest test --vcr-record=none --long {pytest_options()}', timeout=_TIMEOUT)
-    when(elib_run).run('pip install --upgrade codacy-coverage')
-    when(elib_run).run('python-codacy-coverage -r coverage.xml')
+    when(epab.utils).run(f'pytest test --vcr-record=none --long {pytest_options()}', timeout=_TIMEOUT)
+    when(epab.utils).run('pip install --upgrade codacy-coverage')
+    when(epab.utils).run('python-codacy-coverage -r coverage.xml')
     _pytest('test', **DEFAULT_OPTS)
     assert 'uploading coverage to Codacy' in caplog.text
     assert 'codacy coverage OK' in caplog.text
@@ -75,7 +105,7 @@ def test_cmd_with_coverage_no_xml(monkeypatch, caplog):
     CTX.appveyor = True
     monkeypatch.setenv('SCRUT_TOK', 'test')
     when(subprocess).call(...)
-    when(elib_run).run(f'pytest test --vcr-record=none --long {pytest_options()}', timeout=_TIMEOUT)
+    when(epab.utils).run(f'pytest test --vcr-record=none --long {pytest_options()}', timeout=_TIMEOUT)
     _pytest('test', **DEFAULT_OPTS)
     assert 'coverage.xml not found, skipping codacy coverage' in caplog.text
 
@@ -83,7 +113,7 @@ def test_cmd_with_coverage_no_xml(monkeypatch, caplog):
 def test_long():
     opts = dict(**DEFAULT_OPTS)
     opts.update({'long': True})
-    when(elib_run).run(f'pytest test {pytest_options()} --long', timeout=_TIMEOUT)
+    when(epab.utils).run(f'pytest test {pytest_options()} --long', timeout=_TIMEOUT)
     _pytest('test', **opts)
     verifyStubbedInvocationsAreUsed()
 
@@ -93,7 +123,7 @@ def test_show():
     opts.update({'show': True})
     cov_file = pathlib.Path('./htmlcov/index.html').absolute()
     when(webbrowser).open(f'file://{cov_file}')
-    when(elib_run).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT)
+    when(epab.utils).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT)
     _pytest('test', **opts)
     verifyStubbedInvocationsAreUsed()
 
@@ -101,7 +131,7 @@ def test_show():
 def test_config_exit_first():
     opts = dict(**DEFAULT_OPTS)
     opts.update({'exitfirst': True})
-    when(elib_run).run(f'pytest test {pytest_options()} --exitfirst', timeout=_TIMEOUT)
+    when(epab.utils).run(f'pytest test {pytest_options()} --exitfirst', timeout=_TIMEOUT)
     _pytest('test', **opts)
     verifyStubbedInvocationsAreUsed()
 
@@ -109,7 +139,7 @@ def test_config_exit_first():
 def test_config_last_failed():
     opts = dict(**DEFAULT_OPTS)
     opts.update({'last_failed': True})
-    when(elib_run).run(f'pytest test {pytest_options()} --last-failed', timeout=_TIMEOUT)
+    when(epab.utils).run(f'pytest test {pytest_options()} --last-failed', timeout=_TIMEOUT)
     _pytest('test', **opts)
     verifyStubbedInvocationsAreUsed()
 
@@ -117,14 +147,14 @@ def test_config_last_failed():
 def test_config_failed_first():
     opts = dict(**DEFAULT_OPTS)
     opts.update({'failed_first': True})
-    when(elib_run).run(f'pytest test {pytest_options()} --failed-first', timeout=_TIMEOUT)
+    when(epab.utils).run(f'pytest test {pytest_options()} --failed-first', timeout=_TIMEOUT)
     _pytest('test', **opts)
     verifyStubbedInvocationsAreUsed()
 
 
 def test_output(capsys, caplog):
     caplog.set_level(10)
-    when(elib_run).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT)
+    when(epab.utils).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT)
     _pytest('test', **DEFAULT_OPTS)
     out, err = capsys.readouterr()
     assert 'running: _pytest' in caplog.text
@@ -137,7 +167,7 @@ def test_output(capsys, caplog):
 def test_output_on_appveyor(caplog):
     CTX.appveyor = True
     when(subprocess).call(...)
-    when(elib_run, strict=False).run(f'pytest test --vcr-record=none --long {pytest_options()}', timeout=_TIMEOUT)
+    when(epab.utils, strict=False).run(f'pytest test --vcr-record=none --long {pytest_options()}', timeout=_TIMEOUT)
     _pytest('test', **DEFAULT_OPTS)
     assert 'running: _pytest' in caplog.text
     assert 'running test suite' in caplog.text
@@ -146,12 +176,12 @@ def test_output_on_appveyor(caplog):
 
 def test_config_show():
     config.TEST_RUNNER_OPTIONS.default = '-s'
-    when(elib_run).run(f'pytest test -s {pytest_options()}', timeout=_TIMEOUT)
+    when(epab.utils).run(f'pytest test -s {pytest_options()}', timeout=_TIMEOUT)
     _pytest('test', **DEFAULT_OPTS)
 
 
 def test_config_appveyor(monkeypatch):
-    when(elib_run).run(...)
+    when(epab.utils).run(...)
     _pytest('test', **DEFAULT_OPTS)
     monkeypatch.setenv('APPVEYOR', 'test')
     CTX.run_once = {}
@@ -160,7 +190,7 @@ def test_config_appveyor(monkeypatch):
 
 def test_remove_coverage_dir_disabled():
     CTX.appveyor = False
-    when(elib_run).run(...)
+    when(epab.utils).run(...)
     cov_dir = Path('./htmlcov')
     assert not cov_dir.exists()
     cov_dir.mkdir()
@@ -170,7 +200,7 @@ def test_remove_coverage_dir_disabled():
 
 def test_remove_coverage():
     CTX.appveyor = False
-    when(elib_run).run(...)
+    when(epab.utils).run(...)
     cov_dir = Path('./htmlcov')
     assert not cov_dir.exists()
     cov_dir.mkdir()
@@ -179,3 +209,107 @@ def test_remove_coverage():
     new_opts.update({'rm_cov': True})
     _pytest('test', **new_opts)
     assert not cov_dir.exists()
+
+
+def _create_test_modules(*names):
+    Path('test').mkdir()
+    for name in names:
+        Path('test', name).write_text('')
+
+
+def _fake_run(calls, failing_shard=None):
+    def _run(cmd, *_, mute=False, failure_ok=False, **__):
+        calls.append(cmd)
+        if failing_shard is not None and f'coveragerc.{failing_shard}' in cmd:
+            assert mute and failure_ok
+            return 'shard failed', 1
+        return 'output', 0
+
+    return _run
+
+
+def test_split_tests():
+    epab.utils.DurationStore().record('sha', {
+        'test/test_a.py::test': 4.0, 'test/test_b.py::test_1': 2.0, 'test/test_b.py::test_2': 1.0,
+        'test/test_c.py::test': 1.0,
+    })
+    shards = pytest_module.split_tests(['test/test_a.py', 'test/test_b.py', 'test/test_c.py', 'test/test_d.py'], 2)
+    # test_d.py never ran: it weighs the average of the others
+    assert shards == [
+        (['test/test_a.py', 'test/test_c.py'], 5.0),
+        (['test/test_b.py', 'test/test_d.py'], pytest.approx(3.0 + 8.0 / 3)),
+    ]
+    assert pytest_module.split_tests(['test/test_b.py::test_1', 'test/test_b.py::test_2'], 2) == [
+        (['test/test_b.py::test_1', 'test/test_b.py::test_2'], 3.0)
+    ]
+
+
+def test_workers(monkeypatch, caplog):
+    _create_test_modules('test_a.py', 'test_b.py', 'test_c.py', 'conftest.py')
+    calls = []
+    monkeypatch.setattr(epab.utils, 'run', _fake_run(calls))
+    _pytest('test', workers=2, **DEFAULT_OPTS)
+    shard_commands = sorted(cmd for cmd in calls if cmd.startswith('pytest'))
+    assert shard_commands == [
+        f'pytest test/test_a.py test/test_c.py {pytest_options(0)}',
+        f'pytest test/test_b.py {pytest_options(1)}',
+    ]
+    assert '--cov-report= ' in shard_commands[0]
+    assert 'data_file = .epab_cache/pytest/shards/.coverage.1' in Path(_Coverage.config_file(1)).read_text()
+    assert 'no coverage data found for the shards' in caplog.text
+    assert 'shard 0: 2 targets' in caplog.text
+    assert 'shard 1: 1 targets' in caplog.text
+
+
+def test_workers_combine_coverage(monkeypatch):
+    _create_test_modules('test_a.py', 'test_b.py')
+    calls = []
+    monkeypatch.setattr(epab.utils, 'run', _fake_run(calls))
+
+    def _run_shard(cmd, _):
+        index = 0 if 'coveragerc.0' in cmd else 1
+        Path(_Coverage.data_file(index)).write_text('')
+        return 'output', 0, 0.1
+
+    monkeypatch.setattr(pytest_module, '_run_shard', _run_shard)
+    _pytest('test', workers=2, **DEFAULT_OPTS)
+    rcfile = _Coverage.config_file()
+    assert calls[-3:] == [
+        f'coverage combine --rcfile={rcfile} {_Coverage.data_file(0)} {_Coverage.data_file(1)}',
+        f'coverage xml --rcfile={rcfile}',
+        f'coverage html --rcfile={rcfile}',
+    ]
+
+
+def test_workers_failure(monkeypatch, caplog):
+    _create_test_modules('test_a.py', 'test_b.py')
+    calls = []
+    monkeypatch.setattr(epab.utils, 'run', _fake_run(calls, failing_shard=1))
+    with pytest.raises(SystemExit) as exc_info:
+        _pytest('test', workers=2, **DEFAULT_OPTS)
+    assert exc_info.value.code == 1
+    assert 'shard 1: 1 targets' in caplog.text
+    assert 'failed' in caplog.text
+    assert epab.utils.ImpactMap().green_sha is None
+
+
+def test_workers_single_file(monkeypatch, caplog):
+    _create_test_modules('test_a.py')
+    when(epab.utils).run(f'pytest test/test_a.py {pytest_options()}', timeout=_TIMEOUT)
+    _pytest('test/test_a.py', workers=2, **DEFAULT_OPTS)
+    assert 'running a single pytest process' in caplog.text
+
+
+def test_durations_recorded():
+    _create_test_modules('test_a.py')
+    when(epab.utils).run(f'pytest test {pytest_options()}', timeout=_TIMEOUT)
+    Path(pytest_module._junit_file()).parent.mkdir(parents=True)
+    Path(pytest_module._junit_file()).write_text(
+        '<testsuite><testcase classname="test.test_a" file="test/test_a.py" name="test" time="2"/></testsuite>'
+    )
+    _pytest('test', **DEFAULT_OPTS)
+    assert epab.utils.DurationStore().runs == [(None, {'test/test_a.py::test': 2.0})]
+    assert not Path(pytest_module._junit_file()).exists()
+    CTX.run_once = {}
+    _pytest('test', **DEFAULT_OPTS)
+    assert len(epab.utils.DurationStore().runs) == 1
@@ -0,0 +1,54 @@
+# coding=utf-8
+
+import pytest
+from click.testing import CliRunner
+
+import epab.utils
+# noinspection PyProtectedMember
+from epab.cmd import _test_stats as test_stats_module
+
+
+def _record_runs():
+    store = epab.utils.DurationStore()
+    for index in range(10):
+        store.record(f'sha{index}', {
+            'test/test_a.py::test_stable': 1.0,
+            'test/test_a.py::test_slower': 1.5 if index >= 5 else 1.0,
+        })
+
+
+def test_no_history(caplog):
+    test_stats_module._test_stats(5, 20, 0.1, check=True)
+    assert '0 test runs recorded' in caplog.text
+    assert 'no test became more than 20% slower over the last 5 runs' in caplog.text
+
+
+def test_regression(caplog):
+    _record_runs()
+    test_stats_module._test_stats(5, 20, 0.1, check=False)
+    assert '10 test runs recorded' in caplog.text
+    assert '1 tests became more than 20% slower over the last 5 runs' in caplog.text
+    assert 'test/test_a.py::test_slower: 1.000s -> 1.500s (+50%)' in caplog.text
+    assert 'test_stable' not in caplog.text
+
+
+def test_regression_check():
+    _record_runs()
+    with pytest.raises(SystemExit):
+        test_stats_module._test_stats(5, 20, 0.1, check=True)
+    test_stats_module._test_stats(5, 60, 0.1, check=True)
+
+
+def test_command():
+    _record_runs()
+    result = CliRunner().invoke(test_stats_module.test_stats, ['--runs', '5', '--check'])
+    assert result.exit_code == 1
+    result = CliRunner().invoke(test_stats_module.test_stats, ['--threshold', '60', '--check'])
+    assert result.exit_code == 0
+
+
+@pytest.mark.parametrize('args', [['--runs', '0'], ['--threshold', '-1'], ['--min-duration', '-0.5']])
+def test_command_invalid_options(args):
+    result = CliRunner().invoke(test_stats_module.test_stats, args)
+    assert result.exit_code == 2
+    assert 'Invalid value' in result.output
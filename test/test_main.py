@@ -1,14 +1,17 @@
 # coding=utf-8
 
+import os
 import traceback
+from pathlib import Path
 
+import elib_config
 import pytest
 from click.testing import CliRunner, Result
 from mockito import expect, mock, unstub, verify, when
 
 import epab.utils
 from epab import __version__
-from epab.__main__ import cli
+from epab.__main__ import _pre_push_pipeline, cli
 # noinspection PyProtectedMember
 from epab.cmd import _chglog, _install_hooks, _pytest, _release, _reqs
 from epab.core import CTX, config
@@ -16,6 +19,12 @@ from epab.core import CTX, config
 from epab.linters import _bandit, _dead_fixtures, _lint, _mypy, _pylint, _safety
 
 
+@pytest.fixture(autouse=True)
+def _config_file():
+    # The config is validated when a subcommand runs
+    Path('pyproject.toml').write_text('[tool.epab]\npackage_name = "test_package"\n')
+
+
 def _succesfull_run(result):
     assert isinstance(result, Result)
     if result.exc_info:
@@ -47,6 +56,8 @@ def test_version(param):
     verify(repo, times=0).ensure()
     assert result.exit_code == 0
     assert not result.exception
+    assert not Path('.epab_cache').exists()
+    assert not Path('pyproject.toml.example').exists()
 
 
 @pytest.mark.parametrize('param', ['-nv', '--next-version'])
@@ -98,6 +109,15 @@ def test_no_stash():
     assert not CTX.stash
 
 
+
+@pytest.mark.parametrize('stash', [True, False])
+def test_pre_push_reqs_stage(stash):
+    CTX.stash = stash
+    dependencies = _pre_push_pipeline(mock(), push=False).dependencies
+    # Requirements are written on a stashed working tree: the tests must not run at the same time
+    assert ({'lint', 'pytest'} <= dependencies['reqs']) is stash
+
+
 # def test_pep8():
 #     repo = mock()
 #     when(repo).ensure()
@@ -255,5 +275,55 @@ def test_dead_fixtures():
 
 
 def test_setup_config():
+    Path('pyproject.toml').unlink()
     with pytest.raises(FileNotFoundError):
         config.setup_config('0.0.1')
+
+
+def test_setup_config_fingerprint():
+    Path('pyproject.toml').write_text('[tool.epab]\npackage_name = "test"\n')
+    expect(elib_config, times=2).validate_config()
+    config.setup_config('0.0.1')
+    assert Path('pyproject.toml.example').exists()
+    config.setup_config('0.0.1')
+    config.setup_config('0.0.2')
+
+
+def test_setup_config_fingerprint_config_changed():
+    Path('pyproject.toml').write_text('[tool.epab]\npackage_name = "test"\n')
+    expect(elib_config, times=3).validate_config()
+    config.setup_config('0.0.1')
+    Path('pyproject.toml').write_text('[tool.epab]\npackage_name = "other"\n')
+    config.setup_config('0.0.1')
+    Path('pyproject.toml.example').unlink()
+    config.setup_config('0.0.1')
+    assert Path('pyproject.toml.example').exists()
+
+
+def test_setup_config_fingerprint_path_changed():
+    Path('pyproject.toml').write_text('[tool.epab]\npackage_name = "test"\n')
+    config.setup_config('0.0.1')
+    Path('CHANGELOG.md').mkdir()
+    with pytest.raises(elib_config.NotAFileError):
+        config.setup_config('0.0.1')
+    Path('CHANGELOG.md').rmdir()
+    Path('doc').write_text('')
+    with pytest.raises(elib_config.NotAFolderError):
+        config.setup_config('0.0.1')
+
+
+def test_config_snapshot():
+    Path('pyproject.toml').write_text('[tool.epab]\npackage_name = "test"\n[tool.epab.appveyor]\nartifacts = ["a"]\n')
+    config.setup_config('0.0.1')
+    snapshot = config.config_snapshot()
+    assert config.config_snapshot() is snapshot
+    with pytest.raises(AttributeError):
+        snapshot.some_attribute = 'value'
+    artifacts = config.ARTIFACTS()
+    artifacts.append('b')
+    assert config.ARTIFACTS() == ['a']
+    Path('pyproject.toml').write_text('[tool.epab]\npackage_name = "other"\n')
+    os.utime('pyproject.toml', ns=(0, 0))
+    assert config.config_snapshot() is not snapshot
+    assert config.PACKAGE_NAME() == 'other'
+    assert config.ARTIFACTS() == []
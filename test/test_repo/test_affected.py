@@ -0,0 +1,113 @@
+# coding=utf-8
+import subprocess
+from pathlib import Path
+
+import pytest
+from mockito import verifyStubbedInvocationsAreUsed, when
+
+import epab.utils
+from epab.cmd._pytest import IMPACT_OPTIONS, _pytest, affected_tests, command_plan
+from epab.core import CTX
+from test.test_utils.test_test_impact import write_coverage_data
+
+OPTS = dict(long=False, show=False, exitfirst=False, last_failed=False, failed_first=False, rm_cov=False)
+
+
+@pytest.fixture(name='green_repo')
+def _green_repo(repo):
+    for path in ('package/__init__.py', 'package/module.py', 'package/other.py',
+                 'test/test_module.py', 'test/test_other.py', 'README.md'):
+        Path(path).parent.mkdir(exist_ok=True)
+        Path(path).write_text('')
+    repo.commit('init', files_to_add=['package', 'test', 'README.md'])
+    CTX.repo = repo
+    impact_map = epab.utils.ImpactMap()
+    impact_map.update({
+        'package/module.py': {'test/test_module.py::test_module'},
+        'package/other.py': {'test/test_other.py::test_other[1]', 'test/test_module.py::test_both'},
+        'README.md': set(),
+    })
+    impact_map.green_sha = repo.get_sha()
+    impact_map.save()
+    yield repo
+
+
+def test_no_green_run(repo):
+    CTX.repo = repo
+    assert affected_tests('test') is None
+
+
+def test_unknown_green_run(green_repo):
+    impact_map = epab.utils.ImpactMap()
+    impact_map.green_sha = '0' * 40
+    impact_map.save()
+    assert affected_tests('test') is None
+
+
+def test_nothing_changed(green_repo):
+    assert affected_tests('test') == []
+
+
+def test_source_changed(green_repo):
+    Path('package/other.py').write_text('changed')
+    assert affected_tests('test') == ['test/test_module.py::test_both', 'test/test_other.py::test_other[1]']
+
+
+def test_changes_committed_since_green_run(green_repo):
+    Path('package/module.py').write_text('changed')
+    green_repo.commit('change', files_to_add=['package/module.py'])
+    assert affected_tests('test') == ['test/test_module.py::test_module']
+
+
+def test_test_module_changed(green_repo):
+    Path('package/other.py').write_text('changed')
+    Path('test/test_module.py').write_text('changed')
+    assert affected_tests('test') == ['test/test_module.py', 'test/test_other.py::test_other[1]']
+
+
+def test_other_files_ignored(green_repo):
+    Path('README.md').write_text('changed')
+    Path('docs.txt').write_text('new')
+    assert affected_tests('test') == []
+
+
+@pytest.mark.parametrize('path', ('test/conftest.py', 'test/data.json', 'pyproject.toml', 'package/new.py'))
+def test_full_run(green_repo, path):
+    Path(path).write_text('')
+    assert affected_tests('test') is None
+
+
+def test_run_affected(green_repo):
+    Path('package/other.py').write_text('changed')
+    args, timeout = command_plan()
+    when(epab.utils).run(
+        f"pytest test/test_module.py::test_both 'test/test_other.py::test_other[1]' {args}{IMPACT_OPTIONS}",
+        timeout=timeout
+    ).thenAnswer(lambda *_, **__: write_coverage_data({
+        'package/other.py': ['test/test_module.py::test_both|run'],
+        'package/module.py': ['test/test_other.py::test_other[1]|run'],
+    }))
+    _pytest('test', affected=True, **OPTS)
+    verifyStubbedInvocationsAreUsed()
+    impact_map = epab.utils.ImpactMap()
+    assert impact_map.tests_for('package/other.py') == {'test/test_module.py::test_both'}
+    assert impact_map.tests_for('package/module.py') == {
+        'test/test_module.py::test_module', 'test/test_other.py::test_other[1]'
+    }
+    assert impact_map.green_sha == green_repo.get_sha()
+
+
+def test_run_nothing_affected(green_repo, caplog):
+    _pytest('test', affected=True, **OPTS)
+    assert 'no test affected by the changes' in caplog.text
+
+
+def test_failed_run_keeps_green_sha(green_repo):
+    green_sha = green_repo.get_sha()
+    Path('package/other.py').write_text('changed')
+    green_repo.commit('change', files_to_add=['package/other.py'])
+    when(epab.utils).run(...).thenRaise(SystemExit(1))
+    with pytest.raises(SystemExit):
+        _pytest('test', affected=True, **OPTS)
+    assert epab.utils.ImpactMap().green_sha == green_sha
+    assert subprocess.check_output(('git', 'rev-parse', 'HEAD')).decode().strip() != green_sha
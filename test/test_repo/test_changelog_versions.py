@@ -0,0 +1,258 @@
+# coding=utf-8
+import random
+import re
+import subprocess
+from pathlib import Path
+
+import pytest
+
+import epab.utils
+# noinspection PyProtectedMember
+from epab.cmd._chglog import _chglog
+from epab.core import CTX
+# noinspection PyProtectedMember
+from epab.utils import _changelog
+
+TAG_FILTER = r'^[0-9]+\.[0-9]+\.[0-9]+\.[0-9]+$'
+
+
+def _fast_import(commits, tags=()):
+    """
+    Creates commits through "git fast-import"
+
+    Args:
+        commits: list of (parent indexes, commit date)
+        tags: list of (tag name, commit index, annotated)
+    """
+    lines = []
+    for index, (parents, date) in enumerate(commits, start=1):
+        if not parents:
+            lines.append('reset refs/heads/master\n')
+        message = f'commit {index}\n\nbody of {index}\n'
+        lines.append(f'commit refs/heads/master\nmark :{index}\n'
+                     f'author a <a@a> {date} +0000\ncommitter a <a@a> {date} +0000\n'
+                     f'data {len(message)}\n{message}\n')
+        for parent_index, parent in enumerate(parents):
+            lines.append(f'{"from" if parent_index == 0 else "merge"} :{parent + 1}\n')
+    for name, commit, annotated in tags:
+        if annotated:
+            lines.append(f'tag {name}\nfrom :{commit + 1}\ntagger a <a@a> {commit} +0000\ndata {len(name)}\n{name}\n')
+        else:
+            lines.append(f'reset refs/tags/{name}\nfrom :{commit + 1}\n')
+    subprocess.run(('git', 'fast-import', '--quiet', '--force'), input=''.join(lines).encode(), check=True)
+    subprocess.check_call(('git', 'reset', '--hard', '-q', 'master'))
+    epab.utils.Repo()._invalidate_refs()
+
+
+def _git(*args):
+    return subprocess.check_output(('git',) + args).decode('utf8')
+
+
+def _git_log(include, *excludes):
+    return _git('log', '--topo-order', '--no-merges', '--format=%H', include, *(f'^{sha}' for sha in excludes)).split()
+
+
+def _git_versions(tag_filter):
+    """
+    Versions the way "gitchangelog" lists them, through "git" commands
+    """
+    tags = [tag for tag in _git('tag').split() if re.match(tag_filter, tag)]
+    tags = sorted(tags, key=lambda tag: int(_git('log', '-1', '--format=%ct', f'{tag}^{{commit}}')))
+    entries = [_git('rev-parse', f'{tag}^{{commit}}').strip() for tag in tags]
+    entries.append(_git('rev-parse', 'HEAD').strip())
+    entries.reverse()
+    head = entries[0]
+    result = []
+    for index, sha in enumerate(entries):
+        include = sha
+        if sha != head and not subprocess.call(('git', 'merge-base', '--is-ancestor', head, sha)):
+            include = head
+        result.append(_git_log(include, *entries[index + 1:]))
+    return result
+
+
+def _versions(repo, next_version=None, since=None):
+    return [
+        [commit.sha for commit in version.commits]
+        for version in repo.changelog_versions(TAG_FILTER, next_version, since)
+    ]
+
+
+def test_no_tag(repo):
+    repo.commit('new: usr: some feature', allow_empty=True)
+    versions = repo.changelog_versions(TAG_FILTER)
+    assert len(versions) == 1
+    assert versions[0].tag is None
+    assert [commit.subject for commit in versions[0].commits] == ['new: usr: some feature', 'init commit']
+    assert _versions(repo) == _git_versions(TAG_FILTER)
+
+
+def test_versions(repo):
+    repo.tag('2018.1.1.1')
+    repo.commit('first change', allow_empty=True)
+    repo.tag('not_a_version')
+    repo.commit('second change', allow_empty=True)
+    subprocess.check_call(('git', 'tag', '-a', '2018.1.2.1', '-m', 'message'))
+    repo.commit('third change', allow_empty=True)
+    repo._invalidate_refs()
+    versions = repo.changelog_versions(TAG_FILTER)
+    assert [version.tag for version in versions] == [None, '2018.1.2.1', '2018.1.1.1']
+    assert [[commit.subject for commit in version.commits] for version in versions] == [
+        ['third change'], ['second change', 'first change'], ['init commit']
+    ]
+    assert _versions(repo) == _git_versions(TAG_FILTER)
+
+
+def test_next_version(repo):
+    repo.tag('2018.1.1.1')
+    repo.commit('change', allow_empty=True)
+    versions = repo.changelog_versions(TAG_FILTER, '2018.1.2.1')
+    assert [version.tag for version in versions] == [None, '2018.1.2.1', '2018.1.1.1']
+    assert not versions[0].commits
+    assert [commit.subject for commit in versions[1].commits] == ['change']
+    assert repo.list_tags() == ['2018.1.1.1']
+    subprocess.check_call(('git', 'tag', '2018.1.2.1'))
+    repo._invalidate_refs()
+    assert _versions(repo) == _git_versions(TAG_FILTER) == _versions(repo, '2018.1.2.1')
+
+
+def test_dates(repo):
+    _fast_import([((), 86400 * 10), ((0,), 86400 * 20)], [('1.1.1.1', 0, False), ('1.1.1.2', 1, True)])
+    versions = epab.utils.Repo().changelog_versions(TAG_FILTER, '1.1.1.3')
+    # Lightweight tags use the author date of the commit, annotated tags the tagger date
+    assert [(version.tag, version.date) for version in versions] == [
+        (None, '1970-01-21'), ('1.1.1.3', '1970-01-21'), ('1.1.1.2', '1970-01-01'), ('1.1.1.1', '1970-01-11')
+    ]
+
+
+@pytest.mark.parametrize(
+    'message',
+    [
+        'subject\n',
+        'subject',
+        'subject\n\nbody\n',
+        '\n\nsubject   \non two lines\n\n\n  body\n\nsecond paragraph\n\n',
+        'subject\n \t\nbody\nSigned-off-by: someone\n',
+    ]
+)
+def test_split_message(repo, message):
+    subprocess.run(('git', 'commit', '--allow-empty', '--cleanup=verbatim', '-F', '-'), input=message.encode(),
+                   check=True, stdout=subprocess.DEVNULL)
+    commit = repo.changelog_versions(TAG_FILTER)[0].commits[0]
+    assert commit.subject == _git('log', '-1', '--pretty=format:%s')
+    assert commit.body == _git('log', '-1', '--pretty=format:%b')
+    assert commit.author == _git('log', '-1', '--pretty=format:%an')
+
+
+def test_other_branch(repo):
+    repo.tag('2018.1.1.1')
+    subprocess.check_call(('git', 'checkout', '-q', '-b', 'other'))
+    repo.commit('on other branch', allow_empty=True)
+    repo.tag('2018.1.2.1')
+    subprocess.check_call(('git', 'checkout', '-q', 'master'))
+    repo.commit('on master', allow_empty=True)
+    repo._invalidate_refs()
+    assert _versions(repo) == _git_versions(TAG_FILTER)
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_random_history(repo, seed):
+    rand = random.Random(seed)
+    commits = [((), 1000)]
+    for index in range(1, 80):
+        parents = (rand.randrange(max(0, index - 10), index),)
+        if rand.random() < 0.3:
+            parents += (rand.randrange(0, index),)
+        if rand.random() < 0.05:
+            parents = ()
+        # Dates are not always increasing, like in real repositories
+        commits.append((tuple(sorted(set(parents), reverse=True)), 1000 + index * 10 + rand.randrange(-30, 30)))
+    tags = [
+        (f'{index}.0.0.{rand.randrange(3)}', index, rand.random() < 0.3)
+        for index in rand.sample(range(80), 12)
+    ]
+    _fast_import(commits, tags)
+    assert _versions(repo) == _git_versions(TAG_FILTER)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_since(repo, seed):
+    rand = random.Random(seed)
+    commits = [((), 1000)]
+    for index in range(1, 60):
+        parents = (rand.randrange(max(0, index - 10), index),)
+        if rand.random() < 0.3:
+            parents += (rand.randrange(0, index),)
+        commits.append((tuple(sorted(set(parents), reverse=True)), 1000 + index * 10 + rand.randrange(-30, 30)))
+    _fast_import(commits, [(f'{index}.0.0.0', index, rand.random() < 0.3) for index in rand.sample(range(60), 8)])
+    versions = repo.changelog_versions(TAG_FILTER)
+    for index, version in enumerate(versions[1:], start=1):
+        assert _versions(repo, since=version.tag) == _versions(repo)[:index]
+
+
+def test_since_unknown(repo):
+    repo.tag('2018.1.1.1')
+    repo.tag('not_a_version')
+    for since in ('2018.1.2.1', 'not_a_version'):
+        with pytest.raises(ValueError):
+            repo.changelog_versions(TAG_FILTER, since=since)
+    with pytest.raises(ValueError):
+        repo.changelog_versions(TAG_FILTER, next_version='2018.1.1.1', since='2018.1.1.1')
+
+
+def test_since_walk_is_limited(repo):
+    count = 2000
+    commits = [((index - 1,) if index else (), 1000 + index) for index in range(count)]
+    _fast_import(commits, [('1.0.0.0', 0, False), ('2.0.0.0', count - 10, True)])
+    _changelog._COMMITS.clear()
+    versions = repo.changelog_versions(TAG_FILTER, since='2.0.0.0')
+    assert [len(version.commits) for version in versions] == [9]
+    # The history older than the tag is not walked (besides a few commits, in case of clock skew)
+    assert len(_changelog._COMMITS) < 30
+    assert [len(version.commits) for version in repo.changelog_versions(TAG_FILTER)] == [9, count - 10, 1]
+
+
+def test_head_behind_tags(repo):
+    commits = [((index - 1,) if index else (), 1000 + index * 10) for index in range(6)]
+    _fast_import(commits, [('1.0.0.0', 1, False), ('2.0.0.0', 3, False), ('3.0.0.0', 5, True)])
+    for ref in ('2.0.0.0', '1.0.0.0^', '3.0.0.0'):
+        subprocess.check_call(('git', 'checkout', '-q', ref))
+        assert _versions(epab.utils.Repo()) == _git_versions(TAG_FILTER)
+    subprocess.check_call(('git', 'checkout', '-q', '1.0.0.0'))
+    expected = _git_versions(TAG_FILTER)
+    assert _versions(epab.utils.Repo(), since='2.0.0.0') == expected[:2]
+    assert _versions(epab.utils.Repo(), since='1.0.0.0') == expected[:3]
+
+
+def test_many_versions(repo, monkeypatch):
+    count = 1500
+    commits = [((index - 1,) if index else (), 1000 + index) for index in range(count)]
+    _fast_import(commits, [(f'{index}.0.0.0', index, False) for index in range(0, count, 5)])
+    lookups = []
+    commit = _changelog._commit
+    monkeypatch.setattr(_changelog, '_commit', lambda batch, sha: lookups.append(sha) or commit(batch, sha))
+    versions = epab.utils.Repo().changelog_versions(TAG_FILTER)
+    assert [len(version.commits) for version in versions] == [4] + [5] * (count // 5 - 1) + [1]
+    # Every commit is looked up a few times, whatever the number of versions
+    assert len(lookups) < 10 * count
+
+
+def test_incremental_update(repo, caplog):
+    CTX.repo = repo
+    repo.commit('new: usr: first feature', allow_empty=True)
+    repo.tag('2018.1.1.1')
+    repo.commit('fix: usr: some bug', allow_empty=True)
+    _chglog()
+    full = Path('CHANGELOG.md').read_text(encoding='utf8')
+    assert full.startswith('# Changelog\n## (unreleased)\n### Fix\n* Some bug. [')
+    for index in range(3):
+        repo.commit(f'chg: usr: change {index}', allow_empty=True)
+        if index == 1:
+            repo.tag('2018.1.2.1')
+        CTX.run_once = {}
+        _chglog(incremental=True, check=True)
+        assert 'incremental changelog update is consistent with a full rebuild' in caplog.text
+        caplog.clear()
+    changelog = Path('CHANGELOG.md').read_text(encoding='utf8')
+    assert changelog.split('\n')[1:3] == ['## (unreleased)', '### Changes']
+    assert '## 2018.1.2.1 (' in changelog
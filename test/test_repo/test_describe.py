@@ -0,0 +1,138 @@
+# coding=utf-8
+import random
+import subprocess
+
+import pytest
+
+import epab.utils
+# noinspection PyProtectedMember
+from epab.utils import _describe
+
+
+def _fast_import(commits, tags=()):
+    """
+    Creates commits through "git fast-import"
+
+    Args:
+        commits: list of (parent indexes, commit date)
+        tags: list of (tag name, commit index, annotated)
+    """
+    lines = []
+    for index, (parents, date) in enumerate(commits, start=1):
+        if not parents:
+            lines.append('reset refs/heads/master\n')
+        lines.append(
+            f'commit refs/heads/master\nmark :{index}\n'
+            f'committer a <a@a> {date} +0000\ndata {len(str(index))}\n{index}\n'
+        )
+        for parent_index, parent in enumerate(parents):
+            lines.append(f'{"from" if parent_index == 0 else "merge"} :{parent + 1}\n')
+    for name, commit, annotated in tags:
+        if annotated:
+            lines.append(f'tag {name}\nfrom :{commit + 1}\ntagger a <a@a> {commit} +0000\ndata {len(name)}\n{name}\n')
+        else:
+            lines.append(f'reset refs/tags/{name}\nfrom :{commit + 1}\n')
+    subprocess.run(('git', 'fast-import', '--quiet', '--force'), input=''.join(lines).encode(), check=True)
+
+
+def _git_describe(sha):
+    result = subprocess.run(
+        ('git', 'describe', '--tags', '--abbrev=0', sha), stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if result.returncode:
+        return None
+    return result.stdout.decode().strip()
+
+
+def _describe_all(repo):
+    refs = repo._refs()
+    for sha in subprocess.check_output(('git', 'rev-list', '--all')).decode().split():
+        assert _describe.describe(repo._batch, refs, sha) == _git_describe(sha), sha
+
+
+def test_no_tag(repo):
+    assert repo.get_latest_tag() is None
+
+
+def test_linear(repo):
+    repo.tag('first')
+    repo.commit('second', allow_empty=True)
+    assert repo.get_latest_tag() == 'first'
+    repo.commit('third', allow_empty=True)
+    repo.tag('third')
+    assert repo.get_latest_tag() == 'third'
+    _describe_all(repo)
+
+
+def test_annotated_preferred(repo):
+    repo.tag('b_lightweight')
+    subprocess.check_call(('git', 'tag', '-a', 'c_annotated', '-m', 'message'))
+    repo.tag('a_lightweight')
+    assert repo.get_latest_tag() == _git_describe('HEAD') == 'c_annotated'
+
+
+def test_lightweight_order(repo):
+    repo.tag('b')
+    repo.tag('a')
+    assert repo.get_latest_tag() == _git_describe('HEAD') == 'a'
+
+
+def test_cache(repo):
+    repo.tag('first')
+    for index in range(5):
+        repo.commit(f'commit {index}', allow_empty=True)
+    assert repo.get_latest_tag() == 'first'
+    epab.utils.Repo().commit('another commit', allow_empty=True)
+    _describe._COMMITS.clear()
+    assert repo.get_latest_tag() == 'first'
+    assert len(_describe._COMMITS) == 1
+    repo.tag('second', overwrite=True)
+    assert repo.get_latest_tag() == 'second'
+
+
+@pytest.mark.parametrize('tag_count', (5, 40))
+@pytest.mark.parametrize('seed', range(5))
+def test_random_history(repo, seed, tag_count):
+    rand = random.Random(seed)
+    commits = [((), 1000)]
+    for index in range(1, 80):
+        parents = (rand.randrange(max(0, index - 10), index),)
+        if rand.random() < 0.3:
+            parents += (rand.randrange(0, index),)
+        if rand.random() < 0.05:
+            parents = ()
+        # Dates are not always increasing, like in real repositories
+        commits.append((tuple(sorted(set(parents), reverse=True)), 1000 + index * 10 + rand.randrange(-30, 30)))
+    tags = [
+        (f'tag_{index}', index, rand.random() < 0.3)
+        for index in rand.sample(range(80), tag_count)
+    ]
+    _fast_import(commits, tags)
+    epab.utils.Repo()._invalidate_refs()
+    _describe_all(repo)
+
+
+# noinspection PyProtectedMember
+def test_benchmark_50k_commits(repo):
+    count = 50000
+    commits = [((index - 1,) if index else (), 1000 + index) for index in range(count)]
+    _fast_import(commits, [('root', 0, False), ('recent', count - 100, False)])
+    subprocess.check_call(('git', 'reset', '--hard', '-q', 'master'))
+    epab.utils.Repo()._invalidate_refs()
+
+    expected = _git_describe('HEAD')
+    _describe._COMMITS.clear()
+    assert repo.get_latest_tag() == expected == 'recent'
+    # Only the commits down to the tag are read
+    assert len(_describe._COMMITS) <= 101
+
+    # The result is cached: no commit is read again
+    _describe._COMMITS.clear()
+    epab.utils.GIT_SPAWNS.reset()
+    assert repo.get_latest_tag() == 'recent'
+    assert not _describe._COMMITS
+    assert 'describe' not in epab.utils.GIT_SPAWNS.counts
+
+    repo.remove_tag('recent')
+    assert repo.get_latest_tag() == _git_describe('HEAD') == 'root'
+    assert len(_describe._COMMITS) == count
@@ -0,0 +1,65 @@
+# coding=utf-8
+import subprocess
+
+import pytest
+
+import epab.utils
+
+
+def test_header(repo):
+    sha = repo.get_sha()
+    assert repo._batch.header('HEAD') == (sha, 'commit', repo._batch.header(sha)[2])
+    assert repo._batch.header('HEAD^{tree}')[1] == 'tree'
+    assert repo._batch.header('unknown') is None
+    with pytest.raises(ValueError):
+        repo._batch.header('HEAD\nHEAD')
+
+
+def test_read(repo):
+    sha, type_, content = repo._batch.read('HEAD')
+    assert sha == repo.get_sha()
+    assert type_ == 'commit'
+    assert content.startswith(b'tree ')
+    assert repo._batch.read('unknown') is None
+    assert repo._batch.read('HEAD')[2] == content
+
+
+def test_single_process(repo):
+    epab.utils.GIT_SPAWNS.reset()
+    for _ in range(10):
+        repo._batch.header('HEAD')
+        repo._batch.read('HEAD')
+        repo.last_commit_msg()
+    assert epab.utils.GIT_SPAWNS.counts == {'cat-file': 2}
+
+
+def test_gitpython_processes(repo):
+    assert repo.repo.head.commit.message
+    epab.utils.GIT_SPAWNS.reset()
+    repo._batch.read('HEAD')
+    assert epab.utils.GIT_SPAWNS.total == 0
+
+
+def test_restart(repo):
+    sha = repo._batch.header('HEAD')[0]
+    repo._batch.close()
+    epab.utils.GIT_SPAWNS.reset()
+    assert repo._batch.header('HEAD')[0] == sha
+    assert epab.utils.GIT_SPAWNS.total == 1
+
+
+def test_peel_tag(repo):
+    subprocess.check_call(('git', 'tag', '-a', 'annotated', '-m', 'message'))
+    tag_sha = subprocess.check_output(('git', 'rev-parse', 'annotated')).decode().strip()
+    assert repo._peel_tag(tag_sha) == repo.get_sha()
+    assert repo.tags_for_commit(repo.get_sha()) == ['annotated']
+
+
+def test_spawn_counter(repo):
+    epab.utils.GIT_SPAWNS.reset()
+    repo.status()
+    repo.status()
+    assert epab.utils.GIT_SPAWNS.counts == {'status': 2}
+    assert str(epab.utils.GIT_SPAWNS) == '2 (status: 2)'
+    epab.utils.GIT_SPAWNS.reset()
+    assert str(epab.utils.GIT_SPAWNS) == '0'
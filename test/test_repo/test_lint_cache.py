@@ -0,0 +1,82 @@
+# coding=utf-8
+from pathlib import Path
+
+import pytest
+
+import epab.utils
+from epab.core import CTX, config
+
+
+@pytest.fixture(name='linter')
+def _linter(repo: epab.utils.Repo):
+    CTX.repo = repo
+    config.LINT_CACHE.default = True
+    runs = []
+
+    @epab.utils.lint_cache('dummy', 'epab')
+    def _dummy_linter(fail=False):
+        runs.append(fail)
+        if fail:
+            raise SystemExit(1)
+
+    _dummy_linter.runs = runs
+    yield _dummy_linter
+
+
+def test_tree_fingerprint(repo: epab.utils.Repo):
+    fingerprint = repo.tree_fingerprint()
+    assert repo.tree_fingerprint() == fingerprint
+    Path('init').write_text('modified')
+    modified = repo.tree_fingerprint()
+    assert modified != fingerprint
+    Path('init').write_text('modified again')
+    assert repo.tree_fingerprint() != modified
+    Path('init').write_text('')
+    assert repo.tree_fingerprint() == fingerprint
+    Path('untracked').touch()
+    assert repo.tree_fingerprint() != fingerprint
+
+
+def test_tree_fingerprint_staged(repo: epab.utils.Repo):
+    Path('init').write_text('modified')
+    modified = repo.tree_fingerprint()
+    repo.stage_all()
+    assert repo.tree_fingerprint() != modified
+
+
+def test_lint_cache(linter):
+    linter()
+    linter()
+    assert linter.runs == [False]
+    assert Path('.epab_cache/lint/dummy.json').exists()
+
+
+def test_lint_cache_tree_changed(linter):
+    linter()
+    Path('init').write_text('modified')
+    linter()
+    assert linter.runs == [False, False]
+
+
+def test_lint_cache_config_changed(linter):
+    linter()
+    Path('pyproject.toml').write_text('[tool.epab]\n')
+    linter()
+    assert linter.runs == [False, False]
+
+
+def test_lint_cache_arguments(linter):
+    linter()
+    with pytest.raises(SystemExit):
+        linter(fail=True)
+    with pytest.raises(SystemExit):
+        linter(fail=True)
+    assert linter.runs == [False, True, True]
+
+
+def test_lint_cache_disabled(linter):
+    config.LINT_CACHE.default = False
+    linter()
+    linter()
+    assert linter.runs == [False, False]
+    assert not Path('.epab_cache').exists()
@@ -0,0 +1,97 @@
+# coding=utf-8
+import subprocess
+
+import epab.utils
+from epab.core import CTX
+
+
+def _pack_refs():
+    subprocess.check_call(('git', 'pack-refs', '--all'))
+
+
+def test_snapshot_is_shared(repo):
+    repo.tag('test')
+    assert repo.list_tags() == ['test']
+    snapshot = repo._refs()
+    assert isinstance(snapshot, epab.utils.RefSnapshot)
+    assert repo.list_branches() == ['master']
+    assert repo._refs() is snapshot
+    assert epab.utils.Repo()._refs() is snapshot
+
+
+def test_snapshot_invalidated_on_tag(repo):
+    snapshot = repo._refs()
+    repo.tag('test')
+    assert repo._refs() is not snapshot
+    assert repo.list_tags() == ['test']
+    repo.remove_tag('test')
+    assert repo.list_tags() == []
+
+
+def test_snapshot_invalidated_on_branch(repo):
+    assert repo.list_branches() == ['master']
+    repo.create_branch('develop')
+    assert repo.list_branches() == ['develop', 'master']
+
+
+def test_snapshot_packed_refs(repo):
+    repo.tag('packed')
+    repo.create_branch('develop')
+    _pack_refs()
+    repo.tag('loose')
+    snapshot = repo._refs()
+    assert snapshot.tag_names() == ['loose', 'packed']
+    assert snapshot.branch_names() == ['develop', 'master']
+    assert snapshot.tags['packed'] == repo.get_sha()
+    assert snapshot.heads['develop'] == repo.get_sha()
+
+
+def test_snapshot_external_change(repo):
+    assert repo.list_tags() == []
+    _pack_refs()
+    subprocess.check_call(('git', 'tag', 'external'))
+    assert repo.list_tags() == ['external']
+
+
+def test_snapshot_reset():
+    CTX.ref_snapshots['dummy'] = None
+    CTX._reset()
+    assert not CTX.ref_snapshots
+
+
+def test_tags_for_commit(repo):
+    first_sha = repo.get_sha()
+    assert repo.tags_for_commit(first_sha) == []
+    repo.tag('b')
+    repo.tag('a')
+    assert repo.tags_for_commit(first_sha) == ['a', 'b']
+    repo.commit('msg', allow_empty=True)
+    assert repo.tags_for_commit(repo.get_sha()) == []
+    assert repo.get_current_tag() is None
+    repo.tag('c')
+    assert repo.tags_for_commit(repo.get_sha()) == ['c']
+    assert repo.tags_for_commit(first_sha) == ['a', 'b']
+
+
+def test_tags_for_commit_annotated(repo):
+    sha = repo.get_sha()
+    subprocess.check_call(('git', 'tag', '-a', 'loose_annotated', '-m', 'msg'))
+    assert repo.tags_for_commit(sha) == ['loose_annotated']
+    assert repo.get_current_tag() == 'loose_annotated'
+    _pack_refs()
+    subprocess.check_call(('git', 'tag', 'loose'))
+    snapshot = repo._refs()
+    assert snapshot.tags['loose_annotated'] != sha
+    assert repo.tags_for_commit(sha) == ['loose', 'loose_annotated']
+
+
+def test_tags_for_commit_packed_refs_peeled(repo):
+    sha = repo.get_sha()
+    subprocess.check_call(('git', 'tag', '-a', 'annotated', '-m', 'msg'))
+    _pack_refs()
+
+    def _peel(_):
+        raise AssertionError('packed tags should not need peeling')
+
+    snapshot = epab.utils.RefSnapshot(repo.repo.git_dir, _peel)
+    assert snapshot.tags_for_commit(sha) == ['annotated']
@@ -0,0 +1,71 @@
+# coding=utf-8
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+# noinspection PyProtectedMember
+from epab.utils import _stat_cache
+
+
+@pytest.fixture(name='hashed')
+def _hashed(monkeypatch):
+    hashed = []
+    hash_files = _stat_cache._hash_files
+
+    def _recording_hash_files(repo, paths):
+        hashed.extend(paths)
+        return hash_files(repo, paths)
+
+    monkeypatch.setattr(_stat_cache, '_hash_files', _recording_hash_files)
+    yield hashed
+
+
+def _age_index(repo):
+    # Makes sure no index entry is "racily clean"
+    index_path = Path(repo.repo.git_dir, 'index')
+    future = time.time() + 10
+    os.utime(str(index_path), (future, future))
+
+
+def test_unchanged_files_are_trusted(repo, file_set, hashed):
+    repo.commit('test')
+    _age_index(repo)
+    assert not _stat_cache.modified_files(repo.repo)
+    assert not hashed
+
+
+def test_racily_clean_files_are_hashed(repo, file_set, hashed):
+    repo.commit('test')
+    index_path = Path(repo.repo.git_dir, 'index')
+    past = time.time() - 10
+    os.utime(str(index_path), (past, past))
+    assert not _stat_cache.modified_files(repo.repo)
+    assert sorted(hashed) == sorted(str(file) for file in file_set + [Path('init')])
+
+
+def test_changed_stat_same_content(repo, file_set, hashed):
+    repo.commit('test')
+    _age_index(repo)
+    future = time.time() + 5
+    os.utime(str(file_set[0]), (future, future))
+    assert not _stat_cache.modified_files(repo.repo)
+    assert hashed == [str(file_set[0])]
+
+
+def test_modified_files(repo, file_set, hashed):
+    repo.commit('test')
+    _age_index(repo)
+    file_set[0].write_text('moo')
+    file_set[1].unlink()
+    assert _stat_cache.modified_files(repo.repo) == [str(file_set[0]), str(file_set[1])]
+    assert hashed == [str(file_set[0])]
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='no executable bit on Windows')
+def test_mode_change(repo, file_set):
+    repo.commit('test')
+    _age_index(repo)
+    file_set[0].chmod(0o755)
+    assert _stat_cache.modified_files(repo.repo) == [str(file_set[0])]
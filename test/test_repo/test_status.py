@@ -0,0 +1,139 @@
+# coding=utf-8
+import threading
+from pathlib import Path
+
+import pytest
+
+import epab.utils
+# noinspection PyProtectedMember
+from epab.utils import RepoStatus, _repo, _stat_cache
+# noinspection PyProtectedMember
+from epab.utils._stat_cache import modified_files
+
+
+@pytest.fixture(name='scan_count')
+def _scan_count(monkeypatch):
+    count = []
+
+    def _counting_modified_files(repo):
+        count.append(repo)
+        return modified_files(repo)
+
+    monkeypatch.setattr(_repo, 'modified_files', _counting_modified_files)
+    yield count
+
+
+def test_repo_status_untracked_is_lazy():
+    calls = []
+
+    def _untracked():
+        calls.append(None)
+        return ['untracked']
+
+    status = RepoStatus(['staged'], ['modified'], _untracked)
+    assert status.staged == ['staged']
+    assert status.modified == ['modified']
+    assert not calls
+    assert status.untracked == ['untracked']
+    assert status.untracked == ['untracked']
+    assert len(calls) == 1
+
+
+def test_status(repo: epab.utils.Repo):
+    Path('untracked').touch()
+    Path('staged').touch()
+    repo.stage_subset('staged')
+    Path('init').write_text('moo')
+    assert repo.untracked_files() == ['untracked']
+    assert repo.list_staged_files() == ['staged']
+    assert repo.changed_files() == ['init']
+    assert not repo.index_is_empty()
+
+
+def test_is_dirty_single_scan(repo: epab.utils.Repo, scan_count):
+    Path('init').write_text('moo')
+    assert repo.is_dirty(untracked=True)
+    assert len(scan_count) == 1
+
+
+def test_stash_single_scan(repo: epab.utils.Repo, scan_count):
+    Path('init').write_text('moo')
+    repo.stash('test')
+    assert len(scan_count) == 1
+    assert not repo.is_dirty()
+    assert len(scan_count) == 2
+    repo.unstash()
+    assert repo.is_dirty()
+
+
+def test_status_refreshed_between_queries(repo: epab.utils.Repo, scan_count):
+    assert not repo.untracked_files()
+    Path('test').touch()
+    assert repo.untracked_files() == ['test']
+    assert len(scan_count) == 2
+
+
+@pytest.fixture(name='trusted_stat')
+def _trusted_stat(monkeypatch):
+    # Stat data written by the test itself is always too recent to be trusted
+    monkeypatch.setattr(_stat_cache, '_RACY_MARGIN_NS', 0)
+
+
+def test_status_reused_between_queries(repo: epab.utils.Repo, scan_count, trusted_stat):
+    Path('init').write_text('moo')
+    assert repo.is_dirty()
+    assert repo.changed_files() == ['init']
+    assert not repo.untracked_files()
+    assert len(scan_count) == 1
+    Path('init').write_text('')
+    assert not repo.is_dirty()
+    assert len(scan_count) == 2
+
+
+def test_status_untracked_file_detected(repo: epab.utils.Repo, scan_count, trusted_stat):
+    Path('sub', 'deeper').mkdir(parents=True)
+    assert not repo.is_dirty(untracked=True)
+    Path('sub', 'test').touch()
+    assert repo.untracked_files() == ['sub/test']
+    Path('sub', 'deeper', 'test').touch()
+    assert repo.untracked_files() == ['sub/deeper/test', 'sub/test']
+    # Tracked files did not change: only untracked files are listed again
+    assert len(scan_count) == 1
+
+
+def test_status_without_time_ns(repo: epab.utils.Repo, monkeypatch):
+    # time.time_ns does not exist before Python 3.7
+    monkeypatch.delattr(_stat_cache.time, 'time_ns', raising=False)
+    Path('init').write_text('moo')
+    assert repo.changed_files() == ['init']
+
+
+def test_status_head_change_detected(repo: epab.utils.Repo, scan_count, trusted_stat):
+    assert not repo.list_staged_files()
+    repo.repo.git.commit('--allow-empty', '-m', 'external commit')
+    assert not repo.list_staged_files()
+    assert len(scan_count) == 2
+
+
+def test_status_threads(repo: epab.utils.Repo, scan_count, trusted_stat):
+    Path('init').write_text('moo')
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(repo.is_dirty())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [True] * 8
+    assert len(scan_count) == 1
+
+
+def test_list_changed_files(repo: epab.utils.Repo):
+    repo.commit('second commit', allow_empty=True)
+    Path('init').write_text('moo')
+    Path('staged').touch()
+    repo.stage_subset('staged')
+    Path('untracked').touch()
+    assert repo.list_changed_files() == ['init', 'staged', 'untracked']
+    repo.commit('third commit', files_to_add=['init', 'staged'])
+    assert repo.list_changed_files() == ['untracked']
+    assert repo.list_changed_files('HEAD~2') == ['init', 'staged', 'untracked']
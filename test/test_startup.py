@@ -0,0 +1,53 @@
+# coding=utf-8
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import epab
+
+# Import time of "epab.__main__", in seconds
+BUDGET = 2
+HEAVY_MODULES = ('git', 'pefile', 'epab.cmd', 'epab.linters', 'isort', 'distutils.sysconfig')
+
+
+def _import_times() -> dict:
+    Path('pyproject.toml').write_text('[tool.epab]\npackage_name = "test_package"\n')
+    package_root = str(Path(epab.__file__).parent.parent)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import epab.__main__'],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True,
+        env={'PYTHONPATH': package_root, 'PATH': ''},
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        times[module.strip()] = int(cumulative) / 1000000
+    return times
+
+
+@pytest.mark.long
+def test_startup_time():
+    times = _import_times()
+    for module in HEAVY_MODULES:
+        assert module not in times, f'{module} should only be imported when needed'
+    assert times['epab.__main__'] < BUDGET
+
+
+def test_lazy_commands():
+    from epab.__main__ import cli
+    commands = cli.list_commands(None)
+    assert 'release' in commands
+    assert 'pytest-dead-fixtures' in commands
+    assert cli.get_command(None, 'release').name == 'release'
+    assert cli.get_command(None, 'unknown') is None
+
+
+def test_lazy_command_not_a_command():
+    from epab._lazy_group import LazyGroup
+    group = LazyGroup(lazy_subcommands={'version': 'epab:__version__'})
+    with pytest.raises(TypeError):
+        group.get_command(None, 'version')
@@ -0,0 +1,118 @@
+# coding=utf-8
+import http.server
+import json
+import threading
+
+import pytest
+
+from epab.utils import AV
+# noinspection PyProtectedMember
+from epab.utils._av_sink import AVMessageSink, HTTPTransport
+
+
+class _Transport:
+
+    def __init__(self):
+        self.batches = []
+        self.sending = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, batch):
+        self.sending.set()
+        self.release.wait(5)
+        self.batches.append(batch)
+
+    @property
+    def messages(self):
+        return [message for batch in self.batches for message in batch]
+
+
+@pytest.fixture(name='transport')
+def _transport():
+    yield _Transport()
+
+
+def test_batches(transport):
+    sink = AVMessageSink(transport, batch_size=10)
+    transport.release.clear()
+    for index in range(25):
+        assert sink.put('Information', f'message {index}')
+    transport.release.set()
+    sink.flush()
+    assert transport.messages == [('Information', f'message {index}', None) for index in range(25)]
+    assert len(transport.batches) < 25
+    assert all(len(batch) <= 10 for batch in transport.batches)
+    sink.close()
+
+
+def test_drop_when_full(transport):
+    sink = AVMessageSink(transport, max_queue_size=2, block_timeout=0.01)
+    transport.release.clear()
+    sink.put('Information', 'first')
+    assert transport.sending.wait(5)
+    assert sink.put('Information', 'second')
+    assert sink.put('Information', 'third')
+    assert not sink.put('Information', 'fourth')
+    assert not sink.put('Error', 'fifth')
+    assert sink.dropped == 2
+    transport.release.set()
+    sink.close()
+    assert [msg for _, msg, _ in transport.messages] == [
+        'first', 'second', 'third', '2 messages were dropped (queue full)'
+    ]
+
+
+def test_transport_failure():
+    calls = []
+
+    def _failing_transport(batch):
+        calls.append(batch)
+        raise ConnectionError()
+
+    sink = AVMessageSink(_failing_transport)
+    sink.put('Information', 'message')
+    sink.flush()
+    sink.put('Information', 'message')
+    sink.close()
+    assert len(calls) == 2
+
+
+def test_av_post(monkeypatch, transport):
+    monkeypatch.setattr(AV, '_sink', AVMessageSink(transport))
+    AV.post('Error', 'message', 'details')
+    AV.flush()
+    assert transport.messages == [('Error', 'message', 'details')]
+    with pytest.raises(ValueError):
+        AV.post('some level', 'message')
+
+
+def test_http_transport():
+    received = []
+
+    class _Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):  # pylint: disable=invalid-name
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            received.append((self.path, json.loads(body)))
+            self.send_response(204)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *_):
+            pass
+
+    server = http.server.HTTPServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        transport = HTTPTransport(f'http://127.0.0.1:{server.server_port}/')
+        transport([('Information', 'first', None), ('Error', 'second', 'details')])
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert received == [
+        ('/api/build/messages', {'message': 'first', 'category': 'Information', 'details': ''}),
+        ('/api/build/messages', {'message': 'second', 'category': 'Error', 'details': 'details'}),
+    ]
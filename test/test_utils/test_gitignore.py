@@ -0,0 +1,68 @@
+# coding=utf-8
+import os
+import stat
+from pathlib import Path
+
+import pytest
+
+import epab.utils
+# noinspection PyProtectedMember
+from epab.utils import _gitignore
+
+
+def test_add_to_gitignore():
+    epab.utils.add_to_gitignore('some_file')
+    assert Path('.gitignore').read_text() == 'some_file\n'
+    epab.utils.add_to_gitignore('some_file')
+    assert Path('.gitignore').read_text() == 'some_file\n'
+
+
+def test_ensure_entries():
+    Path('.gitignore').write_text('existing\n*.pyc')
+    assert epab.utils.ensure_gitignore_entries(['existing', 'new', '*.py', 'new'])
+    assert Path('.gitignore').read_text() == 'existing\n*.pyc\nnew\n*.py\n'
+    assert not epab.utils.ensure_gitignore_entries(['existing', 'new', '*.py'])
+
+
+def test_exact_line_match():
+    Path('.gitignore').write_text('/build/\n')
+    assert epab.utils.ensure_gitignore_entries(['build'])
+    assert Path('.gitignore').read_text() == '/build/\nbuild\n'
+
+
+def test_keeps_line_endings():
+    Path('.gitignore').write_bytes(b'first\r\n')
+    assert epab.utils.ensure_gitignore_entries(['second'])
+    assert Path('.gitignore').read_bytes() == b'first\r\nsecond\r\n'
+
+
+def test_skipped_when_unchanged(monkeypatch):
+    epab.utils.ensure_gitignore_entries(['first', 'second'])
+    monkeypatch.setattr(Path, 'read_bytes', None)
+    monkeypatch.setattr(_gitignore, 'write_atomic', None)
+    assert not epab.utils.ensure_gitignore_entries(['first', 'second'])
+
+
+def test_file_changed():
+    epab.utils.ensure_gitignore_entries(['first', 'second'])
+    Path('.gitignore').write_text('first\n')
+    assert epab.utils.ensure_gitignore_entries(['first', 'second'])
+    assert Path('.gitignore').read_text() == 'first\nsecond\n'
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='no POSIX file modes on Windows')
+def test_keeps_file_mode():
+    Path('.gitignore').write_text('first\n')
+    os.chmod('.gitignore', 0o644)
+    assert epab.utils.ensure_gitignore_entries(['second'])
+    assert stat.S_IMODE(os.stat('.gitignore').st_mode) == 0o644
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='no POSIX file modes on Windows')
+def test_new_file_mode():
+    umask = os.umask(0o022)
+    try:
+        assert epab.utils.ensure_gitignore_entries(['first'])
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE(os.stat('.gitignore').st_mode) == 0o644
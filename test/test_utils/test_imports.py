@@ -0,0 +1,57 @@
+# coding=utf-8
+from pathlib import Path
+
+import pytest
+
+from epab.utils import reverse_dependents
+# noinspection PyProtectedMember
+from epab.utils._imports import import_graph
+
+
+@pytest.fixture(name='package')
+def _package():
+    files = {
+        'pkg/__init__.py': 'from ._core import Core\n',
+        'pkg/_core.py': 'import os\n',
+        'pkg/_user.py': 'from pkg import Core\n',
+        'pkg/sub/__init__.py': '',
+        'pkg/sub/_relative.py': 'from .. import _core\n',
+        'pkg/sub/_absolute.py': 'import pkg.sub._relative\n',
+        'pkg/_unrelated.py': 'import sys\n',
+        'pkg/_broken.py': 'import (\n',
+    }
+    for path, content in files.items():
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(content)
+
+
+@pytest.mark.usefixtures('package')
+def test_import_graph():
+    graph = import_graph('pkg')
+    assert graph['pkg/__init__.py'] == {'pkg/_core.py'}
+    assert graph['pkg/_core.py'] == set()
+    assert graph['pkg/_user.py'] == {'pkg/__init__.py'}
+    assert graph['pkg/sub/_relative.py'] == {'pkg/_core.py'}
+    assert graph['pkg/sub/_absolute.py'] == {'pkg/sub/_relative.py'}
+    assert graph['pkg/_broken.py'] == set()
+
+
+@pytest.mark.usefixtures('package')
+def test_reverse_dependents():
+    assert reverse_dependents(['pkg/_core.py'], 'pkg') == [
+        'pkg/__init__.py',
+        'pkg/_core.py',
+        'pkg/_user.py',
+        'pkg/sub/_absolute.py',
+        'pkg/sub/_relative.py',
+    ]
+    assert reverse_dependents(['pkg/sub/_relative.py'], 'pkg') == ['pkg/sub/_absolute.py', 'pkg/sub/_relative.py']
+    assert reverse_dependents(['pkg/_unrelated.py'], 'pkg') == ['pkg/_unrelated.py']
+
+
+@pytest.mark.usefixtures('package')
+def test_reverse_dependents_deleted_module():
+    Path('pkg/_user.py').write_text('from ._deleted import func\n')
+    assert 'pkg/_deleted.py' not in import_graph('pkg', ['pkg/_deleted.py'])
+    assert import_graph('pkg', ['pkg/_deleted.py'])['pkg/_user.py'] == {'pkg/_deleted.py'}
+    assert reverse_dependents(['pkg/_deleted.py'], 'pkg') == ['pkg/_deleted.py', 'pkg/_user.py']
@@ -0,0 +1,41 @@
+# coding=utf-8
+from pathlib import Path
+
+import pytest
+from mockito import when
+
+from epab.utils import _next_version, get_next_version
+
+CALVER = '2001.06.25'
+TAG_COUNT = 100000
+TAGS_PER_CALVER = 100
+
+
+def _write_packed_refs(repo):
+    sha = repo.get_sha()
+    tags = []
+    for index in range(TAG_COUNT // TAGS_PER_CALVER):
+        calver = f'{2000 + index // 336}.{(index // 28) % 12 + 1:02d}.{index % 28 + 1:02d}'
+        tags.extend(f'{calver}.{quantifier}' for quantifier in range(1, TAGS_PER_CALVER + 1))
+    lines = ['# pack-refs with: peeled fully-peeled sorted ']
+    lines.extend(f'{sha} refs/tags/{tag}' for tag in sorted(tags))
+    Path(repo.repo.git_dir, 'packed-refs').write_text('\n'.join(lines) + '\n')
+    return tags
+
+
+@pytest.mark.long
+def test_next_version_benchmark(repo):
+    tags = _write_packed_refs(repo)
+    assert len(tags) == TAG_COUNT
+    when(_next_version)._get_calver().thenReturn(CALVER)
+    _next_version._parse_tag.cache_clear()
+
+    assert get_next_version() == f'{CALVER}.{TAGS_PER_CALVER + 1}'
+    cold = _next_version._parse_tag.cache_info()
+    assert (cold.hits, cold.misses) == (0, TAGS_PER_CALVER)
+
+    assert get_next_version() == f'{CALVER}.{TAGS_PER_CALVER + 1}'
+    warm = _next_version._parse_tag.cache_info()
+    # Only the tags of the current calver are parsed, and only once
+    assert (warm.hits, warm.misses) == (TAGS_PER_CALVER, TAGS_PER_CALVER)
+    assert warm.currsize == TAGS_PER_CALVER
@@ -0,0 +1,112 @@
+# coding=utf-8
+import threading
+import time
+
+import pytest
+
+from epab.core import CTX
+from epab.utils import Pipeline, Stage, run_once
+
+
+def _noop():
+    pass
+
+
+def test_dependencies():
+    pipeline = Pipeline('test', [
+        Stage('first', _noop, outputs=['value']),
+        Stage('second', _noop),
+        Stage('third', _noop, inputs=['value'], depends_on=['second']),
+        Stage('mutate', _noop, mutates_repo=True),
+        Stage('fourth', _noop),
+    ])
+    assert pipeline.dependencies == {
+        'first': set(),
+        'second': set(),
+        'third': {'first', 'second'},
+        'mutate': {'first', 'second', 'third'},
+        'fourth': {'mutate'},
+    }
+
+
+@pytest.mark.parametrize(
+    'stages',
+    [
+        [Stage('first', _noop), Stage('first', _noop)],
+        [Stage('first', _noop, depends_on=['second']), Stage('second', _noop)],
+        [Stage('first', _noop, inputs=['value'])],
+    ]
+)
+def test_invalid_graph(stages):
+    with pytest.raises(ValueError):
+        Pipeline('test', stages)
+
+
+def test_values():
+    pipeline = Pipeline('test', [
+        Stage('first', lambda: 1, outputs=['one']),
+        Stage('second', lambda: (2, 3), outputs=['two', 'three']),
+        Stage('sum', lambda one, two, three: one + two + three, inputs=['one', 'two', 'three'], outputs=['sum']),
+    ])
+    assert pipeline.run()['sum'] == 6
+
+
+def test_independent_stages_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    pipeline = Pipeline('test', [
+        Stage('first', barrier.wait),
+        Stage('second', barrier.wait),
+    ])
+    pipeline.run(jobs=2)
+
+
+def test_mutating_stages_are_serialized():
+    events = []
+
+    def _stage(name):
+        def _func():
+            events.append(f'{name} start')
+            time.sleep(0.05)
+            events.append(f'{name} end')
+
+        return _func
+
+    Pipeline('test', [
+        Stage('first', _stage('first')),
+        Stage('mutate', _stage('mutate'), mutates_repo=True),
+        Stage('second', _stage('second')),
+    ]).run(jobs=3)
+    assert events == ['first start', 'first end', 'mutate start', 'mutate end', 'second start', 'second end']
+
+
+def test_failure():
+    ran = []
+
+    def _fail():
+        raise SystemExit(1)
+
+    pipeline = Pipeline('test', [
+        Stage('fail', _fail),
+        Stage('after', lambda: ran.append(True), depends_on=['fail']),
+    ])
+    with pytest.raises(SystemExit):
+        pipeline.run()
+    assert not ran
+
+
+def test_run_once_from_concurrent_stages():
+    calls = []
+
+    @run_once
+    def _once():
+        calls.append(None)
+        time.sleep(0.05)
+        return len(calls)
+
+    CTX.run_once = {}
+    values = Pipeline('test', [
+        Stage('first', _once, outputs=['first']),
+        Stage('second', _once, outputs=['second']),
+    ]).run(jobs=2)
+    assert values == {'first': 1, 'second': 1}
+    assert len(calls) == 1
@@ -0,0 +1,105 @@
+# coding=utf-8
+import os
+import sys
+import time
+from pathlib import Path
+
+import elib_run
+import pytest
+# noinspection PyProtectedMember
+from elib_run import _exc, _find_exe
+
+import epab.utils
+from epab.exc import ProcessTimeoutError
+
+
+@pytest.fixture(name='python_dir')
+def _python_dir(monkeypatch):
+    """
+    Directory containing "python.exe", the name elib_run looks for on every platform
+    """
+    python_dir = Path('bin').absolute()
+    python_dir.mkdir()
+    os.symlink(sys.executable, str(python_dir / 'python.exe'))
+    monkeypatch.setattr(_find_exe, '_KNOWN_EXECUTABLES', {})
+    yield str(python_dir)
+
+
+def _python(code):
+    return f'python -c "{code}"'
+
+
+def test_run(python_dir, caplog):
+    caplog.set_level(10)
+    cmd = _python('import sys; print(1); print(2, file=sys.stderr); print(); print(3)')
+    output, code = epab.utils.run(cmd, python_dir)
+    assert code == 0
+    assert output == '1\n2\n3'
+    assert ': running' in caplog.text
+    assert ': success: 0' in caplog.text
+
+
+def test_run_tail(python_dir):
+    output, _ = epab.utils.run(_python('for i in range(5000): print(i)'), python_dir, mute=True, tail=3)
+    assert output == '4997\n4998\n4999'
+    output, _ = epab.utils.run(_python('for i in range(5000): print(i)'), python_dir, mute=True, tail=None)
+    assert len(output.splitlines()) == 5000
+
+
+def test_run_filters(python_dir):
+    output, _ = epab.utils.run(_python("print('keep'); print('Notice: drop')"), python_dir, filters='Notice: ')
+    assert output == 'keep'
+
+
+def test_run_mute(python_dir, caplog):
+    caplog.set_level(10)
+    epab.utils.run(_python("print('some ' + 'output')"), python_dir, mute=True)
+    assert 'some output' not in caplog.text
+    assert ': running' not in caplog.text
+
+
+def test_run_failure(python_dir, caplog):
+    with pytest.raises(SystemExit) as exc_info:
+        epab.utils.run(_python("print('output'); exit(3)"), python_dir, mute=True)
+    assert exc_info.value.code == 3
+    assert 'command failed: 3' in caplog.text
+    assert 'process output (last 1 lines):\noutput' in caplog.text
+
+
+def test_run_failure_ok(python_dir):
+    assert epab.utils.run(_python("print('output'); exit(3)"), python_dir, failure_ok=True) == ('output', 3)
+
+
+def test_run_timeout(python_dir):
+    start = time.monotonic()
+    # Code written for elib_run catches its own exception
+    with pytest.raises(_exc.ProcessTimeoutError) as exc_info:
+        epab.utils.run(_python('import time; time.sleep(30)'), python_dir, timeout=0.5)
+    assert time.monotonic() - start < 10
+    assert isinstance(exc_info.value, ProcessTimeoutError)
+    assert exc_info.value.timeout == 0.5
+
+
+def test_executable_not_found():
+    with pytest.raises(elib_run.ExecutableNotFoundError):
+        epab.utils.run('some_executable_that_does_not_exist')
+
+
+def test_streaming_process_lines(python_dir):
+    process = epab.utils.StreamingProcess(_python('for i in range(3): print(i)'), python_dir)
+    lines = process.lines()
+    assert next(lines) == '0'
+    assert process.return_code is None
+    assert list(lines) == ['1', '2']
+    assert process.return_code == 0
+    assert list(process.tail) == ['0', '1', '2']
+
+
+def test_streaming_process_closed_early(python_dir):
+    cmd = _python('import itertools, time; [print(1, flush=True) or time.sleep(0.01) for _ in itertools.count()]')
+    process = epab.utils.StreamingProcess(cmd, python_dir)
+    lines = process.lines()
+    assert next(lines) == '1'
+    start = time.monotonic()
+    lines.close()
+    assert time.monotonic() - start < 5
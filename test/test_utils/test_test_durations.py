@@ -0,0 +1,85 @@
+# coding=utf-8
+from pathlib import Path
+
+import pytest
+
+import epab.utils
+
+JUNIT_XML = """<?xml version="1.0" encoding="utf-8"?>
+<testsuites><testsuite name="pytest" tests="4">
+<testcase classname="test.test_module" file="test/test_module.py" line="1" name="test_one" time="1.5"/>
+<testcase classname="test.test_module" file="test/test_module.py" line="5" name="test_param[1]" time="0.25">
+<failure message="failed">details</failure></testcase>
+<testcase classname="test.sub.test_other.TestClass" file="test/sub/test_other.py" line="3" name="test_method"
+ time="2"/>
+<testcase classname="" name="collection_error" time="0"/>
+</testsuite></testsuites>
+"""
+
+
+def test_junit_durations():
+    Path('junit.xml').write_text(JUNIT_XML)
+    assert epab.utils.junit_durations('junit.xml') == {
+        'test/test_module.py::test_one': 1.5,
+        'test/test_module.py::test_param[1]': 0.25,
+        'test/sub/test_other.py::TestClass::test_method': 2.0,
+    }
+
+
+def test_duration_store():
+    store = epab.utils.DurationStore()
+    assert store.durations == {}
+    store.record('sha1', {
+        'test/test_a.py::test_one': 1.0,
+        'test/test_a.py::test_two[1]': 0.5,
+        'test/test_b.py::test': 3,
+    })
+    store.record('sha2', {})
+    store = epab.utils.DurationStore()
+    store.record('sha2', {'test/test_a.py::test_one': 2.00049})
+    assert store.duration('test/test_a.py') == 2.5
+    assert store.duration('test/test_a.py::test_two') == 0.5
+    assert store.duration('test/test_a.py::test_one') == 2.0
+    assert store.duration('test/test_c.py') is None
+    assert store.duration('test/test_a') is None
+    assert [sha for sha, _ in epab.utils.DurationStore().runs] == ['sha1', 'sha2']
+
+
+def test_duration_store_invalid_entry():
+    epab.utils.DurationStore().record('sha1', {'test': 1.0})
+    with epab.utils.cache_path('test_durations.jsonl').open('a') as stream:
+        stream.write('{"sha": "sha2", "durat')
+    assert epab.utils.DurationStore().runs == [('sha1', {'test': 1.0})]
+
+
+def test_regressions():
+    store = epab.utils.DurationStore()
+    for index in range(6):
+        slow = index >= 3
+        store.record(f'sha{index}', {
+            'stable': 1.0 + index / 100,
+            'slower': 2.0 if slow else 1.0,
+            'much_slower': 0.5 if slow else 0.1,
+            'fast': 0.01 if slow else 0.001,
+        })
+    store.record('sha6', {'new': 10.0})
+    assert store.regressions(3, 20) == [('fast', 0.001, 0.01), ('much_slower', 0.1, 0.5), ('slower', 1.0, 2.0)]
+    assert store.regressions(3, 20, min_duration=0.1) == [('much_slower', 0.1, 0.5), ('slower', 1.0, 2.0)]
+    assert store.regressions(3, 150, min_duration=0.1) == [('much_slower', 0.1, 0.5)]
+    assert store.regressions(4, 20) == []
+    with pytest.raises(ValueError):
+        store.regressions(0, 20)
+
+
+def test_split_into_shards():
+    costs = {'a': 5, 'b': 4, 'c': 3, 'd': 3, 'e': 2, 'f': 1}
+    shards = epab.utils.split_into_shards(costs, 3)
+    assert sorted(sum(costs[item] for item in shard) for shard in shards) == [6, 6, 6]
+    assert sorted(item for shard in shards for item in shard) == sorted(costs)
+
+
+def test_split_into_shards_more_workers_than_items():
+    assert epab.utils.split_into_shards({'a': 1, 'b': 1}, 4) == [['a'], ['b']]
+    assert epab.utils.split_into_shards({}, 4) == []
+    with pytest.raises(ValueError):
+        epab.utils.split_into_shards({'a': 1}, 0)
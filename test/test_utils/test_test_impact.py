@@ -0,0 +1,69 @@
+# coding=utf-8
+import sqlite3
+from pathlib import Path
+
+import epab.utils
+
+
+def write_coverage_data(contexts, path='.coverage', table='arc'):
+    """
+    Writes a minimal coverage data file
+
+    Args:
+        contexts: mapping of file path -> list of coverage contexts
+        path: path to the coverage data file
+        table: "arc" (branch coverage) or "line_bits"
+    """
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE file (id INTEGER PRIMARY KEY, path TEXT)')
+    connection.execute('CREATE TABLE context (id INTEGER PRIMARY KEY, context TEXT)')
+    connection.execute(f'CREATE TABLE {table} (file_id INTEGER, context_id INTEGER)')
+    context_ids = {}
+    for file_id, (file_path, file_contexts) in enumerate(contexts.items()):
+        connection.execute('INSERT INTO file VALUES (?, ?)', (file_id, str(Path(file_path).absolute())))
+        for context in file_contexts:
+            if context not in context_ids:
+                context_ids[context] = len(context_ids)
+                connection.execute('INSERT INTO context VALUES (?, ?)', (context_ids[context], context))
+            connection.execute(f'INSERT INTO {table} VALUES (?, ?)', (file_id, context_ids[context]))
+    connection.commit()
+    connection.close()
+
+
+def test_coverage_contexts():
+    write_coverage_data({
+        'package/module.py': ['', 'test/test_module.py::test_one|run', 'test/test_module.py::test_one|setup'],
+        'package/other.py': ['test/test_other.py::test[1]|run'],
+        '../outside.py': ['test/test_other.py::test[1]|run'],
+    })
+    assert epab.utils.coverage_contexts() == {
+        'package/module.py': {'test/test_module.py::test_one'},
+        'package/other.py': {'test/test_other.py::test[1]'},
+    }
+
+
+def test_coverage_contexts_line_bits():
+    write_coverage_data({'module.py': ['test_module.py::test|run']}, table='line_bits')
+    assert epab.utils.coverage_contexts() == {'module.py': {'test_module.py::test'}}
+
+
+def test_impact_map():
+    impact_map = epab.utils.ImpactMap()
+    assert impact_map.green_sha is None
+    assert impact_map.tests_for('module.py') is None
+    impact_map.update({'module.py': {'test_a', 'test_b'}, 'other.py': {'test_b'}})
+    impact_map.green_sha = 'sha'
+    impact_map.save()
+    impact_map = epab.utils.ImpactMap()
+    assert impact_map.green_sha == 'sha'
+    assert impact_map.tests_for('module.py') == {'test_a', 'test_b'}
+    # Only "test_b" ran, and does not execute "other.py" anymore
+    impact_map.update({'module.py': {'test_b'}, 'new.py': {'test_b'}})
+    assert impact_map.files == ['module.py', 'new.py']
+    assert impact_map.tests_for('module.py') == {'test_a', 'test_b'}
+    assert impact_map.tests_for('other.py') is None
+
+
+def test_impact_map_invalid_file():
+    epab.utils.cache_path('test_impact.json').write_text('invalid')
+    assert epab.utils.ImpactMap().green_sha is None